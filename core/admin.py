@@ -1,6 +1,9 @@
 from django.contrib import admin
+from django.db import transaction
 
-from .models import Estoque, Venda
+from .models import (AlertaDeEstoque, Estoque, FechamentoDeEstoque,
+                     MovimentoDeEstoque, Pedido, Venda, VendaDiaria,
+                     VendaDiariaPorVendedor)
 
 # Register your models here.
 
@@ -8,9 +11,132 @@ from .models import Estoque, Venda
 @admin.register(Estoque)
 class EstoqueAdmin(admin.ModelAdmin):
     list_display = ('produto_em_estoque', 'preco_de_venda', 'preco_de_compra',
-                    'quantidade_em_estoque')
+                    'quantidade_em_estoque', 'estoque_minimo')
+
+    def get_readonly_fields(self, request, obj=None):
+        # Depois do cadastro o saldo só muda por movimentos de estoque.
+        if obj is not None:
+            return ('quantidade_em_estoque',)
+        return ()
 
 
 @admin.register(Venda)
 class VendaAdmin(admin.ModelAdmin):
-    list_display = ('data_da_venda', 'quantidade_vendida', 'produto')
+    list_display = ('data_da_venda', 'quantidade_vendida', 'produto',
+                    'vendedor', 'valor_total')
+    readonly_fields = ('preco_de_venda', 'preco_de_compra', 'valor_total')
+
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            if change:
+                anterior = Venda.objects.get(pk=obj.pk)
+                VendaDiaria.objects.estornar(anterior)
+                MovimentoDeEstoque.objects.devolver(
+                    anterior, f'Venda {anterior.pk} alterada')
+                if anterior.produto_id != obj.produto_id:
+                    obj.congelar_precos()
+            super().save_model(request, obj, form, change)
+            # Vendas lançadas pelo admin não exigem saldo.
+            if obj.produto_id is not None and obj.quantidade_vendida:
+                Estoque.objects.baixar_varios(
+                    {obj.produto_id: obj.quantidade_vendida}, exigir_saldo=False)
+            MovimentoDeEstoque.objects.registrar_vendas([obj])
+            VendaDiaria.objects.registrar(obj)
+
+    def delete_model(self, request, obj):
+        Venda.objects.cancelar(obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            for venda in queryset:
+                Venda.objects.cancelar(venda)
+
+
+@admin.register(VendaDiaria)
+class VendaDiariaAdmin(admin.ModelAdmin):
+    list_display = ('data', 'produto', 'numero_de_vendas',
+                    'quantidade_vendida', 'total_vendido', 'total_lucro')
+    list_filter = ('data',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(VendaDiariaPorVendedor)
+class VendaDiariaPorVendedorAdmin(admin.ModelAdmin):
+    list_display = ('data', 'vendedor', 'numero_de_vendas',
+                    'quantidade_vendida', 'total_vendido', 'total_lucro')
+    list_filter = ('data',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(MovimentoDeEstoque)
+class MovimentoDeEstoqueAdmin(admin.ModelAdmin):
+    list_display = ('data', 'produto', 'tipo', 'quantidade', 'observacao')
+    list_filter = ('tipo',)
+    fields = ('produto', 'tipo', 'quantidade', 'data', 'observacao')
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj is not None:
+            return self.fields
+        return ()
+
+    def formfield_for_choice_field(self, db_field, request, **kwargs):
+        if db_field.name == 'tipo':
+            # Vendas e devoluções vêm das próprias vendas.
+            kwargs['choices'] = [
+                (valor, rotulo) for valor, rotulo in MovimentoDeEstoque.TIPOS
+                if valor in (MovimentoDeEstoque.REPOSICAO,
+                             MovimentoDeEstoque.AJUSTE)]
+        return super().formfield_for_choice_field(db_field, request, **kwargs)
+
+    def save_model(self, request, obj, form, change):
+        MovimentoDeEstoque.objects.lancar(obj)
+
+    def has_change_permission(self, request, obj=None):
+        return obj is None
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(FechamentoDeEstoque)
+class FechamentoDeEstoqueAdmin(admin.ModelAdmin):
+    list_display = ('data', 'produto', 'saldo')
+    list_filter = ('data',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(AlertaDeEstoque)
+class AlertaDeEstoqueAdmin(admin.ModelAdmin):
+    list_display = ('produto', 'saldo', 'estoque_minimo', 'aberto',
+                    'data_de_abertura', 'data_de_resolucao')
+    list_filter = ('aberto',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Pedido)
+class PedidoAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'data_do_pedido', 'valor_total')
+    readonly_fields = ('data_do_pedido', 'valor_total')
+
+    def has_delete_permission(self, request, obj=None):
+        return False
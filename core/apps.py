@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from .banco import aplicar_pragmas, configurar_pool_odbc
+        configurar_pool_odbc()
+        connection_created.connect(aplicar_pragmas, dispatch_uid='core.pragmas')
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.db import connections
+
+
+def aplicar_pragmas(sender, connection, **kwargs):
+    """
+    Aplica settings.SQLITE_PRAGMAS a cada conexão SQLite aberta. Os pragmas
+    valem por conexão, então precisam ser repetidos sempre que o Django
+    abre uma nova.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', None) or {}
+    with connection.cursor() as cursor:
+        for nome, valor in pragmas.items():
+            cursor.execute(f'PRAGMA {nome} = {valor}')
+
+
+def configurar_pool_odbc():
+    """
+    Liga ou desliga o pool do gerenciador ODBC conforme ODBC_POOLING. O
+    pyodbc só lê essa opção ao abrir a primeira conexão, por isso é
+    chamado na inicialização da app, antes de qualquer consulta.
+    """
+    if not any(connections.settings[alias]['ENGINE'] == 'mssql'
+               for alias in connections):
+        return
+    try:
+        import pyodbc
+    except ImportError:
+        return
+    pyodbc.pooling = getattr(settings, 'ODBC_POOLING', True)
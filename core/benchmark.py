@@ -0,0 +1,196 @@
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from .instrumentacao import quantil
+from .models import Estoque, Venda
+from .sinteticos import gerar_dados
+
+
+def resumo(tempos, consultas):
+    """Estatísticas de uma operação, em milissegundos."""
+    ordenados = sorted(tempo * 1000 for tempo in tempos)
+    return {
+        'repeticoes': len(ordenados),
+        'mediana_ms': round(statistics.median(ordenados), 2),
+        'p95_ms': round(quantil(ordenados, 0.95), 2),
+        'minimo_ms': round(ordenados[0], 2),
+        'maximo_ms': round(ordenados[-1], 2),
+        'consultas': max(consultas),
+    }
+
+
+def medir(operacao, repeticoes, preparar=None):
+    """
+    Executa `operacao` `repeticoes` vezes, cronometrando cada execução e
+    contando as consultas. `preparar`, se houver, roda antes de cada
+    execução, fora da medição, e o que retorna é passado para a operação.
+    """
+    tempos = []
+    consultas = []
+    for _ in range(repeticoes):
+        argumento = preparar() if preparar else None
+        with CaptureQueriesContext(connection) as capturadas:
+            inicio = time.perf_counter()
+            resposta = operacao(argumento) if preparar else operacao()
+            tempos.append(time.perf_counter() - inicio)
+        if resposta.status_code >= 400:
+            raise RuntimeError(
+                f'resposta {resposta.status_code} durante o benchmark')
+        consultas.append(len(capturadas))
+    return resumo(tempos, consultas)
+
+
+def medir_operacoes(cliente, repeticoes=5):
+    """Dashboard, listagem de vendas, cadastro e exclusão de uma venda."""
+    produto = Estoque.objects.order_by('pk').first()
+    Estoque.objects.filter(pk=produto.pk).update(quantidade_em_estoque=10 ** 9)
+    criadas = []
+
+    def criar():
+        resposta = cliente.post('/formulariodevenda/', {
+            'produto': produto.pk, 'quantidade_vendida': 1})
+        criadas.append(Venda.objects.order_by('-pk').values_list(
+            'pk', flat=True).first())
+        return resposta
+
+    def excluir(pk):
+        return cliente.post(f'/venda/excluir/{pk}/')
+
+    def dashboard_frio():
+        cache.clear()
+        return cliente.get('/dashboard/')
+
+    resultados = {
+        'dashboard_frio': medir(dashboard_frio, repeticoes),
+        'dashboard_cache': medir(lambda: cliente.get('/dashboard/'), repeticoes),
+        'sale_list_primeira': medir(
+            lambda: cliente.get('/sale_list/'), repeticoes),
+        'sale_list_ultima': medir(
+            lambda: cliente.get('/sale_list/?antes='), repeticoes),
+        'criar_venda': medir(criar, repeticoes),
+    }
+    resultados['excluir_venda'] = medir(excluir, len(criadas),
+                                        preparar=criadas.pop)
+    return resultados
+
+
+def executar_cenario(produtos, vendas, anos=3, repeticoes=5, semente=0):
+    """
+    Gera os dados de um cenário no banco atual (que deve estar vazio) e
+    mede as operações. Retorna o dicionário do cenário para o JSON.
+    """
+    inicio = time.perf_counter()
+    gerar_dados(produtos, vendas, anos=anos, semente=semente)
+    geracao = time.perf_counter() - inicio
+
+    usuario = get_user_model().objects.create_user(
+        'benchmark@teste.com', 'benchmark', first_name='Benchmark')
+    cliente = Client()
+    cliente.force_login(usuario)
+    with override_settings(ALLOWED_HOSTS=['testserver']):
+        operacoes = medir_operacoes(cliente, repeticoes)
+    return {
+        'produtos': produtos,
+        'vendas': vendas,
+        'anos': anos,
+        'geracao_segundos': round(geracao, 2),
+        'operacoes': operacoes,
+    }
+
+
+def ambiente():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'banco': connection.vendor,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'maquina': platform.platform(),
+    }
+
+
+@contextmanager
+def banco_temporario():
+    """
+    Cria um banco de teste vazio, migrado, para o benchmark e o apaga no
+    final. No SQLite o banco fica num arquivo temporário, não em memória,
+    para medir também o custo de disco e de abrir conexões.
+    """
+    with tempfile.TemporaryDirectory() as pasta:
+        if connection.vendor == 'sqlite':
+            connection.settings_dict['TEST']['NAME'] = os.path.join(
+                pasta, 'benchmark.sqlite3')
+        nome_original = connection.settings_dict['NAME']
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(nome_original, verbosity=0)
+
+
+def requisicoes_por_segundo(caminho, requisicoes, conn_max_age, cookie='',
+                            latencia_de_conexao=0.0):
+    """
+    Atende `requisicoes` GETs a `caminho` pelo WSGIHandler, como um servidor
+    faria, inclusive fechando ou mantendo a conexão no fim de cada uma
+    conforme `conn_max_age`. `latencia_de_conexao` (segundos) é somada a
+    cada conexão aberta, para simular o handshake de um banco em rede.
+    Retorna requisições por segundo e quantas conexões foram abertas.
+    """
+    abertas = 0
+
+    def ao_conectar(sender, connection, **kwargs):
+        nonlocal abertas
+        abertas += 1
+        if latencia_de_conexao:
+            time.sleep(latencia_de_conexao)
+
+    anterior = connection.settings_dict['CONN_MAX_AGE']
+    connection.settings_dict['CONN_MAX_AGE'] = conn_max_age
+    connection.close()
+    connection_created.connect(ao_conectar)
+    handler = WSGIHandler()
+    try:
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            inicio = time.perf_counter()
+            for _ in range(requisicoes):
+                environ = RequestFactory().get(caminho, HTTP_COOKIE=cookie).environ
+                resposta = handler(environ, lambda status, cabecalhos: None)
+                if resposta.status_code != 200:
+                    raise RuntimeError(
+                        f'resposta {resposta.status_code} durante o benchmark')
+                # close() dispara request_finished, que fecha as conexões
+                # vencidas, como no fim de uma requisição de verdade.
+                resposta.close()
+            segundos = time.perf_counter() - inicio
+    finally:
+        connection_created.disconnect(ao_conectar)
+        connection.settings_dict['CONN_MAX_AGE'] = anterior
+        connection.close()
+    return {
+        'conn_max_age': conn_max_age,
+        'requisicoes': requisicoes,
+        'requisicoes_por_segundo': round(requisicoes / segundos, 1),
+        'conexoes_abertas': abertas,
+    }
@@ -0,0 +1,93 @@
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+CHAVE_VERSAO = 'core:versao_dos_dados'
+CHAVE_ALTERACAO = 'core:dados_alterados_em'
+
+
+def cache_do_dashboard():
+    return caches[getattr(settings, 'DASHBOARD_CACHE', 'default')]
+
+
+def versao_dos_dados():
+    cache = cache_do_dashboard()
+    versao = cache.get(CHAVE_VERSAO)
+    if versao is None:
+        # Começa de um valor que não se repete para não reaproveitar entradas
+        # antigas se só a chave da versão tiver sido descartada pelo cache.
+        cache.add(CHAVE_VERSAO, time.time_ns(), None)
+        versao = cache.get(CHAVE_VERSAO)
+    return versao
+
+
+def _incrementar_versao():
+    cache = cache_do_dashboard()
+    try:
+        cache.incr(CHAVE_VERSAO)
+    except ValueError:
+        cache.add(CHAVE_VERSAO, time.time_ns(), None)
+    cache.set(CHAVE_ALTERACAO, timezone.now(), None)
+
+
+def dados_alterados_em():
+    """
+    Momento da última troca de versão dos dados. Se a marca tiver sido
+    descartada pelo cache, recomeça de agora, o que só invalida os
+    clientes, nunca os deixa com dados antigos.
+    """
+    cache = cache_do_dashboard()
+    momento = cache.get(CHAVE_ALTERACAO)
+    if momento is None:
+        cache.add(CHAVE_ALTERACAO, timezone.now(), None)
+        momento = cache.get(CHAVE_ALTERACAO)
+    return momento
+
+
+def invalidar(**kwargs):
+    """
+    Muda a versão dos dados, tornando obsoletos todos os números em cache.
+    Repete a troca depois do commit para que uma leitura feita antes dele
+    não deixe em cache números sem a alteração.
+    """
+    _incrementar_versao()
+    transaction.on_commit(_incrementar_versao)
+
+
+def _chave(nome, agora):
+    hoje = timezone.localdate(agora or timezone.now())
+    return f'core:{nome}:{versao_dos_dados()}:{hoje.isoformat()}'
+
+
+def _timeout():
+    return getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 3600)
+
+
+def em_cache(nome, calcular, agora=None):
+    """
+    Retorna o valor guardado para `nome` na versão atual dos dados, ou
+    calcula e guarda. A chave inclui o dia local, já que semana e mês
+    correntes mudam com a data mesmo sem novas vendas.
+    """
+    cache = cache_do_dashboard()
+    chave = _chave(nome, agora)
+    valor = cache.get(chave)
+    if valor is None:
+        valor = calcular()
+        cache.set(chave, valor, _timeout())
+    return valor
+
+
+async def em_cache_async(nome, calcular, agora=None):
+    """Como em_cache, para views assíncronas; `calcular` é uma corrotina."""
+    cache = cache_do_dashboard()
+    chave = await sync_to_async(_chave)(nome, agora)
+    valor = await cache.aget(chave)
+    if valor is None:
+        valor = await calcular()
+        await cache.aset(chave, valor, _timeout())
+    return valor
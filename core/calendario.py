@@ -0,0 +1,93 @@
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
+
+from django.utils import timezone
+
+DIA = 'dia'
+SEMANA = 'semana'
+MES = 'mes'
+TRIMESTRE = 'trimestre'
+ANO = 'ano'
+PERSONALIZADO = 'personalizado'
+
+TIPOS = (DIA, SEMANA, MES, TRIMESTRE, ANO, PERSONALIZADO)
+
+# Tamanhos de intervalo das séries do dashboard.
+GRANULARIDADES = (DIA, SEMANA, MES)
+
+# Tamanho em meses dos períodos de calendário; o anterior de um deles é o
+# mês, trimestre ou ano anterior, não os mesmos dias deslocados.
+MESES_DO_PERIODO = {MES: 1, TRIMESTRE: 3, ANO: 12}
+
+
+def inicio_do_dia(dia):
+    """Meia-noite do dia no fuso configurado, como datetime com fuso."""
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def somar_meses(dia, meses):
+    """Primeiro dia do mês `meses` meses depois (ou antes) do de `dia`."""
+    indice = dia.year * 12 + dia.month - 1 + meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+class Periodo(namedtuple('Periodo', 'tipo inicio fim')):
+    """Intervalo semiaberto [inicio, fim) de dias locais."""
+
+    __slots__ = ()
+
+    @property
+    def dias(self):
+        return (self.fim - self.inicio).days
+
+    def anterior(self):
+        """
+        O período imediatamente anterior, do mesmo tipo: a semana ISO, o mês,
+        o trimestre ou o ano anterior, inclusive na virada do ano. Para dias
+        e intervalos personalizados, os mesmos tantos dias logo antes.
+        """
+        if self.tipo in MESES_DO_PERIODO:
+            inicio = somar_meses(self.inicio, -MESES_DO_PERIODO[self.tipo])
+        else:
+            inicio = self.inicio - timedelta(days=self.dias)
+        return Periodo(self.tipo, inicio, self.inicio)
+
+    def limites(self):
+        """Início e fim como datetimes com fuso, à meia-noite local."""
+        return inicio_do_dia(self.inicio), inicio_do_dia(self.fim)
+
+
+def periodo(tipo, referencia=None, ultimo=None):
+    """
+    O período de `tipo` que contém o dia `referencia` (hoje, por padrão).
+    Para PERSONALIZADO, `referencia` e `ultimo` são o primeiro e o último
+    dia do intervalo, ambos inclusive. Levanta ValueError para um tipo
+    desconhecido ou um intervalo invertido.
+    """
+    if tipo == PERSONALIZADO:
+        if referencia is None or ultimo is None or ultimo < referencia:
+            raise ValueError('intervalo personalizado inválido')
+        return Periodo(tipo, referencia, ultimo + timedelta(days=1))
+    referencia = referencia or timezone.localdate()
+    if tipo == DIA:
+        return Periodo(tipo, referencia, referencia + timedelta(days=1))
+    if tipo == SEMANA:
+        segunda = referencia - timedelta(days=referencia.weekday())
+        return Periodo(tipo, segunda, segunda + timedelta(days=7))
+    if tipo in MESES_DO_PERIODO:
+        meses = MESES_DO_PERIODO[tipo]
+        mes = (referencia.month - 1) // meses * meses + 1
+        inicio = date(referencia.year, mes, 1)
+        return Periodo(tipo, inicio, somar_meses(inicio, meses))
+    raise ValueError(f'tipo de período desconhecido: {tipo}')
+
+
+def intervalos(inicio, fim, granularidade):
+    """
+    Os períodos de `granularidade` que cobrem [inicio, fim), em ordem. O
+    primeiro e o último podem começar antes ou terminar depois dos limites.
+    """
+    atual = periodo(granularidade, inicio)
+    while atual.inicio < fim:
+        yield atual
+        atual = periodo(granularidade, atual.fim)
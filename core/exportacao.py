@@ -0,0 +1,61 @@
+import csv
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+
+from .metricas import inicio_do_dia, valor_da_linha, valor_lucro
+from .models import Estoque, Venda
+
+TAMANHO_DO_BLOCO = 2000
+CENTAVOS = Decimal('0.01')
+
+CABECALHO_VENDAS = ['id', 'data_da_venda', 'produto', 'quantidade_vendida',
+                    'preco_de_venda', 'preco_de_compra', 'valor_total', 'lucro']
+CABECALHO_ESTOQUE = ['id', 'produto_em_estoque', 'preco_de_venda',
+                     'preco_de_compra', 'quantidade_em_estoque']
+
+
+class Eco:
+    """Pseudo-arquivo que devolve o que recebe, para o csv.writer."""
+
+    def write(self, valor):
+        return valor
+
+
+def vendas(inicio=None, fim=None, chunk_size=TAMANHO_DO_BLOCO):
+    """
+    Linhas de venda em ordem de data, lidas do banco em blocos. `inicio` e
+    `fim` são dias locais, ambos incluídos.
+    """
+    yield CABECALHO_VENDAS
+    queryset = Venda.objects.order_by('data_da_venda', 'id')
+    if inicio:
+        queryset = queryset.filter(data_da_venda__gte=inicio_do_dia(inicio))
+    if fim:
+        queryset = queryset.filter(
+            data_da_venda__lt=inicio_do_dia(fim + timedelta(days=1)))
+    linhas = queryset.annotate(lucro=valor_da_linha(valor_lucro())).values_list(
+        'id', 'data_da_venda', 'produto__produto_em_estoque',
+        'quantidade_vendida', 'preco_de_venda', 'preco_de_compra',
+        'valor_total', 'lucro',
+    )
+    for linha in linhas.iterator(chunk_size=chunk_size):
+        lucro = linha[-1]
+        if lucro is not None:
+            lucro = lucro.quantize(CENTAVOS)
+        yield (linha[0], timezone.localtime(linha[1]).isoformat()) + \
+            linha[2:-1] + (lucro,)
+
+
+def estoque(chunk_size=TAMANHO_DO_BLOCO):
+    yield CABECALHO_ESTOQUE
+    linhas = Estoque.objects.order_by('id').values_list(*CABECALHO_ESTOQUE)
+    yield from linhas.iterator(chunk_size=chunk_size)
+
+
+def csv_em_streaming(linhas, delimitador=';'):
+    """Converte as linhas em texto CSV, uma linha por vez."""
+    escritor = csv.writer(Eco(), delimiter=delimitador)
+    for linha in linhas:
+        yield escritor.writerow(linha)
@@ -1,6 +1,53 @@
+from datetime import date, timedelta
+
 from django import forms
+from django.urls import reverse_lazy
+from django.utils import timezone
+from django.utils.html import format_html
+
+from . import calendario
+from .models import Estoque, Venda
+
+
+class BuscaDeProdutoWidget(forms.Widget):
+    """
+    Campo de texto com sugestões buscadas em /api/produtos/ enquanto o
+    usuário digita; o id do produto escolhido vai num input escondido. Não
+    carrega o catálogo na página, ao contrário de um <select>.
+    """
+    url = reverse_lazy('api_produtos')
+    # Produtos já carregados ({pk: Estoque}), para mostrar o nome do valor
+    # atual sem consultar o banco (usado pelo formset de pedido).
+    produtos = None
+
+    class Media:
+        js = ['js/busca_de_produto.js']
 
-from .models import Venda
+    def nome_do_produto(self, valor):
+        if valor in (None, ''):
+            return ''
+        try:
+            pk = int(valor)
+        except (TypeError, ValueError):
+            return ''
+        if self.produtos is not None:
+            produto = self.produtos.get(pk)
+            return str(produto) if produto else ''
+        return Estoque.objects.filter(pk=pk).values_list(
+            'produto_em_estoque', flat=True).first() or ''
+
+    def render(self, name, value, attrs=None, renderer=None):
+        attrs = self.build_attrs(self.attrs, attrs)
+        identificador = attrs.get('id', f'id_{name}')
+        return format_html(
+            '<input type="hidden" name="{}" id="{}" value="{}">'
+            '<input type="text" id="{}_busca" list="{}_sugestoes" '
+            'data-busca-produto="{}" data-url="{}" value="{}" '
+            'placeholder="Digite o nome do produto" autocomplete="off">'
+            '<datalist id="{}_sugestoes"></datalist>',
+            name, identificador, '' if value is None else value,
+            identificador, identificador, identificador, self.url,
+            self.nome_do_produto(value), identificador)
 
 
 class VendaModelForm(forms.ModelForm):
@@ -15,3 +62,180 @@ class VendaModelForm(forms.ModelForm):
         model = Venda
         fields = ('quantidade_vendida', 'produto')
         required = ['quantidade_vendida', 'produto']
+        widgets = {'produto': BuscaDeProdutoWidget}
+
+
+class ImportarVendasForm(forms.Form):
+    arquivo = forms.FileField(
+        label='Arquivo', help_text='CSV ou XLSX com as colunas produto, '
+        'quantidade e data (opcional).')
+    lote = forms.IntegerField(
+        label='Vendas por lote', min_value=1, initial=1000)
+
+    def clean_arquivo(self):
+        arquivo = self.cleaned_data['arquivo']
+        if not arquivo.name.lower().endswith(('.csv', '.xlsx')):
+            raise forms.ValidationError('Envie um arquivo .csv ou .xlsx.')
+        return arquivo
+
+
+class IntervaloForm(forms.Form):
+    """
+    Intervalo de dias, ambos inclusive, dos relatórios. Sem datas, o ano
+    corrente; só com o início, até o fim do ano dele.
+    """
+    inicio = forms.DateField(label='De', required=False)
+    fim = forms.DateField(label='Até', required=False)
+
+    def clean(self):
+        dados = super().clean()
+        hoje = timezone.localdate()
+        inicio = dados.get('inicio') or date(hoje.year, 1, 1)
+        fim = dados.get('fim') or date(inicio.year, 12, 31)
+        if fim < inicio:
+            raise forms.ValidationError(
+                'A data final deve ser igual ou posterior à inicial.')
+        dados.update(inicio=inicio, fim=fim)
+        return dados
+
+    def intervalo(self):
+        """(inicio, fim exclusivo) do intervalo validado."""
+        return (self.cleaned_data['inicio'],
+                self.cleaned_data['fim'] + timedelta(days=1))
+
+
+class FiltroDoDashboardForm(IntervaloForm):
+    """
+    Intervalo e granularidade das séries do dashboard. Sem parâmetros, o
+    ano corrente mês a mês, como o dashboard sempre mostrou.
+    """
+    # Limite de pontos de uma série: dez anos dia a dia.
+    MAXIMO_DE_INTERVALOS = 3660
+
+    granularidade = forms.ChoiceField(
+        label='Agrupar por', required=False,
+        widget=forms.Select(attrs={'class': 'form-control border px-2'}),
+        choices=[
+            (calendario.DIA, 'Dia'), (calendario.SEMANA, 'Semana'),
+            (calendario.MES, 'Mês')])
+
+    def clean(self):
+        dados = super().clean()
+        granularidade = dados.get('granularidade') or calendario.MES
+        dias = (dados['fim'] - dados['inicio']).days + 1
+        tamanho = {calendario.DIA: 1, calendario.SEMANA: 7,
+                   calendario.MES: 28}[granularidade]
+        if dias / tamanho > self.MAXIMO_DE_INTERVALOS:
+            raise forms.ValidationError(
+                'Intervalo longo demais para essa granularidade.')
+        dados['granularidade'] = granularidade
+        return dados
+
+    def limites(self):
+        """(inicio, fim exclusivo, granularidade) do filtro validado."""
+        return (*self.intervalo(), self.cleaned_data['granularidade'])
+
+
+class AnaliseDeProdutosForm(IntervaloForm):
+    ordem = forms.ChoiceField(
+        label='Ordenar por', required=False,
+        widget=forms.Select(attrs={'class': 'form-control border px-2'}),
+        choices=[('receita', 'Receita'), ('lucro', 'Lucro'),
+                 ('unidades', 'Unidades')])
+    limite = forms.IntegerField(
+        label='Produtos', required=False, min_value=1, max_value=100)
+
+    def clean(self):
+        dados = super().clean()
+        dados['ordem'] = dados.get('ordem') or 'receita'
+        dados['limite'] = dados.get('limite') or 10
+        return dados
+
+
+class RankingDeVendedoresForm(IntervaloForm):
+    limite = forms.IntegerField(
+        label='Vendedores', required=False, min_value=1, max_value=100)
+
+    def clean(self):
+        dados = super().clean()
+        dados['limite'] = dados.get('limite') or 10
+        return dados
+
+
+class ProdutoChoiceField(forms.ModelChoiceField):
+    """
+    ModelChoiceField que procura o produto num dicionário compartilhado pelo
+    formset, em vez de fazer um SELECT para cada linha do pedido.
+    """
+    produtos = None
+
+    def to_python(self, value):
+        if value in self.empty_values or self.produtos is None:
+            return super().to_python(value)
+        try:
+            return self.produtos[int(value)]
+        except (KeyError, TypeError, ValueError):
+            raise forms.ValidationError(
+                self.error_messages['invalid_choice'], code='invalid_choice',
+                params={'value': value})
+
+
+class ItemPedidoForm(forms.Form):
+    produto = ProdutoChoiceField(queryset=Estoque.objects.all(),
+                                 widget=BuscaDeProdutoWidget)
+    quantidade_vendida = forms.DecimalField(
+        label='Quantidade Vendida', max_digits=18, decimal_places=0,
+        min_value=1)
+
+
+class BaseItemPedidoFormSet(forms.BaseFormSet):
+
+    def produtos(self):
+        """Carrega, com uma consulta, todos os produtos citados no POST."""
+        if not hasattr(self, '_produtos'):
+            ids = set()
+            for i in range(self.total_form_count()):
+                valor = self.data.get(f'{self.prefix}-{i}-produto')
+                if valor and str(valor).isdigit():
+                    ids.add(int(valor))
+            self._produtos = Estoque.objects.in_bulk(ids)
+        return self._produtos
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        if self.is_bound:
+            form.fields['produto'].produtos = self.produtos()
+            form.fields['produto'].widget.produtos = self.produtos()
+        return form
+
+    def clean(self):
+        if any(self.errors):
+            return
+        pedidas = {}
+        for form in self.forms:
+            if not form.has_changed() or form in self.deleted_forms:
+                continue
+            produto = form.cleaned_data['produto']
+            pedidas[produto] = pedidas.get(produto, 0) + \
+                form.cleaned_data['quantidade_vendida']
+        if not pedidas:
+            raise forms.ValidationError('Informe ao menos um item.')
+        faltando = [
+            str(produto) for produto, quantidade in pedidas.items()
+            if (produto.quantidade_em_estoque or 0) < quantidade
+        ]
+        if faltando:
+            raise forms.ValidationError(
+                'Quantidade em estoque insuficiente: %s.' % ', '.join(faltando))
+
+    def itens(self, vendedor=None):
+        return [
+            Venda(produto=form.cleaned_data['produto'],
+                  quantidade_vendida=form.cleaned_data['quantidade_vendida'],
+                  vendedor=vendedor)
+            for form in self.forms if form.has_changed()
+        ]
+
+
+ItemPedidoFormSet = forms.formset_factory(
+    ItemPedidoForm, formset=BaseItemPedidoFormSet, extra=5)
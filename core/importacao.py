@@ -0,0 +1,180 @@
+import csv
+import io
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .cache import invalidar
+from .models import Estoque, MovimentoDeEstoque, Venda, VendaDiaria
+
+FORMATOS_DE_DATA = ['%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y',
+                    '%Y-%m-%d']
+
+
+class ErroDeImportacao(Exception):
+    pass
+
+
+class ResultadoImportacao:
+    # Um arquivo muito errado não fica inteiro em memória: só as primeiras
+    # linhas rejeitadas são guardadas com o motivo, as demais são contadas.
+    LIMITE_DE_REJEITADAS = 100
+
+    def __init__(self):
+        self.importadas = 0
+        self.rejeitadas = []
+        self.total_de_rejeitadas = 0
+        self.segundos = 0.0
+
+    def rejeitar(self, numero, motivo):
+        self.total_de_rejeitadas += 1
+        if len(self.rejeitadas) < self.LIMITE_DE_REJEITADAS:
+            self.rejeitadas.append((numero, motivo))
+
+    @property
+    def rejeitadas_omitidas(self):
+        return self.total_de_rejeitadas - len(self.rejeitadas)
+
+    @property
+    def linhas_por_segundo(self):
+        total = self.importadas + self.total_de_rejeitadas
+        return total / self.segundos if self.segundos else 0.0
+
+    def __str__(self):
+        return (f'{self.importadas} vendas importadas em {self.segundos:.2f}s '
+                f'({self.linhas_por_segundo:.0f} linhas/s), '
+                f'{self.total_de_rejeitadas} linhas rejeitadas.')
+
+
+def _chave(nome):
+    return (nome or '').strip().casefold()
+
+
+def _data(valor, agora):
+    if valor in (None, ''):
+        return agora
+    if isinstance(valor, datetime):
+        data = valor
+    else:
+        valor = str(valor).strip()
+        data = parse_datetime(valor)
+        for formato in FORMATOS_DE_DATA:
+            if data is not None:
+                break
+            try:
+                data = datetime.strptime(valor, formato)
+            except ValueError:
+                pass
+        if data is None:
+            raise ValueError(f'data inválida: {valor}')
+    if timezone.is_naive(data):
+        data = timezone.make_aware(data)
+    return data
+
+
+def linhas_csv(arquivo, encoding='utf-8-sig'):
+    """Lê um CSV (separado por ',' ou ';') como dicionários, linha a linha."""
+    if not isinstance(arquivo, io.TextIOBase):
+        arquivo = io.TextIOWrapper(arquivo, encoding=encoding, newline='')
+    inicio = arquivo.read(4096)
+    try:
+        dialeto = csv.Sniffer().sniff(inicio, delimiters=',;')
+    except csv.Error:
+        dialeto = csv.excel
+    leitor = csv.DictReader(_concatenar(inicio, arquivo), dialect=dialeto)
+    for linha in leitor:
+        yield {_chave(coluna): valor for coluna, valor in linha.items() if coluna}
+
+
+def _concatenar(inicio, arquivo):
+    # csv.reader precisa de linhas; reaproveita o trecho lido pelo Sniffer.
+    yield from io.StringIO(inicio + arquivo.readline())
+    yield from arquivo
+
+
+def linhas_xlsx(arquivo):
+    """Lê a primeira planilha de um XLSX em modo somente leitura (streaming)."""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ErroDeImportacao(
+            'Para importar arquivos XLSX instale o pacote openpyxl.')
+    planilha = load_workbook(arquivo, read_only=True, data_only=True).active
+    linhas = planilha.iter_rows(values_only=True)
+    colunas = [_chave(str(coluna or '')) for coluna in next(linhas, ())]
+    for valores in linhas:
+        yield dict(zip(colunas, valores))
+
+
+def ler_arquivo(arquivo, nome):
+    if nome.lower().endswith('.xlsx'):
+        return linhas_xlsx(arquivo)
+    return linhas_csv(arquivo)
+
+
+def importar_vendas(linhas, tamanho_do_lote=1000, vendedor=None):
+    """
+    Importa vendas de um iterável de dicionários com as colunas 'produto',
+    'quantidade' e, opcionalmente, 'data', atribuídas a `vendedor`.
+
+    Os produtos são resolvidos por nome com um único SELECT. Cada lote é
+    gravado numa transação com um bulk_create das vendas, um UPDATE com a
+    baixa líquida de estoque de todos os produtos do lote, os movimentos de
+    saída no diário de estoque e a atualização em lote do consolidado
+    diário. Linhas inválidas são rejeitadas com o
+    número da linha e o motivo, sem interromper a importação.
+    """
+    inicio = time.perf_counter()
+    resultado = ResultadoImportacao()
+    produtos = {
+        _chave(produto.produto_em_estoque): produto
+        for produto in Estoque.objects.only(
+            'id', 'produto_em_estoque', 'preco_de_venda', 'preco_de_compra')
+    }
+    agora = timezone.now()
+    lote = []
+    # A linha 1 é o cabeçalho.
+    for numero, linha in enumerate(linhas, start=2):
+        try:
+            produto = produtos.get(_chave(linha.get('produto')))
+            if produto is None:
+                raise ValueError(f'produto não encontrado: {linha.get("produto")}')
+            quantidade = Decimal(str(linha.get('quantidade')).strip())
+            if quantidade <= 0 or quantidade != quantidade.to_integral_value():
+                raise ValueError(f'quantidade inválida: {linha.get("quantidade")}')
+            venda = Venda(produto=produto, quantidade_vendida=quantidade,
+                          data_da_venda=_data(linha.get('data'), agora),
+                          vendedor=vendedor)
+        except (ValueError, InvalidOperation) as erro:
+            resultado.rejeitar(numero, str(erro))
+            continue
+        venda.congelar_precos()
+        venda.calcular_total()
+        lote.append(venda)
+        if len(lote) >= tamanho_do_lote:
+            _gravar_lote(lote)
+            resultado.importadas += len(lote)
+            lote = []
+    if lote:
+        _gravar_lote(lote)
+        resultado.importadas += len(lote)
+    if resultado.importadas:
+        invalidar()
+    resultado.segundos = time.perf_counter() - inicio
+    return resultado
+
+
+def _gravar_lote(lote):
+    baixas = {}
+    for venda in lote:
+        baixas[venda.produto_id] = \
+            baixas.get(venda.produto_id, 0) + venda.quantidade_vendida
+    with transaction.atomic():
+        Venda.objects.bulk_create(lote)
+        Estoque.objects.baixar_varios(baixas, exigir_saldo=False)
+        MovimentoDeEstoque.objects.registrar_vendas(lote)
+        VendaDiaria.objects.registrar_varias(lote)
@@ -0,0 +1,182 @@
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+# Quantas requisições recentes guardar por rota, em cada processo.
+AMOSTRAS_POR_ROTA = 1000
+
+QUANTIS = (0.5, 0.9, 0.99)
+
+# Nome, unidade e descrição de cada medida, na ordem das amostras.
+MEDIDAS = [
+    ('consultas', '', 'consultas SQL por requisição'),
+    ('sql', 'ms', 'tempo total em SQL'),
+    ('template', 'ms', 'tempo de renderização do template'),
+    ('total', 'ms', 'tempo total da requisição'),
+    ('tamanho', 'bytes', 'tamanho da resposta'),
+]
+
+
+class Registro:
+    """Amostras recentes por nome de rota, seguras entre threads."""
+
+    def __init__(self, tamanho=AMOSTRAS_POR_ROTA):
+        self._lock = threading.Lock()
+        self._amostras = defaultdict(lambda: deque(maxlen=tamanho))
+        self._contagem = defaultdict(int)
+
+    def adicionar(self, rota, amostra):
+        with self._lock:
+            self._amostras[rota].append(amostra)
+            self._contagem[rota] += 1
+
+    def limpar(self):
+        with self._lock:
+            self._amostras.clear()
+            self._contagem.clear()
+
+    def resumo(self):
+        """{rota: (requisições, {medida: {quantil: valor}})}"""
+        with self._lock:
+            copia = {rota: (self._contagem[rota], list(amostras))
+                     for rota, amostras in self._amostras.items()}
+        resumo = {}
+        for rota, (contagem, amostras) in sorted(copia.items()):
+            medidas = {}
+            for i, (nome, _, _) in enumerate(MEDIDAS):
+                valores = sorted(a[i] for a in amostras if a[i] is not None)
+                if valores:
+                    medidas[nome] = {q: quantil(valores, q) for q in QUANTIS}
+            resumo[rota] = (contagem, medidas)
+        return resumo
+
+
+def quantil(valores, q):
+    """Quantil pelo posto mais próximo de uma lista já ordenada."""
+    posicao = min(len(valores) - 1, max(0, math.ceil(q * len(valores)) - 1))
+    return valores[posicao]
+
+
+registro = Registro()
+
+# Medição da requisição em andamento, para as threads que fazem consultas
+# em nome dela (ver metricas.em_paralelo).
+medicao_atual = ContextVar('medicao_atual', default=None)
+
+
+class Medicao:
+
+    def __init__(self):
+        self.consultas = 0
+        self.sql = 0.0
+        self.template = None
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracao = time.perf_counter() - inicio
+            with self._lock:
+                self.sql += duracao
+                self.consultas += 1
+
+
+@contextmanager
+def medindo(medicao):
+    """Conta na `medicao` as consultas das conexões da thread atual."""
+    with ExitStack() as pilha:
+        if medicao is not None:
+            for conexao in connections.all():
+                pilha.enter_context(conexao.execute_wrapper(medicao))
+        yield
+
+
+class InstrumentacaoMiddleware:
+    """
+    Mede, por rota, quantas consultas SQL a requisição fez, quanto tempo
+    passou no banco, na renderização do template e no total, e o tamanho
+    da resposta. Os números vão no cabeçalho Server-Timing e se acumulam
+    no registro exposto em /metrics/.
+
+    Só é ativado com INSTRUMENTACAO = True. O tempo de template é medido
+    nas respostas com TemplateResponse (views baseadas em classe); nas que
+    usam render() ele fica dentro do total. Respostas em streaming não
+    contam as consultas feitas enquanto o corpo é gerado. Consultas em
+    outras threads só contam quando passam por metricas.em_paralelo, que
+    leva a medição para o pool; o tempo de SQL é então a soma do tempo de
+    cada consulta, que pode passar do tempo total.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'INSTRUMENTACAO', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        medicao = Medicao()
+        request._medicao = medicao
+        inicio = time.perf_counter()
+        token = medicao_atual.set(medicao)
+        try:
+            with medindo(medicao):
+                response = self.get_response(request)
+        finally:
+            medicao_atual.reset(token)
+        total = time.perf_counter() - inicio
+
+        if response.streaming:
+            tamanho = None
+        else:
+            tamanho = len(response.content)
+        response['Server-Timing'] = ', '.join(filter(None, [
+            f'db;dur={medicao.sql * 1000:.1f};desc="{medicao.consultas} consultas"',
+            (f'tpl;dur={medicao.template * 1000:.1f}'
+             if medicao.template is not None else ''),
+            f'total;dur={total * 1000:.1f}',
+        ]))
+
+        match = getattr(request, 'resolver_match', None)
+        rota = match.view_name if match else 'sem_rota'
+        registro.adicionar(rota, (
+            medicao.consultas, medicao.sql * 1000,
+            medicao.template * 1000 if medicao.template is not None else None,
+            total * 1000, tamanho))
+        return response
+
+    def process_template_response(self, request, response):
+        # A renderização acontece logo depois deste hook; o callback fecha a
+        # medição quando ela termina.
+        inicio = time.perf_counter()
+
+        def fim(response):
+            request._medicao.template = time.perf_counter() - inicio
+
+        response.add_post_render_callback(fim)
+        return response
+
+
+def texto_das_metricas(resumo=None):
+    """Resumo no formato de texto do Prometheus (summary por rota)."""
+    resumo = registro.resumo() if resumo is None else resumo
+    linhas = []
+    for nome, unidade, descricao in MEDIDAS:
+        metrica = f'django_view_{nome}' + (f'_{unidade}' if unidade else '')
+        linhas.append(f'# HELP {metrica} {descricao}')
+        linhas.append(f'# TYPE {metrica} summary')
+        for rota, (contagem, medidas) in resumo.items():
+            if nome not in medidas:
+                continue
+            for q, valor in medidas[nome].items():
+                linhas.append(f'{metrica}{{view="{rota}",quantile="{q}"}} '
+                              f'{valor:.1f}')
+            linhas.append(f'{metrica}_count{{view="{rota}"}} {contagem}')
+    return '\n'.join(linhas) + '\n'
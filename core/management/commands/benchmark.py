@@ -0,0 +1,55 @@
+import json
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core import benchmark
+
+
+def escala(valor):
+    try:
+        produtos, vendas = (int(parte) for parte in valor.split(':'))
+    except ValueError:
+        raise CommandError(f'escala inválida: {valor} (use PRODUTOS:VENDAS)')
+    return produtos, vendas
+
+
+class Command(BaseCommand):
+    help = ('Mede dashboard, sale_list, cadastro e exclusão de vendas em '
+            'bancos sintéticos de tamanhos diferentes e grava o resultado em '
+            'JSON. Roda num banco de teste criado só para isso.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--escala', action='append', type=escala, dest='escalas',
+            help='PRODUTOS:VENDAS, pode ser repetido (padrão: 100:10000 e '
+                 '1000:100000).')
+        parser.add_argument('--anos', type=int, default=3)
+        parser.add_argument('--repeticoes', type=int, default=5)
+        parser.add_argument('--semente', type=int, default=0)
+        parser.add_argument('--saida', default='benchmark.json',
+                            help='Arquivo JSON de resultado.')
+
+    def handle(self, *args, **options):
+        escalas = options['escalas'] or [(100, 10000), (1000, 100000)]
+        resultado = dict(benchmark.ambiente(), data=timezone.now().isoformat(),
+                         cenarios=[])
+        with benchmark.banco_temporario():
+            for produtos, vendas in escalas:
+                self.stdout.write(f'{produtos} produtos, {vendas} vendas...')
+                call_command('flush', interactive=False, verbosity=0)
+                cenario = benchmark.executar_cenario(
+                    produtos, vendas, anos=options['anos'],
+                    repeticoes=options['repeticoes'],
+                    semente=options['semente'])
+                resultado['cenarios'].append(cenario)
+                for nome, medida in cenario['operacoes'].items():
+                    self.stdout.write(
+                        f'  {nome}: {medida["mediana_ms"]} ms '
+                        f'({medida["consultas"]} consultas)')
+
+        with open(options['saida'], 'w', encoding='utf-8') as saida:
+            json.dump(resultado, saida, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(
+            f'Resultado gravado em {options["saida"]}.'))
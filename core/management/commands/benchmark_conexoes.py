@@ -0,0 +1,56 @@
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.utils import timezone
+
+from core import benchmark
+from core.sinteticos import gerar_dados
+
+
+class Command(BaseCommand):
+    help = ('Compara requisições por segundo abrindo uma conexão por '
+            'requisição (CONN_MAX_AGE=0) e reaproveitando a conexão, num '
+            'banco de teste local que faz as vezes do SQL Server.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requisicoes', type=int, default=300)
+        parser.add_argument(
+            '--latencia-conexao', type=float, default=5.0,
+            help='Milissegundos somados a cada conexão aberta, simulando o '
+                 'handshake TCP+TDS de um banco em rede (padrão: 5).')
+        parser.add_argument('--conn-max-age', type=int, default=60,
+                            help='CONN_MAX_AGE do modo com reaproveitamento.')
+        parser.add_argument('--caminho', default='/api/dashboard/indicadores/')
+        parser.add_argument('--saida', default='benchmark_conexoes.json')
+
+    def handle(self, *args, **options):
+        resultado = dict(benchmark.ambiente(), data=timezone.now().isoformat(),
+                         caminho=options['caminho'],
+                         latencia_conexao_ms=options['latencia_conexao'],
+                         modos=[])
+        with benchmark.banco_temporario():
+            gerar_dados(50, 5000, anos=1)
+            usuario = get_user_model().objects.create_user(
+                'benchmark@teste.com', 'benchmark', first_name='Benchmark')
+            cliente = Client()
+            cliente.force_login(usuario)
+            cookie = (f'{settings.SESSION_COOKIE_NAME}='
+                      f'{cliente.cookies[settings.SESSION_COOKIE_NAME].value}')
+            for conn_max_age in (0, options['conn_max_age']):
+                modo = benchmark.requisicoes_por_segundo(
+                    options['caminho'], options['requisicoes'], conn_max_age,
+                    cookie=cookie,
+                    latencia_de_conexao=options['latencia_conexao'] / 1000)
+                resultado['modos'].append(modo)
+                self.stdout.write(
+                    f'CONN_MAX_AGE={conn_max_age}: '
+                    f'{modo["requisicoes_por_segundo"]} req/s, '
+                    f'{modo["conexoes_abertas"]} conexões abertas')
+
+        with open(options['saida'], 'w', encoding='utf-8') as saida:
+            json.dump(resultado, saida, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(
+            f'Resultado gravado em {options["saida"]}.'))
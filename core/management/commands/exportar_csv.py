@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from core import exportacao
+
+
+class Command(BaseCommand):
+    help = 'Exporta vendas ou estoque em CSV, lendo o banco em blocos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tabela', choices=['vendas', 'estoque'])
+        parser.add_argument('--inicio', help='Primeiro dia (AAAA-MM-DD), só vendas.')
+        parser.add_argument('--fim', help='Último dia (AAAA-MM-DD), só vendas.')
+        parser.add_argument('--saida', help='Arquivo de saída (padrão: stdout).')
+        parser.add_argument(
+            '--bloco', type=int, default=exportacao.TAMANHO_DO_BLOCO,
+            help='Linhas lidas do banco por vez.')
+
+    def data(self, valor, opcao):
+        if not valor:
+            return None
+        data = parse_date(valor)
+        if data is None:
+            raise CommandError(f'{opcao} inválido: {valor}')
+        return data
+
+    def handle(self, *args, **options):
+        if options['tabela'] == 'vendas':
+            linhas = exportacao.vendas(
+                self.data(options['inicio'], '--inicio'),
+                self.data(options['fim'], '--fim'),
+                chunk_size=options['bloco'])
+        else:
+            linhas = exportacao.estoque(chunk_size=options['bloco'])
+
+        if not options['saida']:
+            for texto in exportacao.csv_em_streaming(linhas):
+                self.stdout.write(texto, ending='')
+            return
+        with open(options['saida'], 'w', encoding='utf-8', newline='') as saida:
+            saida.writelines(exportacao.csv_em_streaming(linhas))
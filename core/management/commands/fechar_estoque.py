@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from core.models import FechamentoDeEstoque
+
+
+class Command(BaseCommand):
+    help = ('Grava o saldo de estoque de todos os produtos no fim de um dia '
+            '(padrão: ontem), ponto de partida das consultas de saldo em '
+            'datas passadas. Agende para rodar periodicamente.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dia', help='Dia a fechar (AAAA-MM-DD).')
+
+    def handle(self, *args, **options):
+        dia = timezone.localdate() - timedelta(days=1)
+        if options['dia']:
+            dia = parse_date(options['dia'])
+            if dia is None:
+                raise CommandError(f'--dia inválido: {options["dia"]}')
+        try:
+            total = FechamentoDeEstoque.objects.fechar(dia)
+        except ValueError as erro:
+            raise CommandError(str(erro))
+        self.stdout.write(self.style.SUCCESS(
+            f'Estoque de {total} produtos fechado em {dia:%d/%m/%Y}.'))
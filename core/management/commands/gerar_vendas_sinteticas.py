@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.sinteticos import gerar_dados
+
+
+class Command(BaseCommand):
+    help = ('Gera produtos e vendas sintéticos no banco configurado, para '
+            'testes de carga e benchmarks.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--produtos', type=int, default=1000)
+        parser.add_argument('--vendas', type=int, default=100000)
+        parser.add_argument('--anos', type=int, default=3,
+                            help='Período coberto pelas vendas, até hoje.')
+        parser.add_argument('--semente', type=int, default=0)
+        parser.add_argument('--lote', type=int, default=5000,
+                            help='Vendas gravadas por INSERT em lote.')
+
+    def handle(self, *args, **options):
+        if options['produtos'] < 1 or options['vendas'] < 0 or options['anos'] < 1:
+            raise CommandError('Use ao menos 1 produto, 1 ano e vendas >= 0.')
+        inicio = time.perf_counter()
+        gerar_dados(options['produtos'], options['vendas'],
+                    anos=options['anos'], semente=options['semente'],
+                    tamanho_do_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{options["produtos"]} produtos e {options["vendas"]} vendas '
+            f'gerados em {time.perf_counter() - inicio:.1f}s.'))
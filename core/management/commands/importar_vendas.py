@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importacao import ErroDeImportacao, importar_vendas, ler_arquivo
+
+
+class Command(BaseCommand):
+    help = ('Importa vendas de um arquivo CSV ou XLSX com as colunas produto, '
+            'quantidade e data (opcional).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo')
+        parser.add_argument(
+            '--lote', type=int, default=1000,
+            help='Vendas gravadas por transação (padrão: 1000).')
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('--lote deve ser maior que zero.')
+        try:
+            with open(options['arquivo'], 'rb') as arquivo:
+                resultado = importar_vendas(
+                    ler_arquivo(arquivo, options['arquivo']),
+                    tamanho_do_lote=options['lote'])
+        except (OSError, ErroDeImportacao) as erro:
+            raise CommandError(erro)
+
+        for numero, motivo in resultado.rejeitadas:
+            self.stderr.write(f'Linha {numero}: {motivo}')
+        if resultado.rejeitadas_omitidas:
+            self.stderr.write(
+                f'E mais {resultado.rejeitadas_omitidas} linhas rejeitadas.')
+        self.stdout.write(self.style.SUCCESS(str(resultado)))
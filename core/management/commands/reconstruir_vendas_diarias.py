@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from core.models import VendaDiaria
+
+
+class Command(BaseCommand):
+    help = 'Recalcula do zero o consolidado diário de vendas (VendaDiaria).'
+
+    def handle(self, *args, **options):
+        total = VendaDiaria.objects.reconstruir()
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} linhas de venda diária recalculadas.'))
@@ -0,0 +1,394 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import (DateField, DecimalField, ExpressionWrapper, F,
+                              FloatField, Q, Sum)
+from django.db.models.functions import ExtractMonth, Trunc
+from django.utils import timezone
+
+from .calendario import (ANO, DIA, MES, SEMANA, inicio_do_dia, intervalos,
+                         periodo)
+from .instrumentacao import medicao_atual, medindo
+from .models import Venda, VendaDiaria, VendaDiariaPorVendedor
+
+MESES = ['janeiro', 'fevereiro', 'marco', 'abril', 'maio', 'junho', 'julho',
+         'agosto', 'setembro', 'outubro', 'novembro', 'dezembro']
+
+# Ordem usada pelos gráficos, de segunda a domingo.
+DIAS_DA_SEMANA = ['segunda_feira', 'terca_feira', 'quarta_feira',
+                  'quinta_feira', 'sexta_feira', 'sabado', 'domingo']
+
+
+def valor_vendido():
+    return F('valor_total')
+
+
+def valor_lucro():
+    return F('valor_total') - (F('preco_de_compra') * F('quantidade_vendida'))
+
+
+# Para cada tabela de origem: campo de data, expressões de venda e lucro e
+# como converter um dia no limite usado pelo filtro.
+FONTES = {
+    Venda: ('data_da_venda', valor_vendido, valor_lucro, inicio_do_dia),
+    VendaDiaria: ('data', lambda: F('total_vendido'), lambda: F('total_lucro'),
+                  lambda dia: dia),
+    VendaDiariaPorVendedor: ('data', lambda: F('total_vendido'),
+                             lambda: F('total_lucro'), lambda dia: dia),
+}
+
+
+def entre(modelo, inicio, fim):
+    """
+    Filtro semiaberto [inicio, fim) sobre o campo de data da origem. Ao
+    contrário de __year, __month ou __week, que viram funções sobre a
+    coluna, a comparação direta deixa o banco usar o índice.
+    """
+    campo, _, _, limite = FONTES[modelo]
+    return Q(**{f'{campo}__gte': limite(inicio), f'{campo}__lt': limite(fim)})
+
+
+def soma_vendas(filtro=None, modelo=Venda):
+    return Sum(FONTES[modelo][1](), filter=filtro, output_field=FloatField())
+
+
+def soma_lucro(filtro=None, modelo=Venda):
+    return Sum(FONTES[modelo][2](), filter=filtro, output_field=FloatField())
+
+
+def valor_da_linha(expressao):
+    """Valor de uma única venda, para anotar linha a linha."""
+    return ExpressionWrapper(expressao, output_field=DecimalField(
+        max_digits=18, decimal_places=2))
+
+
+def percentual(atual, anterior):
+    if anterior == 0:
+        return '-'
+    return round((atual - anterior) / anterior * 100, 2)
+
+
+def periodos(agora):
+    """Limites [inicio, fim) em dias locais dos períodos do dashboard."""
+    hoje = timezone.localdate(agora)
+    semana = periodo(SEMANA, hoje)
+    mes = periodo(MES, hoje)
+    return {
+        'semana': semana[1:],
+        'semana_anterior': semana.anterior()[1:],
+        'mes': mes[1:],
+        'mes_anterior': mes.anterior()[1:],
+        'ano': periodo(ANO, hoje)[1:],
+    }
+
+
+def comparar(atual, queryset=None):
+    """
+    Vendas e lucro do período `atual` (um calendario.Periodo) e do anterior,
+    com a variação percentual, numa única consulta: o WHERE é um só
+    intervalo sobre o campo de data, cobrindo os dois períodos, e cada soma
+    filtra a sua parte. Por padrão lê o consolidado VendaDiaria.
+    """
+    v = queryset if queryset is not None else VendaDiaria.objects.all()
+    modelo = v.model
+    anterior = atual.anterior()
+    q_atual = entre(modelo, atual.inicio, atual.fim)
+    q_anterior = entre(modelo, anterior.inicio, anterior.fim)
+    totais = v.order_by().filter(
+        entre(modelo, anterior.inicio, atual.fim)).aggregate(
+        vendas=soma_vendas(q_atual, modelo),
+        vendas_anterior=soma_vendas(q_anterior, modelo),
+        lucro=soma_lucro(q_atual, modelo),
+        lucro_anterior=soma_lucro(q_anterior, modelo))
+    totais = {chave: valor or 0 for chave, valor in totais.items()}
+    return {
+        medida: {
+            'atual': totais[medida],
+            'anterior': totais[f'{medida}_anterior'],
+            'percentual': percentual(totais[medida],
+                                     totais[f'{medida}_anterior']),
+        }
+        for medida in ('vendas', 'lucro')
+    }
+
+
+def _grupos_do_dashboard(modelo, limites):
+    """
+    Agregações do dashboard separadas em grupos independentes entre si:
+    {grupo: {chave: Sum(...)}}. A versão síncrona junta todos numa única
+    consulta; a assíncrona dispara um grupo por consulta, em paralelo.
+    """
+
+    def vendas(filtro=None):
+        return soma_vendas(filtro, modelo)
+
+    def lucro(filtro=None):
+        return soma_lucro(filtro, modelo)
+
+    q_semana = entre(modelo, *limites['semana'])
+    q_semana_anterior = entre(modelo, *limites['semana_anterior'])
+    q_mes = entre(modelo, *limites['mes'])
+    q_mes_anterior = entre(modelo, *limites['mes_anterior'])
+
+    segunda = limites['semana'][0]
+    dias = {}
+    for i, dia in enumerate(DIAS_DA_SEMANA):
+        inicio = segunda + timedelta(days=i)
+        dias[f'{dia}_vendas'] = vendas(
+            entre(modelo, inicio, inicio + timedelta(days=1)))
+
+    return {
+        'totais': {
+            'total_vendas2': vendas(),
+            'total_de_lucros2': lucro(),
+        },
+        'semana': {
+            'total_vendas_semana_atual': vendas(q_semana),
+            'total_lucro_semana_atual': lucro(q_semana),
+            'vendas_semana_anterior': vendas(q_semana_anterior),
+            'lucro_semana_anterior': lucro(q_semana_anterior),
+        },
+        'mes': {
+            'total_vendas_mes_atual': vendas(q_mes),
+            'total_lucro_mes_atual': lucro(q_mes),
+            'vendas_mes_anterior': vendas(q_mes_anterior),
+            'lucro_mes_anterior': lucro(q_mes_anterior),
+        },
+        'dias_da_semana': dias,
+    }
+
+
+def _por_mes(v, modelo, limites):
+    campo = FONTES[modelo][0]
+    return {
+        linha['mes']: linha
+        for linha in v.filter(entre(modelo, *limites['ano']))
+        .annotate(mes=ExtractMonth(campo))
+        .values('mes')
+        .annotate(vendas=soma_vendas(None, modelo),
+                  lucro=soma_lucro(None, modelo))
+    }
+
+
+def _montar(totais, por_mes):
+    totais = {chave: valor or 0 for chave, valor in totais.items()}
+    vendas_mes_anterior = totais.pop('vendas_mes_anterior')
+    lucro_mes_anterior = totais.pop('lucro_mes_anterior')
+    vendas_semana_anterior = totais.pop('vendas_semana_anterior')
+    lucro_semana_anterior = totais.pop('lucro_semana_anterior')
+
+    metricas = dict(totais)
+    metricas['percentual_vendas'] = percentual(
+        totais['total_vendas_mes_atual'], vendas_mes_anterior)
+    metricas['percentual_vendas2'] = percentual(
+        totais['total_lucro_mes_atual'], lucro_mes_anterior)
+    metricas['percentual_vendas_semana_anterior'] = percentual(
+        totais['total_vendas_semana_atual'], vendas_semana_anterior)
+    metricas['percentual_vendas_semana_anterior2'] = percentual(
+        totais['total_lucro_semana_atual'], lucro_semana_anterior)
+
+    metricas['sales_data'] = [totais[f'{dia}_vendas']
+                              for dia in DIAS_DA_SEMANA]
+
+    vendas_meses = []
+    lucro_meses = []
+    for numero, nome in enumerate(MESES, start=1):
+        linha = por_mes.get(numero, {})
+        vendas_do_mes = linha.get('vendas') or 0
+        lucro_do_mes = linha.get('lucro') or 0
+        metricas[f'total_vendas_{nome}'] = vendas_do_mes
+        metricas[f'total_vendas_lucro_{nome}'] = lucro_do_mes
+        vendas_meses.append(vendas_do_mes)
+        lucro_meses.append(lucro_do_mes)
+
+    metricas['sales_data_months'] = vendas_meses
+    metricas['sales_data_months_2'] = lucro_meses
+
+    return metricas
+
+
+def metricas_dashboard(agora=None, queryset=None):
+    """
+    Calcula todos os números do dashboard com duas consultas: uma agregação
+    condicional para os totais, semana, mês e dias da semana, e um GROUP BY
+    por mês para os gráficos do ano corrente.
+
+    Por padrão lê o consolidado VendaDiaria; um queryset de Venda pode ser
+    passado para calcular direto sobre as vendas.
+    """
+    agora = agora or timezone.now()
+    v = queryset if queryset is not None else VendaDiaria.objects.all()
+    v = v.order_by()
+    limites = periodos(agora)
+    agregados = {}
+    for grupo in _grupos_do_dashboard(v.model, limites).values():
+        agregados.update(grupo)
+    return _montar(v.aggregate(**agregados), _por_mes(v, v.model, limites))
+
+
+# Unidade do Trunc de cada granularidade e formato do rótulo no gráfico.
+TRUNCAMENTOS = {DIA: ('day', '%d/%m/%Y'), SEMANA: ('week', '%d/%m/%Y'),
+                MES: ('month', '%m/%Y')}
+
+
+def serie(inicio, fim, granularidade, queryset=None):
+    """
+    Vendas e lucro de [inicio, fim) por dia, semana (começando na segunda)
+    ou mês. Um único GROUP BY sobre a data truncada traz só os intervalos
+    com vendas; os demais são preenchidos com zero aqui, então mesmo uma
+    série diária de vários anos custa uma consulta.
+    """
+    v = queryset if queryset is not None else VendaDiaria.objects.all()
+    modelo = v.model
+    campo = FONTES[modelo][0]
+    unidade, formato = TRUNCAMENTOS[granularidade]
+    linhas = {
+        linha['intervalo']: linha
+        for linha in v.order_by().filter(entre(modelo, inicio, fim))
+        .annotate(intervalo=Trunc(campo, unidade, output_field=DateField()))
+        .values('intervalo')
+        .annotate(vendas=soma_vendas(None, modelo),
+                  lucro=soma_lucro(None, modelo))
+    }
+    resultado = {'labels': [], 'vendas': [], 'lucro': []}
+    for intervalo in intervalos(inicio, fim, granularidade):
+        linha = linhas.get(intervalo.inicio, {})
+        resultado['labels'].append(intervalo.inicio.strftime(formato))
+        resultado['vendas'].append(linha.get('vendas') or 0)
+        resultado['lucro'].append(linha.get('lucro') or 0)
+    return resultado
+
+
+ORDENS_DO_RANKING = ('receita', 'lucro', 'unidades')
+
+
+def ranking_de_produtos(inicio, fim, ordem='receita', limite=10,
+                        queryset=None):
+    """
+    Os `limite` produtos com mais receita, lucro ou unidades vendidas em
+    [inicio, fim), com a margem de cada um. Um GROUP BY por produto com
+    ORDER BY e LIMIT: só N linhas saem do banco. Por padrão lê o
+    consolidado VendaDiaria, que tem uma linha por produto e dia, então o
+    custo acompanha dias e produtos vendidos, não o número de vendas.
+    Vendas de produtos excluídos ficam de fora.
+    """
+    if ordem not in ORDENS_DO_RANKING:
+        raise ValueError(f'ordem desconhecida: {ordem}')
+    v = queryset if queryset is not None else VendaDiaria.objects.all()
+    modelo = v.model
+    linhas = (
+        v.order_by().filter(entre(modelo, inicio, fim), produto__isnull=False)
+        .values('produto', 'produto__produto_em_estoque')
+        .annotate(receita=soma_vendas(None, modelo),
+                  lucro=soma_lucro(None, modelo),
+                  unidades=Sum('quantidade_vendida'))
+        .order_by(f'-{ordem}', 'produto')[:limite]
+    )
+    return [{
+        'id': linha['produto'],
+        'nome': linha['produto__produto_em_estoque'],
+        'receita': linha['receita'] or 0,
+        'lucro': linha['lucro'] or 0,
+        'unidades': int(linha['unidades'] or 0),
+        'margem': (round(linha['lucro'] / linha['receita'] * 100, 2)
+                   if linha['receita'] else None),
+    } for linha in linhas]
+
+
+def ranking_de_vendedores(inicio, fim, limite=10, queryset=None):
+    """
+    Receita, lucro e unidades de cada vendedor em [inicio, fim), do que
+    mais vendeu para o que menos vendeu, até `limite` vendedores. Um
+    GROUP BY por vendedor; por padrão sobre o consolidado diário por
+    vendedor, que tem uma linha por vendedor e dia, não uma por venda.
+    Vendas sem vendedor (anteriores ao campo ou importadas pelo comando)
+    ficam de fora.
+    """
+    if queryset is None:
+        queryset = VendaDiariaPorVendedor.objects.all()
+    v = queryset
+    modelo = v.model
+    linhas = (
+        v.order_by().filter(entre(modelo, inicio, fim), vendedor__isnull=False)
+        .values('vendedor', 'vendedor__first_name', 'vendedor__last_name',
+                'vendedor__email')
+        .annotate(receita=soma_vendas(None, modelo),
+                  lucro=soma_lucro(None, modelo),
+                  unidades=Sum('quantidade_vendida'))
+        .order_by('-receita', 'vendedor')[:limite]
+    )
+    return [{
+        'id': linha['vendedor'],
+        'nome': (f"{linha['vendedor__first_name']} "
+                 f"{linha['vendedor__last_name']}".strip()
+                 or linha['vendedor__email']),
+        'receita': linha['receita'] or 0,
+        'lucro': linha['lucro'] or 0,
+        'unidades': int(linha['unidades'] or 0),
+    } for linha in linhas]
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    """Pool de threads compartilhado pelas consultas paralelas."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'DASHBOARD_CONSULTAS_PARALELAS', 4),
+                thread_name_prefix='dashboard')
+        return _executor
+
+
+def _na_thread(funcao):
+    # Cada thread do pool tem a sua conexão; ao fim da consulta ela é
+    # fechada ou mantida conforme CONN_MAX_AGE, como no fim de um request.
+    # As consultas contam na medição da requisição, quando houver.
+    try:
+        with medindo(medicao_atual.get()):
+            return funcao()
+    finally:
+        close_old_connections()
+
+
+async def em_paralelo(*funcoes):
+    """
+    Executa funções síncronas (consultas) ao mesmo tempo no pool, cada uma
+    com uma cópia do contexto de quem chamou, como sync_to_async.
+    """
+    loop = asyncio.get_running_loop()
+    return await asyncio.gather(*[
+        loop.run_in_executor(
+            executor(), contextvars.copy_context().run, _na_thread, funcao)
+        for funcao in funcoes])
+
+
+async def metricas_dashboard_async(agora=None, queryset=None):
+    """
+    Os mesmos números de metricas_dashboard, mas cada grupo independente
+    (totais, semana, mês, dias da semana e série mensal) vai numa consulta
+    própria e todas rodam ao mesmo tempo: o tempo total passa a ser o do
+    grupo mais lento, não a soma deles.
+    """
+    agora = agora or timezone.now()
+    v = queryset if queryset is not None else VendaDiaria.objects.all()
+    v = v.order_by()
+    limites = periodos(agora)
+    grupos = list(_grupos_do_dashboard(v.model, limites).values())
+    resultados = await em_paralelo(
+        lambda: _por_mes(v, v.model, limites),
+        *[partial(v.aggregate, **grupo) for grupo in grupos])
+    por_mes, *parciais = resultados
+    totais = {}
+    for parcial in parciais:
+        totais.update(parcial)
+    return _montar(totais, por_mes)
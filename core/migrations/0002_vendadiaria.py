@@ -0,0 +1,63 @@
+# Generated by Django 4.1.6 on 2026-10-18 07:05
+
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+
+
+def preencher_vendas_diarias(apps, schema_editor):
+    Venda = apps.get_model('core', 'Venda')
+    VendaDiaria = apps.get_model('core', 'VendaDiaria')
+    vendido = models.F('produto__preco_de_venda') * models.F('quantidade_vendida')
+    compra = models.F('produto__preco_de_compra') * models.F('quantidade_vendida')
+    linhas = (
+        Venda.objects.filter(produto__isnull=False)
+        .annotate(dia=TruncDate('data_da_venda'))
+        .values('dia', 'produto_id')
+        .annotate(
+            numero=models.Count('id'),
+            quantidade=models.Sum('quantidade_vendida'),
+            vendido=models.Sum(vendido),
+            lucro=models.Sum(vendido - compra),
+        )
+        .order_by()
+    )
+    VendaDiaria.objects.bulk_create(
+        (VendaDiaria(data=linha['dia'], produto_id=linha['produto_id'],
+                     numero_de_vendas=linha['numero'],
+                     quantidade_vendida=linha['quantidade'] or 0,
+                     total_vendido=linha['vendido'] or 0,
+                     total_lucro=linha['lucro'] or 0)
+         for linha in linhas.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(verbose_name='Data')),
+                ('numero_de_vendas', models.IntegerField(default=0, verbose_name='Número de Vendas')),
+                ('quantidade_vendida', models.DecimalField(decimal_places=0, default=0, max_digits=18, verbose_name='Quantidade Vendida')),
+                ('total_vendido', models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='Total Vendido')),
+                ('total_lucro', models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='Total de Lucro')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vendas_diarias', to='core.estoque')),
+            ],
+            options={
+                'ordering': ['data', 'produto'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='vendadiaria',
+            constraint=models.UniqueConstraint(fields=('data', 'produto'), name='venda_diaria_unica'),
+        ),
+        migrations.RunPython(preencher_vendas_diarias, migrations.RunPython.noop),
+    ]
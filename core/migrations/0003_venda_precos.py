@@ -0,0 +1,41 @@
+# Generated by Django 4.1.6 on 2026-10-18 07:06
+
+from django.db import migrations, models
+
+
+def congelar_precos(apps, schema_editor):
+    Estoque = apps.get_model('core', 'Estoque')
+    Venda = apps.get_model('core', 'Venda')
+    produto = Estoque.objects.filter(pk=models.OuterRef('produto_id'))
+    Venda.objects.filter(produto__isnull=False).update(
+        preco_de_venda=models.Subquery(produto.values('preco_de_venda')[:1]),
+        preco_de_compra=models.Subquery(produto.values('preco_de_compra')[:1]),
+    )
+    Venda.objects.update(
+        valor_total=models.F('preco_de_venda') * models.F('quantidade_vendida'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_vendadiaria'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venda',
+            name='preco_de_compra',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=18, null=True, verbose_name='Preço de Compra'),
+        ),
+        migrations.AddField(
+            model_name='venda',
+            name='preco_de_venda',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=18, null=True, verbose_name='Preço de Venda'),
+        ),
+        migrations.AddField(
+            model_name='venda',
+            name='valor_total',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=18, null=True, verbose_name='Valor Total'),
+        ),
+        migrations.RunPython(congelar_precos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.1.6 on 2026-10-18 07:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_venda_precos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Pedido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_de_criacao', models.DateField(auto_now_add=True, verbose_name='Data de Criação')),
+                ('data_de_modificacao', models.DateField(auto_now=True, verbose_name='Data de Modificação')),
+                ('data_do_pedido', models.DateTimeField(default=django.utils.timezone.now)),
+                ('valor_total', models.DecimalField(blank=True, decimal_places=2, max_digits=18, null=True, verbose_name='Valor Total')),
+            ],
+            options={
+                'ordering': ['data_do_pedido'],
+            },
+        ),
+        migrations.AddField(
+            model_name='venda',
+            name='pedido',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='itens', to='core.pedido'),
+        ),
+    ]
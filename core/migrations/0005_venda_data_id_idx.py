@@ -0,0 +1,17 @@
+# Generated by Django 4.1.6 on 2026-10-18 07:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_pedido'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(fields=['data_da_venda', 'id'], name='venda_data_id_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.6 on 2026-10-18 07:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_venda_data_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(fields=['produto', 'data_da_venda'], name='venda_produto_data_idx'),
+        ),
+    ]
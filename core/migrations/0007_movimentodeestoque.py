@@ -0,0 +1,65 @@
+# Generated by Django 4.1.6 on 2026-10-18 07:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def abrir_diario(apps, schema_editor):
+    # O saldo atual de cada produto vira o primeiro movimento do diário.
+    Estoque = apps.get_model('core', 'Estoque')
+    MovimentoDeEstoque = apps.get_model('core', 'MovimentoDeEstoque')
+    MovimentoDeEstoque.objects.bulk_create(
+        [MovimentoDeEstoque(produto_id=produto_id, tipo='ajuste',
+                            quantidade=quantidade, observacao='Saldo inicial')
+         for produto_id, quantidade in Estoque.objects.exclude(
+             quantidade_em_estoque=0).exclude(
+             quantidade_em_estoque__isnull=True).values_list(
+             'pk', 'quantidade_em_estoque')],
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_venda_produto_data_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimentoDeEstoque',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('venda', 'Venda'), ('devolucao', 'Devolução'), ('reposicao', 'Reposição'), ('ajuste', 'Ajuste')], max_length=10, verbose_name='Tipo')),
+                ('quantidade', models.DecimalField(decimal_places=2, max_digits=18, verbose_name='Quantidade')),
+                ('data', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Data')),
+                ('observacao', models.CharField(blank=True, max_length=100, verbose_name='Observação')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimentos', to='core.estoque')),
+                ('venda', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimentos', to='core.venda')),
+            ],
+            options={
+                'ordering': ['data', 'id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='FechamentoDeEstoque',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(verbose_name='Data')),
+                ('saldo', models.DecimalField(decimal_places=2, max_digits=18, verbose_name='Saldo')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fechamentos', to='core.estoque')),
+            ],
+            options={
+                'ordering': ['data', 'produto'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='movimentodeestoque',
+            index=models.Index(fields=['produto', 'data'], name='movimento_produto_data_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='fechamentodeestoque',
+            constraint=models.UniqueConstraint(fields=('produto', 'data'), name='fechamento_estoque_unico'),
+        ),
+        migrations.RunPython(abrir_diario, migrations.RunPython.noop),
+    ]
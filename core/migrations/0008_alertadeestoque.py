@@ -0,0 +1,43 @@
+# Generated by Django 4.1.6 on 2026-10-18 07:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_movimentodeestoque'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='estoque',
+            name='estoque_minimo',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=18, null=True, verbose_name='Estoque Mínimo'),
+        ),
+        migrations.CreateModel(
+            name='AlertaDeEstoque',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('saldo', models.DecimalField(decimal_places=2, max_digits=18, verbose_name='Saldo na Abertura')),
+                ('estoque_minimo', models.DecimalField(decimal_places=2, max_digits=18, verbose_name='Estoque Mínimo')),
+                ('aberto', models.BooleanField(default=True, verbose_name='Aberto')),
+                ('data_de_abertura', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Aberto em')),
+                ('data_de_resolucao', models.DateTimeField(blank=True, null=True, verbose_name='Resolvido em')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alertas', to='core.estoque')),
+            ],
+            options={
+                'ordering': ['-data_de_abertura'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='alertadeestoque',
+            index=models.Index(fields=['aberto', '-data_de_abertura'], name='alerta_aberto_data_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='alertadeestoque',
+            constraint=models.UniqueConstraint(condition=models.Q(('aberto', True)), fields=('produto',), name='alerta_aberto_unico'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.1.6 on 2026-10-18 07:34
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def preencher_nome_de_busca(apps, schema_editor):
+    Estoque = apps.get_model('core', 'Estoque')
+    produtos = list(Estoque.objects.only('pk', 'produto_em_estoque'))
+    for produto in produtos:
+        decomposto = unicodedata.normalize('NFKD', produto.produto_em_estoque or '')
+        produto.nome_de_busca = ''.join(
+            c for c in decomposto if not unicodedata.combining(c)).casefold()[:54]
+    Estoque.objects.bulk_update(produtos, ['nome_de_busca'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_alertadeestoque'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='estoque',
+            name='nome_de_busca',
+            field=models.CharField(default='', editable=False, max_length=54),
+        ),
+        migrations.RunPython(preencher_nome_de_busca, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='estoque',
+            index=models.Index(fields=['nome_de_busca', 'id'], name='estoque_busca_idx'),
+        ),
+    ]
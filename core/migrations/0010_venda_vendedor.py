@@ -0,0 +1,48 @@
+# Generated by Django 4.1.6 on 2026-10-18 07:42
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0009_estoque_nome_de_busca'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendaDiariaPorVendedor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(verbose_name='Data')),
+                ('numero_de_vendas', models.IntegerField(default=0, verbose_name='Número de Vendas')),
+                ('quantidade_vendida', models.DecimalField(decimal_places=0, default=0, max_digits=18, verbose_name='Quantidade Vendida')),
+                ('total_vendido', models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='Total Vendido')),
+                ('total_lucro', models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='Total de Lucro')),
+            ],
+            options={
+                'ordering': ['data', 'vendedor'],
+            },
+        ),
+        migrations.AddField(
+            model_name='venda',
+            name='vendedor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='vendas', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(fields=['vendedor', 'data_da_venda'], name='venda_vendedor_data_idx'),
+        ),
+        migrations.AddField(
+            model_name='vendadiariaporvendedor',
+            name='vendedor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vendas_diarias', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='vendadiariaporvendedor',
+            constraint=models.UniqueConstraint(fields=('data', 'vendedor'), name='venda_diaria_vendedor_unica'),
+        ),
+    ]
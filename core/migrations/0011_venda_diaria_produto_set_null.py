@@ -0,0 +1,19 @@
+# Generated by Django 4.1.6 on 2026-10-18 07:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_venda_vendedor'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='vendadiaria',
+            name='produto',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='vendas_diarias', to='core.estoque'),
+        ),
+    ]
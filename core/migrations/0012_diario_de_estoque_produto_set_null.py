@@ -0,0 +1,34 @@
+# Generated by Django 4.1.6 on 2026-10-18 08:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_venda_diaria_produto_set_null'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fechamentodeestoque',
+            name='nome_do_produto',
+            field=models.CharField(blank=True, editable=False, max_length=54, verbose_name='Nome do produto'),
+        ),
+        migrations.AddField(
+            model_name='movimentodeestoque',
+            name='nome_do_produto',
+            field=models.CharField(blank=True, editable=False, max_length=54, verbose_name='Nome do produto'),
+        ),
+        migrations.AlterField(
+            model_name='fechamentodeestoque',
+            name='produto',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='fechamentos', to='core.estoque'),
+        ),
+        migrations.AlterField(
+            model_name='movimentodeestoque',
+            name='produto',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimentos', to='core.estoque'),
+        ),
+    ]
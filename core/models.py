@@ -1,7 +1,15 @@
-from django.db import models
-from django.db.models import signals
+import unicodedata
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, Q, Sum, Value, When, signals
+from django.db.models.functions import Coalesce, TruncDate
 from django.utils import timezone
 
+from .cache import invalidar
+
 
 class Base(models.Model):
     data_de_criacao = models.DateField('Data de Criação', auto_now_add=True)
@@ -12,6 +20,67 @@ class Base(models.Model):
         abstract = True
 
 
+def normalizar(texto):
+    """Texto sem acentos e em minúsculas, para busca por prefixo."""
+    decomposto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).casefold()
+
+
+class EstoqueManager(models.Manager):
+
+    def buscar(self, termo):
+        """
+        Produtos cujo nome começa com `termo`, sem diferenciar maiúsculas
+        nem acentos. Compara com a coluna normalizada, sem funções aplicadas
+        a ela: o LIKE 'termo%' filtra em qualquer collation, e o limite
+        inferior (>= termo, válido para todo nome com esse prefixo) deixa o
+        banco começar a leitura do índice no ponto certo, mesmo onde o LIKE
+        sozinho não o usa, como no SQLite.
+        """
+        termo = normalizar(termo.strip())
+        produtos = self.order_by('nome_de_busca', 'pk')
+        if termo:
+            produtos = produtos.filter(nome_de_busca__gte=termo,
+                                       nome_de_busca__startswith=termo)
+        return produtos
+
+    def baixar(self, produto_id, quantidade):
+        """
+        Baixa o estoque com um UPDATE condicional; retorna False quando não
+        há quantidade suficiente. Deve ser chamado dentro de uma transação.
+        """
+        return self.filter(
+            pk=produto_id, quantidade_em_estoque__gte=quantidade,
+        ).update(
+            quantidade_em_estoque=F('quantidade_em_estoque') - quantidade,
+        ) == 1
+
+    def baixar_varios(self, quantidades, exigir_saldo=True):
+        """
+        Baixa o estoque de vários produtos num único UPDATE. Recebe
+        {produto_id: quantidade}; com exigir_saldo só retorna True se todos
+        tinham saldo e deve ser chamado dentro de uma transação, que o
+        chamador desfaz quando o retorno for False. Sem exigir_saldo a baixa
+        é aplicada mesmo que o estoque fique negativo (importação de vendas
+        que já aconteceram).
+        """
+        if not quantidades:
+            return True
+        campo = self.model._meta.get_field('quantidade_em_estoque')
+        quantidade = Case(
+            *[When(pk=pk, then=Value(qtd, output_field=campo))
+              for pk, qtd in quantidades.items()],
+            output_field=campo,
+        )
+        produtos = self.filter(pk__in=quantidades)
+        if exigir_saldo:
+            produtos = produtos.filter(quantidade_em_estoque__gte=quantidade)
+        return produtos.update(
+            quantidade_em_estoque=Coalesce(
+                'quantidade_em_estoque', Value(0, output_field=campo)) - quantidade,
+        ) == len(quantidades)
+
+
 class Estoque(Base):
     produto_em_estoque = models.CharField('Produto em Estoque', max_length=54)
     preco_de_venda = models.DecimalField(
@@ -20,13 +89,107 @@ class Estoque(Base):
         'Preço de Compra', max_digits=18, decimal_places=2, null=True, blank=True)
     quantidade_em_estoque = models.DecimalField(
         'Quantidade em Estoque', max_digits=18, decimal_places=2, null=True, blank=True)
+    # Ponto de reposição: com o saldo nele ou abaixo abre-se um alerta.
+    estoque_minimo = models.DecimalField(
+        'Estoque Mínimo', max_digits=18, decimal_places=2, null=True, blank=True)
+    # Nome normalizado (sem acentos, minúsculo) para a busca por prefixo.
+    nome_de_busca = models.CharField(max_length=54, editable=False, default='')
+
+    objects = EstoqueManager()
 
     class Meta:
         ordering = ['produto_em_estoque']
+        indexes = [
+            models.Index(fields=['nome_de_busca', 'id'],
+                         name='estoque_busca_idx'),
+        ]
 
     def __str__(self):
         return f'{self.produto_em_estoque}'
 
+    def save(self, *args, **kwargs):
+        self.nome_de_busca = normalizar(self.produto_em_estoque)[:54]
+        super().save(*args, **kwargs)
+
+    def saldo_em(self, momento):
+        """Quantidade em estoque em um momento passado."""
+        return MovimentoDeEstoque.objects.saldo_em(self, momento)
+
+
+class EstoqueInsuficiente(Exception):
+    pass
+
+
+class Pedido(Base):
+    data_do_pedido = models.DateTimeField(default=timezone.now)
+    valor_total = models.DecimalField(
+        'Valor Total', max_digits=18, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        ordering = ['data_do_pedido']
+
+    def __str__(self):
+        data_formatada = self.data_do_pedido.strftime('%d/%m/%Y')
+        return f'Pedido {self.pk} - {data_formatada}'
+
+
+class VendaManager(models.Manager):
+
+    def efetivar(self, venda):
+        """
+        Grava a venda e baixa o estoque na mesma transação. Levanta
+        EstoqueInsuficiente, sem gravar nada, se o produto não tiver a
+        quantidade vendida.
+        """
+        with transaction.atomic():
+            if not Estoque.objects.baixar(venda.produto_id, venda.quantidade_vendida):
+                raise EstoqueInsuficiente(venda.produto_id)
+            venda.save()
+            MovimentoDeEstoque.objects.registrar_vendas([venda])
+            VendaDiaria.objects.registrar(venda)
+        return venda
+
+    def cancelar(self, venda):
+        """
+        Exclui a venda devolvendo a quantidade ao estoque, com o movimento
+        de devolução e o estorno do consolidado diário, numa transação.
+        """
+        with transaction.atomic():
+            VendaDiaria.objects.estornar(venda)
+            MovimentoDeEstoque.objects.devolver(venda, f'Venda {venda.pk} excluída')
+            venda.delete()
+
+    def efetivar_pedido(self, itens):
+        """
+        Grava um pedido com vários itens (Vendas ainda não salvas, com
+        produto carregado) usando um número fixo de consultas: um UPDATE
+        para o estoque de todos os produtos, um INSERT do pedido, um
+        bulk_create dos itens e a atualização em lote do consolidado.
+        """
+        quantidades = {}
+        for item in itens:
+            quantidades[item.produto_id] = \
+                quantidades.get(item.produto_id, 0) + item.quantidade_vendida
+
+        with transaction.atomic():
+            if not Estoque.objects.baixar_varios(quantidades):
+                raise EstoqueInsuficiente(*quantidades)
+            pedido = Pedido(valor_total=0)
+            for item in itens:
+                item.data_da_venda = pedido.data_do_pedido
+                item.congelar_precos()
+                item.calcular_total()
+                pedido.valor_total += item.valor_total or 0
+            pedido.save()
+            for item in itens:
+                item.pedido = pedido
+            self.bulk_create(itens)
+            MovimentoDeEstoque.objects.registrar_vendas(itens)
+            VendaDiaria.objects.registrar_varias(itens)
+            # bulk_create não dispara post_save.
+            invalidar()
+        return pedido
+
 
 class Venda(Base):
     data_da_venda = models.DateTimeField(default=timezone.now)
@@ -35,18 +198,635 @@ class Venda(Base):
     produto = models.ForeignKey(
         Estoque, on_delete=models.SET_NULL, null=True, blank=True,
     )
+    pedido = models.ForeignKey(
+        Pedido, on_delete=models.CASCADE, null=True, blank=True,
+        related_name='itens',
+    )
+    vendedor = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True,
+        blank=True, related_name='vendas',
+    )
+    # Preços do produto no momento da venda, para que o histórico não mude
+    # quando o Estoque for reajustado.
+    preco_de_venda = models.DecimalField(
+        'Preço de Venda', max_digits=18, decimal_places=2, null=True, blank=True)
+    preco_de_compra = models.DecimalField(
+        'Preço de Compra', max_digits=18, decimal_places=2, null=True, blank=True)
+    valor_total = models.DecimalField(
+        'Valor Total', max_digits=18, decimal_places=2, null=True, blank=True)
+
+    objects = VendaManager()
 
     class Meta:
         ordering = ['data_da_venda']
+        indexes = [
+            # Filtros por período e paginação por cursor do dashboard.
+            models.Index(fields=['data_da_venda', 'id'],
+                         name='venda_data_id_idx'),
+            models.Index(fields=['produto', 'data_da_venda'],
+                         name='venda_produto_data_idx'),
+            models.Index(fields=['vendedor', 'data_da_venda'],
+                         name='venda_vendedor_data_idx'),
+        ]
 
     def __str__(self):
         data_formatada = self.data_da_venda.strftime('%d/%m/%Y')
         return f'{data_formatada} - {self.quantidade_vendida} - {self.produto}'
 
+    def congelar_precos(self):
+        self.preco_de_venda = self.produto.preco_de_venda if self.produto else None
+        self.preco_de_compra = self.produto.preco_de_compra if self.produto else None
+
+    def calcular_total(self):
+        if self.preco_de_venda is None or self.quantidade_vendida is None:
+            self.valor_total = None
+        else:
+            self.valor_total = self.preco_de_venda * self.quantidade_vendida
+
+    def save(self, *args, **kwargs):
+        if self.produto_id is not None and self.preco_de_venda is None:
+            self.congelar_precos()
+        self.calcular_total()
+        super().save(*args, **kwargs)
+
     @property
     def total_vendido(self):
-        return self.produto.preco_de_venda * self.quantidade_vendida
+        return self.valor_total
 
     @property
     def total_lucro(self):
-        return (self.produto.preco_de_venda * self.quantidade_vendida) - (self.produto.preco_de_compra * self.quantidade_vendida)
+        if self.valor_total is None or self.preco_de_compra is None:
+            return None
+        return self.valor_total - (self.preco_de_compra * self.quantidade_vendida)
+
+
+class ConsolidadoDiarioManager(models.Manager):
+    """
+    Mantém um consolidado diário das vendas agrupado por `chave`, um
+    ForeignKey que existe com o mesmo nome em Venda e no consolidado.
+    Com `contar_sem_chave`, as vendas sem a chave entram numa linha do dia
+    com a chave nula, em vez de ficar de fora.
+    """
+    chave = None
+    contar_sem_chave = False
+    campos = ['numero_de_vendas', 'quantidade_vendida',
+              'total_vendido', 'total_lucro']
+
+    def _id(self, venda):
+        return getattr(venda, f'{self.chave}_id')
+
+    def _da_linha(self, data, chave_id):
+        return {'data': data, f'{self.chave}_id': chave_id}
+
+    def _filtro(self, data, chave_id):
+        if chave_id is None:
+            return {'data': data, f'{self.chave}__isnull': True}
+        return self._da_linha(data, chave_id)
+
+    def _valores(self, venda, sinal):
+        quantidade = (venda.quantidade_vendida or 0) * sinal
+        # Sem preço a venda fica de fora da soma, como acontece no SUM sobre
+        # Venda.
+        total_vendido = (venda.total_vendido or Decimal(0)) * sinal
+        total_lucro = (venda.total_lucro or Decimal(0)) * sinal
+        return {
+            'numero_de_vendas': sinal,
+            'quantidade_vendida': quantidade,
+            'total_vendido': total_vendido,
+            'total_lucro': total_lucro,
+        }
+
+    def _aplicar(self, venda, sinal):
+        chave_id = self._id(venda)
+        if chave_id is None and not self.contar_sem_chave:
+            return
+        data = timezone.localdate(venda.data_da_venda)
+        valores = self._valores(venda, sinal)
+        incremento = {campo: F(campo) + valor for campo, valor in valores.items()}
+        linhas = self.filter(**self._filtro(data, chave_id))
+        if chave_id is None:
+            # A restrição de unicidade não vale para a chave nula; a venda
+            # vai numa só linha do dia.
+            linhas = self.filter(pk=linhas.values_list('pk', flat=True).first())
+        if linhas.update(**incremento):
+            if sinal < 0:
+                linhas.filter(numero_de_vendas__lte=0).delete()
+            return
+        if sinal < 0:
+            return
+        try:
+            with transaction.atomic():
+                self.create(**self._da_linha(data, chave_id), **valores)
+        except IntegrityError:
+            # Outra transação criou a linha do dia entre o UPDATE e o INSERT.
+            linhas.update(**incremento)
+
+    def registrar(self, venda):
+        """Soma a venda na linha do dia correspondente."""
+        self._aplicar(venda, 1)
+
+    def estornar(self, venda):
+        """Retira a venda da linha do dia correspondente."""
+        self._aplicar(venda, -1)
+
+    def registrar_varias(self, vendas):
+        """
+        Soma várias vendas no consolidado com um SELECT, um bulk_update e
+        um bulk_create, em vez de um UPDATE por venda.
+        """
+        grupos = {}
+        for venda in vendas:
+            if self._id(venda) is None and not self.contar_sem_chave:
+                continue
+            chave = (timezone.localdate(venda.data_da_venda), self._id(venda))
+            valores = self._valores(venda, 1)
+            if chave in grupos:
+                for campo, valor in valores.items():
+                    grupos[chave][campo] += valor
+            else:
+                grupos[chave] = valores
+        if not grupos:
+            return
+
+        datas = {data for data, _ in grupos}
+        ids = {chave_id for _, chave_id in grupos}
+        filtro = Q(**{f'{self.chave}_id__in': ids - {None}})
+        if None in ids:
+            filtro |= Q(**{f'{self.chave}__isnull': True})
+        existentes = {
+            (linha.data, self._id(linha)): linha
+            for linha in self.filter(filtro, data__in=datas)
+        }
+        campos = self.campos
+        alterar = []
+        criar = []
+        for (data, chave_id), valores in grupos.items():
+            linha = existentes.get((data, chave_id))
+            if linha is None:
+                criar.append(self.model(
+                    **self._da_linha(data, chave_id), **valores))
+                continue
+            for campo in campos:
+                setattr(linha, campo, F(campo) + valores[campo])
+            alterar.append(linha)
+        if alterar:
+            self.bulk_update(alterar, campos)
+        if criar:
+            try:
+                with transaction.atomic():
+                    self.bulk_create(criar)
+            except IntegrityError:
+                # Alguma linha foi criada por outra transação nesse meio tempo.
+                for linha in criar:
+                    valores = {campo: getattr(linha, campo) for campo in campos}
+                    incremento = {campo: F(campo) + valor
+                                  for campo, valor in valores.items()}
+                    filtro = self._da_linha(linha.data, self._id(linha))
+                    if not self.filter(**self._filtro(
+                            linha.data, self._id(linha))).update(**incremento):
+                        self.create(**filtro, **valores)
+
+    def reconstruir(self):
+        """Apaga e recalcula todas as linhas a partir da tabela de vendas."""
+        campo = f'{self.chave}_id'
+        vendas = Venda.objects.all()
+        if not self.contar_sem_chave:
+            vendas = vendas.filter(**{f'{self.chave}__isnull': False})
+        with transaction.atomic():
+            self.all().delete()
+            linhas = (
+                vendas
+                .annotate(data=TruncDate('data_da_venda'))
+                .values('data', campo)
+                .annotate(
+                    numero_de_vendas=models.Count('id'),
+                    soma_quantidade=Sum('quantidade_vendida'),
+                    soma_vendido=Sum('valor_total'),
+                    soma_lucro=Sum(
+                        F('valor_total') -
+                        (F('preco_de_compra') * F('quantidade_vendida'))),
+                )
+                .order_by()
+            )
+            invalidar()
+            return len(self.bulk_create(
+                (self.model(
+                    **self._da_linha(linha['data'], linha[campo]),
+                    numero_de_vendas=linha['numero_de_vendas'],
+                    quantidade_vendida=linha['soma_quantidade'] or 0,
+                    total_vendido=linha['soma_vendido'] or 0,
+                    total_lucro=linha['soma_lucro'] or 0,
+                ) for linha in linhas.iterator()),
+                batch_size=1000,
+            ))
+
+
+class VendaDiariaManager(ConsolidadoDiarioManager):
+    """
+    Consolidado por produto. O consolidado por vendedor acompanha este em
+    todas as operações, então quem grava vendas só atualiza VendaDiaria.
+
+    Vendas sem produto (de produtos excluídos) continuam somando, numa
+    linha por dia com o produto nulo, como continuam somando em Venda.
+    """
+    chave = 'produto'
+    contar_sem_chave = True
+
+    def desvincular(self, produto_id):
+        """
+        Passa as linhas de um produto que vai ser excluído para a linha sem
+        produto de cada dia, somando quando ela já existe, para que haja no
+        máximo uma linha sem produto por dia.
+        """
+        linhas = list(self.filter(produto_id=produto_id))
+        if not linhas:
+            return
+        orfas = {linha.data: linha for linha in self.filter(
+            produto__isnull=True, data__in={linha.data for linha in linhas})}
+        somar = []
+        for linha in linhas:
+            orfa = orfas.get(linha.data)
+            if orfa is None:
+                continue
+            for campo in self.campos:
+                setattr(orfa, campo,
+                        getattr(orfa, campo) + getattr(linha, campo))
+            somar.append(linha.pk)
+        if somar:
+            self.bulk_update(
+                [orfas[linha.data] for linha in linhas if linha.pk in somar],
+                self.campos)
+            self.filter(pk__in=somar).delete()
+        self.filter(produto_id=produto_id).update(produto=None)
+
+    def registrar(self, venda):
+        super().registrar(venda)
+        VendaDiariaPorVendedor.objects.registrar(venda)
+
+    def estornar(self, venda):
+        super().estornar(venda)
+        VendaDiariaPorVendedor.objects.estornar(venda)
+
+    def registrar_varias(self, vendas):
+        super().registrar_varias(vendas)
+        VendaDiariaPorVendedor.objects.registrar_varias(vendas)
+
+    def reconstruir(self):
+        with transaction.atomic():
+            VendaDiariaPorVendedor.objects.reconstruir()
+            return super().reconstruir()
+
+
+class VendaDiariaPorVendedorManager(ConsolidadoDiarioManager):
+    chave = 'vendedor'
+
+
+class VendaDiaria(models.Model):
+    """Consolidado diário das vendas de cada produto, usado pelo dashboard."""
+    data = models.DateField('Data')
+    # Nulo depois que o produto é excluído: as vendas dele continuam nos
+    # totais, como continuam em Venda.
+    produto = models.ForeignKey(
+        Estoque, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='vendas_diarias')
+    numero_de_vendas = models.IntegerField('Número de Vendas', default=0)
+    quantidade_vendida = models.DecimalField(
+        'Quantidade Vendida', max_digits=18, decimal_places=0, default=0)
+    total_vendido = models.DecimalField(
+        'Total Vendido', max_digits=18, decimal_places=2, default=0)
+    total_lucro = models.DecimalField(
+        'Total de Lucro', max_digits=18, decimal_places=2, default=0)
+
+    objects = VendaDiariaManager()
+
+    class Meta:
+        ordering = ['data', 'produto']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['data', 'produto'], name='venda_diaria_unica'),
+        ]
+
+    def __str__(self):
+        return f'{self.data:%d/%m/%Y} - {self.produto}'
+
+
+class VendaDiariaPorVendedor(models.Model):
+    """Consolidado diário das vendas de cada vendedor, usado pelo ranking."""
+    data = models.DateField('Data')
+    vendedor = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+        related_name='vendas_diarias')
+    numero_de_vendas = models.IntegerField('Número de Vendas', default=0)
+    quantidade_vendida = models.DecimalField(
+        'Quantidade Vendida', max_digits=18, decimal_places=0, default=0)
+    total_vendido = models.DecimalField(
+        'Total Vendido', max_digits=18, decimal_places=2, default=0)
+    total_lucro = models.DecimalField(
+        'Total de Lucro', max_digits=18, decimal_places=2, default=0)
+
+    objects = VendaDiariaPorVendedorManager()
+
+    class Meta:
+        ordering = ['data', 'vendedor']
+        constraints = [
+            models.UniqueConstraint(fields=['data', 'vendedor'],
+                                    name='venda_diaria_vendedor_unica'),
+        ]
+
+    def __str__(self):
+        return f'{self.data:%d/%m/%Y} - {self.vendedor}'
+
+
+def _inicio_do_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+class MovimentoDeEstoqueManager(models.Manager):
+
+    def lancar(self, movimento):
+        """
+        Grava um movimento avulso (devolução, reposição ou ajuste) e aplica
+        a quantidade ao saldo do produto na mesma transação.
+        """
+        campo = Estoque._meta.get_field('quantidade_em_estoque')
+        with transaction.atomic():
+            Estoque.objects.filter(pk=movimento.produto_id).update(
+                quantidade_em_estoque=Coalesce(
+                    'quantidade_em_estoque', Value(0, output_field=campo),
+                ) + movimento.quantidade)
+            movimento.save()
+            FechamentoDeEstoque.objects.reabrir(movimento.data)
+            AlertaDeEstoque.objects.avaliar([movimento.produto_id])
+        return movimento
+
+    def devolver(self, venda, observacao):
+        """
+        Devolve ao estoque a quantidade de uma venda excluída ou alterada.
+        A devolução leva a data da venda original, como a saída que ela
+        desfaz: o saldo entre essa data e hoje não guarda a venda desfeita,
+        e os fechamentos a partir dela são refeitos.
+        """
+        if venda.produto_id is not None and venda.quantidade_vendida:
+            return self.lancar(self.model(
+                produto_id=venda.produto_id, tipo=MovimentoDeEstoque.DEVOLUCAO,
+                quantidade=venda.quantidade_vendida, data=venda.data_da_venda,
+                observacao=observacao))
+
+    def registrar_vendas(self, vendas):
+        """
+        Saídas das vendas já gravadas, com um único INSERT, e reavaliação
+        dos alertas de estoque dos produtos vendidos. O saldo em Estoque já
+        foi baixado pelo chamador, na mesma transação.
+        """
+        movimentos = self.bulk_create([
+            self.model(produto_id=venda.produto_id, venda_id=venda.pk,
+                       tipo=MovimentoDeEstoque.VENDA,
+                       quantidade=-venda.quantidade_vendida,
+                       data=venda.data_da_venda)
+            for venda in vendas
+            if venda.produto_id is not None and venda.quantidade_vendida
+        ])
+        if movimentos:
+            FechamentoDeEstoque.objects.reabrir(
+                min(movimento.data for movimento in movimentos))
+            AlertaDeEstoque.objects.avaliar(
+                {movimento.produto_id for movimento in movimentos})
+        return movimentos
+
+    def saldo_em(self, produto, momento):
+        """
+        Saldo do produto em `momento`: o fechamento mais recente antes do
+        dia mais os movimentos desde então. Com o índice em (produto, data)
+        são duas consultas curtas, sem reler o histórico inteiro.
+        """
+        fechamento = FechamentoDeEstoque.objects.filter(
+            produto=produto, data__lt=timezone.localdate(momento),
+        ).order_by('-data').first()
+        movimentos = self.filter(produto=produto, data__lte=momento)
+        saldo = Decimal(0)
+        if fechamento is not None:
+            saldo = fechamento.saldo
+            movimentos = movimentos.filter(
+                data__gte=_inicio_do_dia(fechamento.data + timedelta(days=1)))
+        return saldo + (movimentos.aggregate(soma=Sum('quantidade'))['soma'] or 0)
+
+
+class MovimentoDeEstoque(models.Model):
+    """Diário de entradas e saídas de estoque. Só recebe inclusões."""
+    VENDA = 'venda'
+    DEVOLUCAO = 'devolucao'
+    REPOSICAO = 'reposicao'
+    AJUSTE = 'ajuste'
+    TIPOS = [
+        (VENDA, 'Venda'),
+        (DEVOLUCAO, 'Devolução'),
+        (REPOSICAO, 'Reposição'),
+        (AJUSTE, 'Ajuste'),
+    ]
+
+    # Sem blank: todo movimento lançado tem produto. Fica nulo só quando o
+    # produto é excluído, e o nome guardado identifica o histórico.
+    produto = models.ForeignKey(
+        Estoque, on_delete=models.SET_NULL, null=True, related_name='movimentos')
+    nome_do_produto = models.CharField(
+        'Nome do produto', max_length=54, blank=True, editable=False)
+    tipo = models.CharField('Tipo', max_length=10, choices=TIPOS)
+    # Positiva nas entradas, negativa nas saídas.
+    quantidade = models.DecimalField('Quantidade', max_digits=18, decimal_places=2)
+    data = models.DateTimeField('Data', default=timezone.now)
+    venda = models.ForeignKey(
+        Venda, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='movimentos')
+    observacao = models.CharField('Observação', max_length=100, blank=True)
+
+    objects = MovimentoDeEstoqueManager()
+
+    class Meta:
+        ordering = ['data', 'id']
+        indexes = [
+            models.Index(fields=['produto', 'data'],
+                         name='movimento_produto_data_idx'),
+        ]
+
+    def __str__(self):
+        produto = self.produto or self.nome_do_produto
+        return f'{self.data:%d/%m/%Y} - {self.get_tipo_display()} - {produto}'
+
+
+class FechamentoDeEstoqueManager(models.Manager):
+
+    def fechar(self, dia):
+        """
+        Grava o saldo de todos os produtos no fim de `dia`, partindo do
+        fechamento anterior mais recente e somando só os movimentos desde
+        ele. Retorna quantos produtos foram fechados. Fechamentos de produtos
+        já excluídos não mudam mais e são mantidos.
+        """
+        if dia >= timezone.localdate():
+            raise ValueError('Só é possível fechar dias que já terminaram.')
+        with transaction.atomic():
+            fechamentos = self.filter(produto__isnull=False)
+            anterior = fechamentos.filter(data__lt=dia).aggregate(
+                ultimo=models.Max('data'))['ultimo']
+            movimentos = MovimentoDeEstoque.objects.filter(
+                produto__isnull=False,
+                data__lt=_inicio_do_dia(dia + timedelta(days=1)))
+            saldos = {}
+            if anterior is not None:
+                saldos = dict(fechamentos.filter(data=anterior)
+                              .values_list('produto_id', 'saldo'))
+                movimentos = movimentos.filter(
+                    data__gte=_inicio_do_dia(anterior + timedelta(days=1)))
+            for produto_id, soma in (movimentos.values('produto_id')
+                                     .annotate(soma=Sum('quantidade'))
+                                     .values_list('produto_id', 'soma')
+                                     .order_by()):
+                saldos[produto_id] = saldos.get(produto_id, 0) + soma
+            fechamentos.filter(data=dia).delete()
+            return len(self.bulk_create(
+                [self.model(data=dia, produto_id=produto_id, saldo=saldo)
+                 for produto_id, saldo in saldos.items()],
+                batch_size=1000,
+            ))
+
+    def reabrir(self, momento):
+        """
+        Descarta os fechamentos a partir do dia de um movimento retroativo,
+        que deixaria esses saldos errados. Movimentos de hoje não afetam
+        nenhum fechamento e não custam consulta.
+        """
+        dia = timezone.localdate(momento)
+        if dia < timezone.localdate():
+            self.filter(data__gte=dia, produto__isnull=False).delete()
+
+
+class FechamentoDeEstoque(models.Model):
+    """Saldo de cada produto no fim de um dia, ponto de partida de saldo_em."""
+    data = models.DateField('Data')
+    produto = models.ForeignKey(
+        Estoque, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='fechamentos')
+    nome_do_produto = models.CharField(
+        'Nome do produto', max_length=54, blank=True, editable=False)
+    saldo = models.DecimalField('Saldo', max_digits=18, decimal_places=2)
+
+    objects = FechamentoDeEstoqueManager()
+
+    class Meta:
+        ordering = ['data', 'produto']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['produto', 'data'], name='fechamento_estoque_unico'),
+        ]
+
+    def __str__(self):
+        produto = self.produto or self.nome_do_produto
+        return f'{self.data:%d/%m/%Y} - {produto}: {self.saldo}'
+
+
+class AlertaDeEstoqueManager(models.Manager):
+
+    def abertos(self):
+        return self.filter(aberto=True).select_related('produto') \
+            .order_by('-data_de_abertura')
+
+    def avaliar(self, produto_ids):
+        """
+        Reavalia o alerta só dos produtos informados (os que a transação
+        alterou): abre quando o saldo chega ao estoque mínimo e fecha quando
+        volta a ficar acima dele. Uma consulta para ler saldo, mínimo e
+        alerta aberto; escreve apenas quando algum alerta muda.
+        """
+        produto_ids = {pk for pk in produto_ids if pk is not None}
+        if not produto_ids:
+            return
+        produtos = Estoque.objects.filter(pk__in=produto_ids).annotate(
+            alertado=models.Exists(self.filter(
+                produto=models.OuterRef('pk'), aberto=True)),
+        ).filter(
+            models.Q(estoque_minimo__isnull=False) | models.Q(alertado=True),
+        ).values_list('pk', 'quantidade_em_estoque', 'estoque_minimo',
+                      'alertado')
+        abrir = []
+        fechar = []
+        for pk, saldo, minimo, alertado in produtos:
+            baixo = minimo is not None and (saldo or 0) <= minimo
+            if baixo and not alertado:
+                abrir.append(self.model(produto_id=pk, saldo=saldo or 0,
+                                        estoque_minimo=minimo))
+            elif alertado and not baixo:
+                fechar.append(pk)
+        if fechar:
+            self.filter(produto_id__in=fechar, aberto=True).update(
+                aberto=False, data_de_resolucao=timezone.now())
+        if abrir:
+            self.bulk_create(abrir)
+
+
+class AlertaDeEstoque(models.Model):
+    """Produto que chegou ao estoque mínimo; fica aberto até a reposição."""
+    produto = models.ForeignKey(
+        Estoque, on_delete=models.CASCADE, related_name='alertas')
+    saldo = models.DecimalField(
+        'Saldo na Abertura', max_digits=18, decimal_places=2)
+    estoque_minimo = models.DecimalField(
+        'Estoque Mínimo', max_digits=18, decimal_places=2)
+    aberto = models.BooleanField('Aberto', default=True)
+    data_de_abertura = models.DateTimeField('Aberto em', default=timezone.now)
+    data_de_resolucao = models.DateTimeField('Resolvido em', null=True, blank=True)
+
+    objects = AlertaDeEstoqueManager()
+
+    class Meta:
+        ordering = ['-data_de_abertura']
+        indexes = [
+            # A página de notificações lê só os abertos, mais recentes antes.
+            models.Index(fields=['aberto', '-data_de_abertura'],
+                         name='alerta_aberto_data_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['produto'], condition=models.Q(aberto=True),
+                name='alerta_aberto_unico'),
+        ]
+
+    def __str__(self):
+        return f'{self.produto}: {self.saldo} (mínimo {self.estoque_minimo})'
+
+
+def registrar_saldo_inicial(sender, instance, created, raw=False, **kwargs):
+    # O diário começa com a quantidade cadastrada junto com o produto.
+    if created and not raw and instance.quantidade_em_estoque:
+        MovimentoDeEstoque.objects.create(
+            produto=instance, tipo=MovimentoDeEstoque.AJUSTE,
+            quantidade=instance.quantidade_em_estoque,
+            observacao='Saldo inicial')
+
+
+def desvincular_consolidado(sender, instance, **kwargs):
+    VendaDiaria.objects.desvincular(instance.pk)
+
+
+def guardar_nome_no_diario(sender, instance, **kwargs):
+    # O diário e os fechamentos ficam; só perdem o vínculo com o produto.
+    for modelo in (MovimentoDeEstoque, FechamentoDeEstoque):
+        modelo.objects.filter(produto=instance).update(
+            nome_do_produto=instance.produto_em_estoque)
+
+
+def avaliar_alerta(sender, instance, raw=False, **kwargs):
+    # Cadastro ou mudança do estoque mínimo.
+    if not raw:
+        AlertaDeEstoque.objects.avaliar([instance.pk])
+
+
+signals.post_save.connect(registrar_saldo_inicial, sender=Estoque)
+signals.post_save.connect(avaliar_alerta, sender=Estoque)
+signals.pre_delete.connect(desvincular_consolidado, sender=Estoque)
+signals.pre_delete.connect(guardar_nome_no_diario, sender=Estoque)
+
+# Os números do dashboard ficam em cache até que vendas ou produtos mudem.
+signals.post_save.connect(invalidar, sender=Estoque)
+signals.post_delete.connect(invalidar, sender=Estoque)
+signals.post_save.connect(invalidar, sender=Venda)
+signals.post_delete.connect(invalidar, sender=Venda)
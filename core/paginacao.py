@@ -0,0 +1,137 @@
+import base64
+import binascii
+
+from django.db.models import Q
+from django.http import QueryDict
+from django.utils.dateparse import parse_datetime
+
+
+def codificar_cursor(data, pk):
+    chave = data.isoformat() if hasattr(data, 'isoformat') else data
+    valor = f'{chave}|{pk}'.encode()
+    return base64.urlsafe_b64encode(valor).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor, converter=parse_datetime):
+    """
+    Retorna (data, pk) ou None se o cursor for inválido. `converter`
+    transforma a chave de volta no tipo do campo (str para textos).
+    """
+    try:
+        valor = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data, pk = valor.decode().rsplit('|', 1)
+        data = converter(data)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if data is None:
+        return None
+    return data, pk
+
+
+class PaginaCursor:
+
+    def __init__(self, objetos, campo, tem_anterior, tem_proxima):
+        self.object_list = objetos
+        self.campo = campo
+        self.has_previous = tem_anterior
+        self.has_next = tem_proxima
+        # Parâmetros da requisição (filtros) mantidos nos links da página.
+        self.parametros = QueryDict()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def _cursor(self, obj):
+        return codificar_cursor(getattr(obj, self.campo), obj.pk)
+
+    @property
+    def cursor_anterior(self):
+        return self._cursor(self.object_list[0]) if self.object_list else ''
+
+    @property
+    def cursor_proximo(self):
+        return self._cursor(self.object_list[-1]) if self.object_list else ''
+
+    def _url(self, **cursor):
+        """Query string com os parâmetros atuais, trocando só o cursor."""
+        parametros = self.parametros.copy()
+        parametros.pop('depois', None)
+        parametros.pop('antes', None)
+        for nome, valor in cursor.items():
+            parametros[nome] = valor
+        return f'?{parametros.urlencode()}'
+
+    @property
+    def url_primeira(self):
+        return self._url()
+
+    @property
+    def url_anterior(self):
+        return self._url(antes=self.cursor_anterior)
+
+    @property
+    def url_proxima(self):
+        return self._url(depois=self.cursor_proximo)
+
+    @property
+    def url_ultima(self):
+        return self._url(antes='')
+
+
+class CursorPaginator:
+    """
+    Paginação por cursor (keyset) em ordem decrescente de (campo, pk).
+
+    Cada página filtra a partir do último/primeiro registro da página
+    anterior em vez de usar OFFSET, e não faz COUNT(*); com um índice em
+    (campo, id) qualquer página custa o mesmo que a primeira.
+    """
+
+    def __init__(self, queryset, per_page, campo='data_da_venda'):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.campo = campo
+
+    def get_page(self, depois=None, antes=None):
+        """
+        `depois` traz a página seguinte ao cursor, `antes` a anterior; um
+        `antes` vazio ('') traz a última página.
+        """
+        campo = self.campo
+        queryset = self.queryset
+        if antes is not None:
+            posicao = decodificar_cursor(antes) if antes else None
+            if posicao:
+                data, pk = posicao
+                queryset = queryset.filter(
+                    Q(**{f'{campo}__gt': data}) | Q(**{campo: data, 'pk__gt': pk}))
+            objetos = list(queryset.order_by(campo, 'pk')[:self.per_page + 1])
+            mais = len(objetos) > self.per_page
+            objetos = objetos[:self.per_page][::-1]
+            return PaginaCursor(objetos, campo, mais, posicao is not None)
+
+        posicao = decodificar_cursor(depois) if depois else None
+        if posicao:
+            data, pk = posicao
+            queryset = queryset.filter(
+                Q(**{f'{campo}__lt': data}) | Q(**{campo: data, 'pk__lt': pk}))
+        objetos = list(queryset.order_by(f'-{campo}', '-pk')[:self.per_page + 1])
+        mais = len(objetos) > self.per_page
+        return PaginaCursor(objetos[:self.per_page], campo, posicao is not None, mais)
+
+
+class PaginacaoPorCursorMixin:
+    """Troca a paginação por OFFSET de uma ListView pelo CursorPaginator."""
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = CursorPaginator(queryset, page_size)
+        page_obj = paginator.get_page(
+            depois=self.request.GET.get('depois'),
+            antes=self.request.GET.get('antes'))
+        page_obj.parametros = self.request.GET
+        is_paginated = page_obj.has_previous or page_obj.has_next
+        return paginator, page_obj, page_obj.object_list, is_paginated
@@ -0,0 +1,122 @@
+import random
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .calendario import inicio_do_dia
+from .models import (Estoque, MovimentoDeEstoque, Venda, VendaDiaria,
+                     normalizar)
+
+CENTAVOS = Decimal('0.01')
+
+NOMES = ['Caneta', 'Caderno', 'Lápis', 'Borracha', 'Mochila', 'Estojo', 'Régua',
+         'Marcador', 'Agenda', 'Pasta', 'Cola', 'Tesoura', 'Grampeador',
+         'Calculadora', 'Papel']
+VARIANTES = ['Azul', 'Preto', 'Vermelho', 'Verde', 'Escolar', 'Premium',
+             'Compacto', 'Grande', 'Pequeno', 'Kit']
+
+# Peso relativo das vendas por dia da semana (segunda a domingo) e por mês:
+# mais movimento no fim de semana e na volta às aulas e no fim do ano.
+PESO_DIA_DA_SEMANA = [0.9, 0.9, 1.0, 1.0, 1.2, 1.4, 0.6]
+PESO_MES = [1.5, 1.4, 1.0, 0.9, 0.9, 0.9, 1.2, 1.1, 0.9, 0.9, 1.1, 1.6]
+
+
+def gerar_produtos(quantidade, aleatorio, desde=None):
+    """
+    Cadastra `quantidade` produtos com o saldo inicial no diário de
+    estoque, datado em `desde` (agora, por padrão).
+    """
+    produtos = []
+    for i in range(quantidade):
+        nome = (f'{NOMES[i % len(NOMES)]} '
+                f'{VARIANTES[i // len(NOMES) % len(VARIANTES)]} {i + 1}')
+        # Preços log-normais (a maioria barata, alguns caros) e margem de
+        # 20% a 60% sobre o custo.
+        compra = Decimal(str(min(2000.0, aleatorio.lognormvariate(2.5, 1.0))))
+        venda = compra * Decimal(str(1.2 + aleatorio.random() * 0.4))
+        produtos.append(Estoque(
+            produto_em_estoque=nome[:54], nome_de_busca=normalizar(nome[:54])[:54],
+            preco_de_compra=compra.quantize(CENTAVOS),
+            preco_de_venda=venda.quantize(CENTAVOS),
+            quantidade_em_estoque=aleatorio.randint(0, 1000)))
+    produtos = Estoque.objects.bulk_create(produtos, batch_size=1000)
+    if produtos and produtos[0].pk is None:
+        # Bancos que não devolvem as chaves no INSERT em lote.
+        produtos = list(Estoque.objects.order_by('-pk')[:quantidade])
+    # bulk_create não dispara o post_save que abre o diário de estoque.
+    MovimentoDeEstoque.objects.bulk_create(
+        [MovimentoDeEstoque(produto=produto, tipo=MovimentoDeEstoque.AJUSTE,
+                            quantidade=produto.quantidade_em_estoque,
+                            data=desde or timezone.now(),
+                            observacao='Saldo inicial')
+         for produto in produtos if produto.quantidade_em_estoque],
+        batch_size=1000)
+    return produtos
+
+
+def _dias(fim, anos):
+    """Dias do período com o peso de vendas de cada um, para sorteio."""
+    inicio = fim - timedelta(days=365 * anos)
+    dias = [inicio + timedelta(days=i) for i in range((fim - inicio).days)]
+    pesos = [PESO_DIA_DA_SEMANA[dia.weekday()] * PESO_MES[dia.month - 1]
+             for dia in dias]
+    return dias, pesos
+
+
+def gerar_vendas(produtos, quantidade, anos=3, fim=None, semente=0,
+                 tamanho_do_lote=5000):
+    """
+    Gera `quantidade` vendas distribuídas pelos últimos `anos` anos até
+    `fim`, gravadas em lotes como na importação: bulk_create das vendas,
+    baixa do estoque e saídas no diário de estoque, sem exigir saldo. O
+    consolidado diário é recalculado no final. A popularidade dos produtos segue uma lei de Zipf,
+    então poucos produtos concentram a maior parte das vendas, como numa
+    loja de verdade. Com a mesma semente o resultado é o mesmo.
+    """
+    aleatorio = random.Random(semente)
+    fim = fim or timezone.localdate()
+    dias, pesos_dias = _dias(fim, anos)
+    pesos_produtos = [1 / posicao for posicao in range(1, len(produtos) + 1)]
+    quantidades = [1, 2, 3, 4, 5, 10]
+    pesos_quantidades = [50, 20, 12, 8, 6, 4]
+
+    gravadas = 0
+    while gravadas < quantidade:
+        tamanho = min(tamanho_do_lote, quantidade - gravadas)
+        lote = []
+        baixas = {}
+        for produto, dia, qtd in zip(
+                aleatorio.choices(produtos, pesos_produtos, k=tamanho),
+                aleatorio.choices(dias, pesos_dias, k=tamanho),
+                aleatorio.choices(quantidades, pesos_quantidades, k=tamanho)):
+            # Horário comercial, das 8h às 20h.
+            hora = time(8 + aleatorio.randrange(12), aleatorio.randrange(60),
+                        aleatorio.randrange(60))
+            venda = Venda(
+                produto=produto, quantidade_vendida=qtd,
+                data_da_venda=timezone.make_aware(datetime.combine(dia, hora)))
+            venda.congelar_precos()
+            venda.calcular_total()
+            lote.append(venda)
+            baixas[produto.pk] = baixas.get(produto.pk, 0) + qtd
+        with transaction.atomic():
+            Venda.objects.bulk_create(lote)
+            Estoque.objects.baixar_varios(baixas, exigir_saldo=False)
+            MovimentoDeEstoque.objects.registrar_vendas(lote)
+        gravadas += tamanho
+    VendaDiaria.objects.reconstruir()
+    return gravadas
+
+
+def gerar_dados(produtos, vendas, anos=3, semente=0, tamanho_do_lote=5000):
+    aleatorio = random.Random(semente)
+    # O saldo inicial vem antes da primeira venda gerada.
+    inicio = timezone.localdate() - timedelta(days=365 * anos)
+    lista = gerar_produtos(produtos, aleatorio, desde=inicio_do_dia(inicio))
+    # Ordem aleatória para a popularidade não seguir a ordem dos nomes.
+    aleatorio.shuffle(lista)
+    gerar_vendas(lista, vendas, anos=anos, semente=semente,
+                 tamanho_do_lote=tamanho_do_lote)
+    return lista
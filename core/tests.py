@@ -1,3 +1,1752 @@
-from django.test import TestCase
+import os
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from threading import Barrier, Lock, Thread, current_thread
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.db.models import F, FloatField, Max, Min, Sum
+from django.test import (RequestFactory, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.html import escape, escapejs
+from django.utils.http import parse_http_date
+
+from projeto_vendas import ambiente
+
+from . import calendario, metricas
+from .admin import VendaAdmin
+from .banco import aplicar_pragmas, configurar_pool_odbc
+from .benchmark import executar_cenario
+from .cache import CHAVE_ALTERACAO
+from .exportacao import CABECALHO_ESTOQUE, CABECALHO_VENDAS
+from .forms import FiltroDoDashboardForm
+from .importacao import importar_vendas, linhas_csv
+from .instrumentacao import quantil, registro
+from .metricas import (DIAS_DA_SEMANA, MESES, comparar, inicio_do_dia,
+                       metricas_dashboard, metricas_dashboard_async, periodos,
+                       ranking_de_produtos, ranking_de_vendedores, serie)
+from .models import (AlertaDeEstoque, Estoque, EstoqueInsuficiente,
+                     FechamentoDeEstoque, MovimentoDeEstoque, Pedido, Venda,
+                     VendaDiaria, VendaDiariaPorVendedor)
+from .paginacao import CursorPaginator
+from .sinteticos import gerar_dados
+
+VENDIDO = F('valor_total')
+LUCRO = F('valor_total') - (F('preco_de_compra') * F('quantidade_vendida'))
+
+# Sessão, usuário, página de vendas e as duas consultas de métricas.
+CONSULTAS_DO_DASHBOARD = 5
+
+
+def _criar_vendedor(**campos):
+    return get_user_model().objects.create_user(
+        'vendedor@teste.com', 'senha-teste', first_name='Vendedor', **campos)
+
+
+def _entrar(client, **campos):
+    """Cria o vendedor de teste e faz login com ele."""
+    usuario = _criar_vendedor(**campos)
+    client.force_login(usuario)
+    return usuario
+
+
+def _criar_produto(nome='Caneta', venda='2.50', compra='1.00', quantidade=100,
+                   **campos):
+    return Estoque.objects.create(
+        produto_em_estoque=nome, preco_de_venda=Decimal(venda),
+        preco_de_compra=Decimal(compra), quantidade_em_estoque=quantidade,
+        **campos)
+
+
+def _soma(queryset, expressao):
+    return queryset.aggregate(
+        total=Sum(expressao, output_field=FloatField()))['total'] or 0
+
+
+def _percentual(atual, anterior):
+    if anterior == 0:
+        return '-'
+    return round((atual - anterior) / anterior * 100, 2)
+
+
+def _entre(inicio, fim):
+    return Venda.objects.filter(data_da_venda__gte=inicio_do_dia(inicio),
+                                data_da_venda__lt=inicio_do_dia(fim))
+
+
+def _metricas_referencia(agora):
+    """Calcula cada número do dashboard com uma consulta própria."""
+    v = Venda.objects.all()
+    hoje = timezone.localdate(agora)
+    segunda = hoje - timedelta(days=hoje.weekday())
+    semana = _entre(segunda, segunda + timedelta(days=7))
+    semana_anterior = _entre(segunda - timedelta(days=7), segunda)
+    primeiro = hoje.replace(day=1)
+    ultimo = primeiro.replace(year=primeiro.year + primeiro.month // 12,
+                              month=primeiro.month % 12 + 1)
+    mes = _entre(primeiro, ultimo)
+    mes_anterior = _entre(primeiro.replace(
+        year=primeiro.year - (primeiro.month == 1),
+        month=(primeiro.month - 2) % 12 + 1), primeiro)
+    m = {
+        'total_vendas2': _soma(v, VENDIDO),
+        'total_de_lucros2': _soma(v, LUCRO),
+        'total_vendas_semana_atual': _soma(semana, VENDIDO),
+        'total_lucro_semana_atual': _soma(semana, LUCRO),
+        'total_vendas_mes_atual': _soma(mes, VENDIDO),
+        'total_lucro_mes_atual': _soma(mes, LUCRO),
+    }
+    m['percentual_vendas'] = _percentual(
+        m['total_vendas_mes_atual'], _soma(mes_anterior, VENDIDO))
+    m['percentual_vendas2'] = _percentual(
+        m['total_lucro_mes_atual'], _soma(mes_anterior, LUCRO))
+    m['percentual_vendas_semana_anterior'] = _percentual(
+        m['total_vendas_semana_atual'], _soma(semana_anterior, VENDIDO))
+    m['percentual_vendas_semana_anterior2'] = _percentual(
+        m['total_lucro_semana_atual'], _soma(semana_anterior, LUCRO))
+    for i, dia in enumerate(DIAS_DA_SEMANA):
+        inicio = segunda + timedelta(days=i)
+        m[f'{dia}_vendas'] = _soma(
+            _entre(inicio, inicio + timedelta(days=1)), VENDIDO)
+    m['sales_data'] = [m[f'{dia}_vendas'] for dia in DIAS_DA_SEMANA]
+    for numero, nome in enumerate(MESES, start=1):
+        fim = date(hoje.year + numero // 12, numero % 12 + 1, 1)
+        do_mes = _entre(date(hoje.year, numero, 1), fim)
+        m[f'total_vendas_{nome}'] = _soma(do_mes, VENDIDO)
+        m[f'total_vendas_lucro_{nome}'] = _soma(do_mes, LUCRO)
+    m['sales_data_months'] = [m[f'total_vendas_{nome}'] for nome in MESES]
+    m['sales_data_months_2'] = [
+        m[f'total_vendas_lucro_{nome}'] for nome in MESES]
+    return m
+
+
+class MetricasDashboardTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agora = timezone.now()
+        caneta = _criar_produto(quantidade=1000)
+        caderno = _criar_produto('Caderno', '19.90', '12.35', 1000)
+        for dias in (0, 1, 2, 3, 5, 6, 7, 9, 13, 20, 31, 45, 62, 120, 200, 365, 400, 730):
+            for produto, quantidade in ((caneta, dias % 7 + 1), (caderno, dias % 3 + 1)):
+                Venda.objects.create(
+                    produto=produto, quantidade_vendida=quantidade,
+                    data_da_venda=cls.agora - timedelta(days=dias))
+        VendaDiaria.objects.reconstruir()
+
+    def assertMetricasIguais(self, obtido, esperado):
+        self.assertEqual(set(esperado) - set(obtido), set())
+        for chave, valor in esperado.items():
+            if isinstance(valor, list):
+                self.assertEqual(len(obtido[chave]), len(valor), chave)
+                for a, b in zip(obtido[chave], valor):
+                    self.assertAlmostEqual(a, b, places=6, msg=chave)
+            elif isinstance(valor, str):
+                self.assertEqual(obtido[chave], valor, chave)
+            else:
+                self.assertAlmostEqual(obtido[chave], valor, places=6, msg=chave)
+
+    def test_metricas_iguais_a_uma_consulta_por_numero(self):
+        self.assertMetricasIguais(
+            metricas_dashboard(agora=self.agora), _metricas_referencia(self.agora))
+
+    def test_metricas_direto_das_vendas(self):
+        self.assertMetricasIguais(
+            metricas_dashboard(agora=self.agora, queryset=Venda.objects.all()),
+            _metricas_referencia(self.agora))
+
+    def test_metricas_sem_vendas(self):
+        Venda.objects.all().delete()
+        VendaDiaria.objects.all().delete()
+        metricas = metricas_dashboard(agora=self.agora)
+        self.assertMetricasIguais(metricas, _metricas_referencia(self.agora))
+        self.assertEqual(metricas['percentual_vendas'], '-')
+        self.assertEqual(metricas['sales_data_months'], [0] * 12)
+
+    def test_semana_de_outro_ano_nao_conta(self):
+        antes = metricas_dashboard(agora=self.agora)
+        # Mesmo número de semana ISO, um ano antes: __week contava essa venda.
+        venda = Venda.objects.create(
+            produto=Estoque.objects.first(), quantidade_vendida=100,
+            data_da_venda=self.agora - timedelta(weeks=52))
+        VendaDiaria.objects.registrar(venda)
+        depois = metricas_dashboard(agora=self.agora)
+        self.assertEqual(depois['total_vendas_semana_atual'],
+                         antes['total_vendas_semana_atual'])
+        self.assertEqual(depois['sales_data'], antes['sales_data'])
+
+    def test_periodos_na_virada_do_ano(self):
+        limites = periodos(timezone.make_aware(datetime(2027, 1, 2, 12)))
+        self.assertEqual(limites['mes_anterior'],
+                         (date(2026, 12, 1), date(2027, 1, 1)))
+        self.assertEqual(limites['semana'],
+                         (date(2026, 12, 28), date(2027, 1, 4)))
+        self.assertEqual(limites['ano'], (date(2027, 1, 1), date(2028, 1, 1)))
+
+    def test_metricas_usam_duas_consultas(self):
+        with self.assertNumQueries(2):
+            metricas_dashboard(agora=self.agora)
+
+
+class PeriodoTestCase(TestCase):
+
+    def test_periodos_e_anteriores_na_virada_do_ano(self):
+        dia = date(2027, 1, 2)
+        esperados = {
+            calendario.DIA: ((date(2027, 1, 2), date(2027, 1, 3)),
+                             (date(2027, 1, 1), date(2027, 1, 2))),
+            # 2 de janeiro de 2027 ainda é da semana ISO 53 de 2026.
+            calendario.SEMANA: ((date(2026, 12, 28), date(2027, 1, 4)),
+                                (date(2026, 12, 21), date(2026, 12, 28))),
+            calendario.MES: ((date(2027, 1, 1), date(2027, 2, 1)),
+                             (date(2026, 12, 1), date(2027, 1, 1))),
+            calendario.TRIMESTRE: ((date(2027, 1, 1), date(2027, 4, 1)),
+                                   (date(2026, 10, 1), date(2027, 1, 1))),
+            calendario.ANO: ((date(2027, 1, 1), date(2028, 1, 1)),
+                             (date(2026, 1, 1), date(2027, 1, 1))),
+        }
+        for tipo, (atual, anterior) in esperados.items():
+            periodo = calendario.periodo(tipo, dia)
+            self.assertEqual(periodo[1:], atual, tipo)
+            self.assertEqual(periodo.anterior()[1:], anterior, tipo)
+
+    def test_trimestre_e_mes_de_tamanhos_diferentes(self):
+        trimestre = calendario.periodo(calendario.TRIMESTRE, date(2026, 8, 31))
+        self.assertEqual(trimestre[1:], (date(2026, 7, 1), date(2026, 10, 1)))
+        marco = calendario.periodo(calendario.MES, date(2024, 3, 31))
+        self.assertEqual(marco.anterior()[1:],
+                         (date(2024, 2, 1), date(2024, 3, 1)))
+
+    def test_personalizado(self):
+        periodo = calendario.periodo(
+            calendario.PERSONALIZADO, date(2026, 1, 1), date(2026, 1, 10))
+        self.assertEqual(periodo.dias, 10)
+        self.assertEqual(periodo.anterior()[1:],
+                         (date(2025, 12, 22), date(2026, 1, 1)))
+        with self.assertRaises(ValueError):
+            calendario.periodo(calendario.PERSONALIZADO, date(2026, 1, 10),
+                               date(2026, 1, 1))
+        with self.assertRaises(ValueError):
+            calendario.periodo(calendario.PERSONALIZADO, None, date(2026, 1, 1))
+        with self.assertRaises(ValueError):
+            calendario.periodo('quinzena', date(2026, 1, 1))
+
+    def test_limites_no_fuso_configurado(self):
+        inicio, fim = calendario.periodo(calendario.DIA, date(2026, 3, 1)).limites()
+        self.assertEqual(timezone.localtime(inicio),
+                         timezone.make_aware(datetime(2026, 3, 1)))
+        self.assertEqual(fim - inicio, timedelta(days=1))
+
+
+class ComparacaoTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.produto = _criar_produto(venda='2.00', quantidade=1000)
+        vendas = [
+            (datetime(2025, 1, 15, 10), 7),   # janeiro do ano anterior
+            (datetime(2025, 12, 1, 0, 0), 1),
+            (datetime(2025, 12, 31, 23, 59), 2),
+            (datetime(2026, 1, 1, 0, 0), 3),
+            (datetime(2026, 1, 20, 12), 4),
+            (datetime(2026, 2, 1, 0, 0), 50),
+        ]
+        for momento, quantidade in vendas:
+            Venda.objects.create(
+                produto=cls.produto, quantidade_vendida=quantidade,
+                data_da_venda=timezone.make_aware(momento))
+        VendaDiaria.objects.reconstruir()
+
+    def test_janeiro_comparado_com_dezembro(self):
+        janeiro = calendario.periodo(calendario.MES, date(2026, 1, 10))
+        for queryset in (None, Venda.objects.all()):
+            with self.assertNumQueries(1):
+                comparacao = comparar(janeiro, queryset)
+            self.assertEqual(comparacao['vendas'], {
+                'atual': 14.0, 'anterior': 6.0, 'percentual': 133.33})
+            self.assertEqual(comparacao['lucro']['atual'], 7.0)
+            self.assertEqual(comparacao['lucro']['anterior'], 3.0)
+
+    def test_ano_e_periodo_sem_vendas(self):
+        ano = comparar(calendario.periodo(calendario.ANO, date(2026, 6, 1)))
+        self.assertEqual(ano['vendas']['atual'], 114.0)
+        self.assertEqual(ano['vendas']['anterior'], 20.0)
+        vazio = comparar(calendario.periodo(calendario.MES, date(2024, 6, 1)))
+        self.assertEqual(vazio['vendas'],
+                         {'atual': 0, 'anterior': 0, 'percentual': '-'})
+
+    def test_api(self):
+        cache.clear()
+        _entrar(self.client)
+        dados = self.client.get('/api/dashboard/comparacao/', {
+            'periodo': 'semana', 'data': '2026-01-01'}).json()
+        self.assertEqual(dados['atual'],
+                         {'inicio': '2025-12-29', 'fim': '2026-01-04'})
+        self.assertEqual(dados['anterior'],
+                         {'inicio': '2025-12-22', 'fim': '2025-12-28'})
+        self.assertEqual(dados['vendas']['atual'], 10.0)
+        dados = self.client.get('/api/dashboard/comparacao/', {
+            'periodo': 'personalizado', 'inicio': '2026-01-01',
+            'fim': '2026-01-31'}).json()
+        self.assertEqual(dados['vendas']['atual'], 14.0)
+        self.assertEqual(dados['vendas']['anterior'], 6.0)
+        resposta = self.client.get('/api/dashboard/comparacao/', {
+            'periodo': 'personalizado', 'inicio': '2026-01-31',
+            'fim': '2026-01-01'})
+        self.assertEqual(resposta.status_code, 400)
+        resposta = self.client.get('/api/dashboard/comparacao/',
+                                   {'periodo': 'quinzena'})
+        self.assertEqual(resposta.status_code, 400)
+
+
+class SerieTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.produto = _criar_produto(venda='2.00', quantidade=1000)
+        for momento, quantidade in ((datetime(2022, 3, 10, 9), 1),
+                                    (datetime(2025, 12, 31, 23, 30), 2),
+                                    (datetime(2026, 1, 1, 0, 10), 3),
+                                    (datetime(2026, 1, 6, 12), 4)):
+            Venda.objects.create(
+                produto=cls.produto, quantidade_vendida=quantidade,
+                data_da_venda=timezone.make_aware(momento))
+        VendaDiaria.objects.reconstruir()
+
+    def test_serie_por_dia_com_zeros(self):
+        for queryset in (None, Venda.objects.all()):
+            with self.assertNumQueries(1):
+                dados = serie(date(2025, 12, 30), date(2026, 1, 3),
+                              calendario.DIA, queryset)
+            self.assertEqual(dados['labels'], [
+                '30/12/2025', '31/12/2025', '01/01/2026', '02/01/2026'])
+            self.assertEqual(dados['vendas'], [0, 4.0, 6.0, 0])
+            self.assertEqual(dados['lucro'], [0, 2.0, 3.0, 0])
+
+    def test_serie_por_semana_e_por_mes(self):
+        semanas = serie(date(2025, 12, 29), date(2026, 1, 12), calendario.SEMANA)
+        self.assertEqual(semanas['labels'], ['29/12/2025', '05/01/2026'])
+        self.assertEqual(semanas['vendas'], [10.0, 8.0])
+        meses = serie(date(2025, 11, 1), date(2026, 2, 1), calendario.MES)
+        self.assertEqual(meses['labels'], ['11/2025', '12/2025', '01/2026'])
+        self.assertEqual(meses['vendas'], [0, 4.0, 14.0])
+
+    def test_cinco_anos_dia_a_dia_em_uma_consulta(self):
+        with self.assertNumQueries(1):
+            dados = serie(date(2021, 6, 1), date(2026, 6, 1), calendario.DIA)
+        self.assertEqual(len(dados['labels']),
+                         (date(2026, 6, 1) - date(2021, 6, 1)).days)
+        self.assertEqual(sum(dados['vendas']), 20.0)
+        self.assertEqual(dados['vendas'][dados['labels'].index('10/03/2022')], 2.0)
+
+    def test_api_e_dashboard(self):
+        cache.clear()
+        _entrar(self.client)
+        parametros = {'inicio': '2025-12-29', 'fim': '2026-01-11',
+                      'granularidade': 'semana'}
+        dados = self.client.get('/api/dashboard/serie/', parametros).json()
+        self.assertEqual(dados['granularidade'], 'semana')
+        self.assertEqual(dados['vendas'], [10.0, 8.0])
+
+        resposta = self.client.get('/dashboard/', parametros)
+        self.assertContains(resposta, 'Total Vendido Por Semana')
+        self.assertContains(resposta, escapejs(
+            '/api/dashboard/serie/?inicio=2025-12-29&fim=2026-01-11'
+            '&granularidade=semana'))
+
+        resposta = self.client.get('/api/dashboard/serie/', {
+            'inicio': '2026-01-11', 'fim': '2025-12-29'})
+        self.assertEqual(resposta.status_code, 400)
+        resposta = self.client.get('/api/dashboard/serie/', {
+            'inicio': '1990-01-01', 'fim': '2026-01-01', 'granularidade': 'dia'})
+        self.assertEqual(resposta.status_code, 400)
+
+    def test_sem_parametros_ano_corrente_por_mes(self):
+        filtro = FiltroDoDashboardForm({})
+        self.assertTrue(filtro.is_valid())
+        ano = timezone.localdate().year
+        self.assertEqual(filtro.limites(), (date(ano, 1, 1), date(ano + 1, 1, 1),
+                                            calendario.MES))
+
+
+class RankingDeProdutosTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.inicio = date(2026, 1, 1)
+        cls.fim = date(2026, 2, 1)
+        dados = [('Caneta', '2.00', '1.00', [5, 5]),
+                 ('Caderno', '20.00', '18.00', [1]),
+                 ('Mochila', '90.00', '40.00', [1]),
+                 ('Borracha', '1.00', '0.25', [30])]
+        cls.produtos = {}
+        for nome, venda, compra, quantidades in dados:
+            produto = _criar_produto(nome, venda, compra, 1000)
+            cls.produtos[nome] = produto
+            for dia, quantidade in enumerate(quantidades, start=10):
+                Venda.objects.create(
+                    produto=produto, quantidade_vendida=quantidade,
+                    data_da_venda=timezone.make_aware(datetime(2026, 1, dia, 12)))
+        # Fora do período: não conta.
+        Venda.objects.create(
+            produto=cls.produtos['Caderno'], quantidade_vendida=100,
+            data_da_venda=timezone.make_aware(datetime(2025, 12, 31, 23)))
+        VendaDiaria.objects.reconstruir()
+
+    def nomes(self, ranking):
+        return [produto['nome'] for produto in ranking]
+
+    def test_ordens_e_limite(self):
+        with self.assertNumQueries(1):
+            receita = ranking_de_produtos(self.inicio, self.fim, limite=2)
+        self.assertEqual(self.nomes(receita), ['Mochila', 'Borracha'])
+        self.assertEqual(self.nomes(ranking_de_produtos(
+            self.inicio, self.fim, 'lucro')),
+            ['Mochila', 'Borracha', 'Caneta', 'Caderno'])
+        self.assertEqual(self.nomes(ranking_de_produtos(
+            self.inicio, self.fim, 'unidades', 1)), ['Borracha'])
+        with self.assertRaises(ValueError):
+            ranking_de_produtos(self.inicio, self.fim, 'nome')
+
+    def test_valores_e_margem_iguais_aos_das_vendas(self):
+        consolidado = ranking_de_produtos(self.inicio, self.fim)
+        direto = ranking_de_produtos(self.inicio, self.fim,
+                                     queryset=Venda.objects.all())
+        self.assertEqual(consolidado, direto)
+        caneta = next(p for p in consolidado if p['nome'] == 'Caneta')
+        self.assertEqual(caneta, {
+            'id': self.produtos['Caneta'].pk, 'nome': 'Caneta',
+            'receita': 20.0, 'lucro': 10.0, 'unidades': 10, 'margem': 50.0})
+
+    def test_pagina_e_api(self):
+        cache.clear()
+        _entrar(self.client)
+        parametros = {'inicio': '2026-01-01', 'fim': '2026-01-31',
+                      'ordem': 'unidades', 'limite': 2}
+        dados = self.client.get('/api/produtos/ranking/', parametros).json()
+        self.assertEqual(self.nomes(dados['produtos']), ['Borracha', 'Caneta'])
+        resposta = self.client.get('/produtos/analise/', parametros)
+        self.assertContains(resposta, 'Borracha')
+        self.assertContains(resposta, '75,00%')
+        self.assertNotContains(resposta, 'Mochila')
+        resposta = self.client.get('/api/produtos/ranking/', {'limite': 1000})
+        self.assertEqual(resposta.status_code, 400)
+
+
+class RankingDeVendedoresTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        Usuario = get_user_model()
+        self.ana = Usuario.objects.create_user(
+            'ana@teste.com', 'senha-teste', first_name='Ana', last_name='Lima')
+        self.bruno = Usuario.objects.create_user(
+            'bruno@teste.com', 'senha-teste')
+        self.produto = _criar_produto('Caneta', '2.00', '1.50', 1000)
+        self.hoje = timezone.localdate()
+
+    def vender(self, usuario, quantidade):
+        self.client.force_login(usuario)
+        resposta = self.client.post('/formulariodevenda/', {
+            'produto': self.produto.pk, 'quantidade_vendida': quantidade})
+        self.assertEqual(resposta.status_code, 302)
+
+    def ranking(self, **kwargs):
+        return ranking_de_vendedores(
+            self.hoje, self.hoje + timedelta(days=1), **kwargs)
+
+    def test_venda_e_pedido_registram_o_vendedor(self):
+        self.vender(self.ana, 2)
+        self.assertEqual(Venda.objects.get().vendedor, self.ana)
+        self.client.force_login(self.bruno)
+        self.client.post('/pedido/', {
+            'itens-TOTAL_FORMS': 1, 'itens-INITIAL_FORMS': 0,
+            'itens-0-produto': self.produto.pk,
+            'itens-0-quantidade_vendida': 3})
+        self.assertEqual(Venda.objects.get(pedido__isnull=False).vendedor,
+                         self.bruno)
+        diaria = VendaDiariaPorVendedor.objects.get(vendedor=self.bruno)
+        self.assertEqual(diaria.numero_de_vendas, 1)
+        self.assertEqual(diaria.total_vendido, Decimal('6.00'))
+
+    def test_ranking_em_uma_consulta_igual_ao_das_vendas(self):
+        self.vender(self.ana, 2)
+        self.vender(self.bruno, 5)
+        self.vender(self.ana, 1)
+        # Venda de outro dia e venda sem vendedor ficam de fora.
+        Venda.objects.efetivar(Venda(
+            produto=self.produto, quantidade_vendida=100, vendedor=self.ana,
+            data_da_venda=timezone.now() - timedelta(days=2)))
+        Venda.objects.efetivar(
+            Venda(produto=self.produto, quantidade_vendida=50))
+        with self.assertNumQueries(1):
+            ranking = self.ranking()
+        self.assertEqual(ranking, [
+            {'id': self.bruno.pk, 'nome': 'bruno@teste.com', 'receita': 10.0,
+             'lucro': 2.5, 'unidades': 5},
+            {'id': self.ana.pk, 'nome': 'Ana Lima', 'receita': 6.0,
+             'lucro': 1.5, 'unidades': 3},
+        ])
+        self.assertEqual(ranking, self.ranking(queryset=Venda.objects.all()))
+        self.assertEqual(self.ranking(limite=1)[0]['id'], self.bruno.pk)
+
+        incremental = list(VendaDiariaPorVendedor.objects.values_list(
+            'data', 'vendedor_id', 'numero_de_vendas', 'total_vendido'))
+        VendaDiaria.objects.reconstruir()
+        self.assertEqual(incremental, list(
+            VendaDiariaPorVendedor.objects.values_list(
+                'data', 'vendedor_id', 'numero_de_vendas', 'total_vendido')))
+
+    def test_cancelar_estorna_o_vendedor(self):
+        self.vender(self.ana, 2)
+        Venda.objects.cancelar(Venda.objects.get())
+        self.assertFalse(VendaDiariaPorVendedor.objects.exists())
+        self.assertEqual(self.ranking(), [])
+
+    def test_consulta_por_vendedor_usa_indice(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('plano de execução verificado só no SQLite')
+        consulta = Venda.objects.filter(
+            vendedor=self.ana, data_da_venda__gte=timezone.now()).values('pk')
+        sql, parametros = consulta.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', parametros)
+            plano = ' '.join(str(linha[-1]) for linha in cursor.fetchall())
+        self.assertIn('venda_vendedor_data_idx', plano)
+
+    def test_pagina_e_api(self):
+        self.vender(self.ana, 2)
+        self.vender(self.bruno, 1)
+        dia = self.hoje.isoformat()
+        dados = self.client.get('/api/vendedores/ranking/', {
+            'inicio': dia, 'fim': dia}).json()
+        self.assertEqual([v['nome'] for v in dados['vendedores']],
+                         ['Ana Lima', 'bruno@teste.com'])
+        resposta = self.client.get('/vendedores/ranking/', {
+            'inicio': dia, 'fim': dia, 'limite': 1})
+        self.assertContains(resposta, 'Ana Lima')
+        self.assertNotContains(resposta, 'bruno@teste.com')
+        resposta = self.client.get('/api/vendedores/ranking/', {
+            'inicio': dia, 'fim': '2000-01-01'})
+        self.assertEqual(resposta.status_code, 400)
+
+
+class DashListViewTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = _entrar(self.client)
+        produto = _criar_produto()
+        venda = Venda.objects.create(produto=produto, quantidade_vendida=4)
+        VendaDiaria.objects.registrar(venda)
+
+    def test_dashboard_sem_consulta_por_venda(self):
+        produto = Estoque.objects.get()
+        for _ in range(15):
+            Venda.objects.create(produto=produto, quantidade_vendida=1)
+        with self.assertNumQueries(CONSULTAS_DO_DASHBOARD):
+            resposta = self.client.get('/dashboard/')
+        linhas = list(resposta.context['page_obj'])
+        self.assertEqual(len(linhas), 10)
+        self.assertEqual(linhas[-1].receita, Decimal('2.50'))
+        self.assertEqual(linhas[-1].lucro, Decimal('1.50'))
+
+    def test_dashboard_exibe_metricas(self):
+        resposta = self.client.get('/dashboard/')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.context['total_vendas2'], 10.0)
+        self.assertEqual(resposta.context['total_de_lucros2'], 6.0)
+        self.assertEqual(len(resposta.context['sales_data_months']), 12)
+
+    def test_links_da_paginacao_mantem_o_filtro(self):
+        produto = Estoque.objects.get()
+        for _ in range(15):
+            Venda.objects.create(produto=produto, quantidade_vendida=1)
+        filtro = 'inicio=2025-12-29&fim=2026-01-11&granularidade=semana'
+        resposta = self.client.get(f'/dashboard/?{filtro}')
+        pagina = resposta.context['page_obj']
+        self.assertEqual(pagina.url_proxima,
+                         f'?{filtro}&depois={pagina.cursor_proximo}')
+        self.assertContains(resposta, f'href="{escape(pagina.url_proxima)}"')
+        self.assertContains(resposta, f'href="{escape(f"?{filtro}&antes=")}"')
+
+        resposta = self.client.get(f'/dashboard/{pagina.url_proxima}')
+        pagina = resposta.context['page_obj']
+        self.assertEqual(resposta.context['filtro']['granularidade'].value(),
+                         'semana')
+        self.assertEqual(pagina.url_primeira, f'?{filtro}')
+        self.assertEqual(pagina.url_anterior,
+                         f'?{filtro}&antes={pagina.cursor_anterior}')
+
+
+class VendaDiariaTestCase(TestCase):
+
+    def setUp(self):
+        self.usuario = _entrar(self.client)
+        self.produto = _criar_produto()
+
+    def linhas(self):
+        return list(VendaDiaria.objects.values_list(
+            'data', 'produto_id', 'numero_de_vendas', 'quantidade_vendida',
+            'total_vendido', 'total_lucro'))
+
+    def test_incremental_igual_a_reconstrucao(self):
+        agora = timezone.now()
+        for dias, quantidade in ((0, 3), (0, 2), (1, 5), (40, 1)):
+            venda = Venda.objects.create(
+                produto=self.produto, quantidade_vendida=quantidade,
+                data_da_venda=agora - timedelta(days=dias))
+            VendaDiaria.objects.registrar(venda)
+        VendaDiaria.objects.estornar(venda)
+        venda.delete()
+        incremental = self.linhas()
+        call_command('reconstruir_vendas_diarias', stdout=StringIO())
+        self.assertEqual(incremental, self.linhas())
+        self.assertEqual(len(incremental), 2)
+
+    def test_formulario_e_exclusao_atualizam_consolidado(self):
+        self.client.post('/formulariodevenda/', {
+            'produto': self.produto.pk, 'quantidade_vendida': 4})
+        diaria = VendaDiaria.objects.get()
+        self.assertEqual(diaria.numero_de_vendas, 1)
+        self.assertEqual(diaria.total_vendido, Decimal('10.00'))
+        self.assertEqual(diaria.total_lucro, Decimal('6.00'))
+
+        venda = Venda.objects.get()
+        self.client.post(f'/venda/excluir/{venda.pk}/')
+        self.assertFalse(VendaDiaria.objects.exists())
+
+    def test_excluir_produto_mantem_as_vendas_no_consolidado(self):
+        cache.clear()
+        outros = [_criar_produto(nome)
+            for nome in ('Caderno', 'Lápis')]
+        vendas = [Venda.objects.efetivar(
+            Venda(produto=produto, quantidade_vendida=4))
+            for produto in [self.produto] + outros]
+        antes = metricas_dashboard()['total_vendas2']
+        self.assertEqual(antes, 30.0)
+
+        for produto in outros:
+            produto.delete()
+        self.assertEqual(metricas_dashboard()['total_vendas2'], 30.0)
+        self.assertEqual(
+            VendaDiaria.objects.filter(produto__isnull=True).count(), 1)
+        hoje = timezone.localdate()
+        self.assertEqual(
+            [p['id'] for p in ranking_de_produtos(
+                hoje, hoje + timedelta(days=1))], [self.produto.pk])
+
+        incremental = self.linhas()
+        VendaDiaria.objects.reconstruir()
+        self.assertEqual(incremental, self.linhas())
+        self.assertEqual(metricas_dashboard()['total_vendas2'], 30.0)
+
+        Venda.objects.cancelar(Venda.objects.get(pk=vendas[1].pk))
+        self.assertEqual(metricas_dashboard()['total_vendas2'], 20.0)
+        incremental = self.linhas()
+        VendaDiaria.objects.reconstruir()
+        self.assertEqual(incremental, self.linhas())
+
+
+class VendaPrecosTestCase(TestCase):
+
+    def test_reajuste_nao_altera_vendas_anteriores(self):
+        produto = _criar_produto()
+        venda = Venda.objects.create(produto=produto, quantidade_vendida=4)
+        self.assertEqual(venda.valor_total, Decimal('10.00'))
+
+        produto.preco_de_venda = Decimal('3.00')
+        produto.preco_de_compra = Decimal('2.00')
+        produto.save()
+
+        venda = Venda.objects.get(pk=venda.pk)
+        self.assertEqual(venda.total_vendido, Decimal('10.00'))
+        self.assertEqual(venda.total_lucro, Decimal('6.00'))
+        totais = metricas_dashboard(queryset=Venda.objects.all())
+        self.assertEqual(totais['total_vendas2'], 10.0)
+        self.assertEqual(totais['total_de_lucros2'], 6.0)
+
+
+class BaixaDeEstoqueTestCase(TestCase):
+
+    def setUp(self):
+        self.usuario = _entrar(self.client)
+        self.produto = _criar_produto(quantidade=5)
+
+    def test_venda_baixa_estoque(self):
+        resposta = self.client.post('/formulariodevenda/', {
+            'produto': self.produto.pk, 'quantidade_vendida': 3})
+        self.assertRedirects(resposta, '/formulariodevenda/')
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.quantidade_em_estoque, 2)
+        self.assertEqual(Venda.objects.count(), 1)
+
+    def test_estoque_insuficiente_nao_grava_venda(self):
+        resposta = self.client.post('/formulariodevenda/', {
+            'produto': self.produto.pk, 'quantidade_vendida': 6})
+        self.assertContains(resposta, 'Quantidade em estoque insuficiente.')
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.quantidade_em_estoque, 5)
+        self.assertFalse(Venda.objects.exists())
+        self.assertFalse(VendaDiaria.objects.exists())
+
+
+class BaixaConcorrenteTestCase(TransactionTestCase):
+    threads = 8
+    vendas_por_thread = 10
+    estoque_inicial = 50
+
+    def test_vendas_paralelas_nao_ultrapassam_estoque(self):
+        produto = _criar_produto(quantidade=self.estoque_inicial)
+        barreira = Barrier(self.threads)
+        trava = Lock()
+        vendidas = []
+
+        def vender():
+            barreira.wait()
+            try:
+                for i in range(self.vendas_por_thread):
+                    quantidade = i % 3 + 1
+                    while True:
+                        try:
+                            Venda.objects.efetivar(Venda(
+                                produto=produto, quantidade_vendida=quantidade))
+                        except EstoqueInsuficiente:
+                            break
+                        except OperationalError:
+                            # SQLite recusa escritas simultâneas ("database is
+                            # locked"); a transação inteira é repetida.
+                            continue
+                        with trava:
+                            vendidas.append(quantidade)
+                        break
+            finally:
+                connection.close()
+
+        workers = [Thread(target=vender) for _ in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        produto.refresh_from_db()
+        self.assertGreater(len(vendidas), 0)
+        self.assertGreaterEqual(produto.quantidade_em_estoque, 0)
+        self.assertEqual(produto.quantidade_em_estoque,
+                         self.estoque_inicial - sum(vendidas))
+        self.assertEqual(Venda.objects.count(), len(vendidas))
+
+
+class DashboardAsyncTestCase(TransactionTestCase):
+    # As consultas rodam em outras threads, que só enxergam dados commitados.
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = _criar_vendedor()
+        self.produto = _criar_produto()
+        agora = timezone.now()
+        for dias in (0, 1, 8, 40, 400):
+            Venda.objects.efetivar(Venda(
+                produto=self.produto, quantidade_vendida=dias % 5 + 1,
+                data_da_venda=agora - timedelta(days=dias)))
+
+    def test_mesmas_metricas_da_versao_sincrona(self):
+        agora = timezone.now()
+        self.assertEqual(async_to_sync(metricas_dashboard_async)(agora),
+                         metricas_dashboard(agora))
+        vendas = Venda.objects.all()
+        self.assertEqual(
+            async_to_sync(metricas_dashboard_async)(agora, vendas),
+            metricas_dashboard(agora, vendas))
+
+    def test_grupos_rodam_em_threads_do_pool(self):
+        threads = set()
+        original = metricas._na_thread
+
+        def registrar(funcao):
+            threads.add(current_thread().name)
+            return original(funcao)
+
+        with mock.patch.object(metricas, '_na_thread', registrar):
+            async_to_sync(metricas_dashboard_async)()
+        self.assertTrue(threads)
+        self.assertTrue(all(nome.startswith('dashboard') for nome in threads))
+
+    def test_pagina(self):
+        self.client.force_login(self.usuario)
+        resposta = self.client.get('/dashboard/async/')
+        self.assertEqual(resposta.status_code, 200)
+        sincrona = self.client.get('/dashboard/')
+        self.assertEqual(resposta.context['total_vendas2'],
+                         sincrona.context['total_vendas2'])
+        self.assertEqual(len(resposta.context['page_obj']), 5)
+        self.assertContains(resposta, 'Caneta')
+
+    @override_settings(INSTRUMENTACAO=True)
+    def test_server_timing_conta_as_consultas_do_pool(self):
+        self.client.force_login(self.usuario)
+        no_pool = []
+        original = metricas._na_thread
+
+        def registrar(funcao):
+            with CaptureQueriesContext(connection) as consultas:
+                resultado = original(funcao)
+            no_pool.append(len(consultas))
+            return resultado
+
+        with mock.patch.object(metricas, '_na_thread', registrar), \
+                CaptureQueriesContext(connection) as na_requisicao:
+            resposta = self.client.get('/dashboard/async/')
+        self.assertTrue(no_pool)
+        total = len(na_requisicao) + sum(no_pool)
+        self.assertIn(f'desc="{total} consultas"', resposta['Server-Timing'])
+
+    def test_exige_login(self):
+        resposta = self.client.get('/dashboard/async/')
+        self.assertRedirects(resposta, '/login/?next=/dashboard/async/',
+                             fetch_redirect_response=False)
+
+
+class DiarioDeEstoqueTestCase(TestCase):
+
+    def setUp(self):
+        self.produto = _criar_produto(quantidade=50)
+
+    def assertDiarioConfere(self):
+        self.produto.refresh_from_db()
+        soma = self.produto.movimentos.aggregate(s=Sum('quantidade'))['s']
+        self.assertEqual(soma, self.produto.quantidade_em_estoque)
+
+    def test_movimentos_acompanham_o_saldo(self):
+        self.assertEqual(self.produto.movimentos.get().observacao, 'Saldo inicial')
+        venda = Venda.objects.efetivar(
+            Venda(produto=self.produto, quantidade_vendida=3))
+        self.assertEqual(venda.movimentos.get().quantidade, -3)
+        Venda.objects.efetivar_pedido(
+            [Venda(produto=self.produto, quantidade_vendida=2),
+             Venda(produto=self.produto, quantidade_vendida=1)])
+        importar_vendas([{'produto': 'Caneta', 'quantidade': '4'}])
+        MovimentoDeEstoque.objects.lancar(MovimentoDeEstoque(
+            produto=self.produto, tipo=MovimentoDeEstoque.REPOSICAO,
+            quantidade=20))
+        self.assertDiarioConfere()
+        self.assertEqual(self.produto.quantidade_em_estoque, 60)
+        self.assertEqual(
+            list(self.produto.movimentos.values_list('tipo', flat=True)),
+            ['ajuste', 'venda', 'venda', 'venda', 'venda', 'reposicao'])
+
+    def test_exclusao_devolve_estoque(self):
+        _entrar(self.client)
+        venda = Venda.objects.efetivar(
+            Venda(produto=self.produto, quantidade_vendida=5))
+        self.client.post(f'/venda/excluir/{venda.pk}/')
+        self.assertFalse(Venda.objects.filter(pk=venda.pk).exists())
+        self.assertDiarioConfere()
+        self.assertEqual(self.produto.quantidade_em_estoque, 50)
+        devolucao = self.produto.movimentos.last()
+        self.assertEqual(devolucao.tipo, MovimentoDeEstoque.DEVOLUCAO)
+        self.assertEqual(devolucao.quantidade, 5)
+
+    def _historico(self):
+        # Saldo inicial de 50 (hoje) mais movimentos nos últimos 10 dias.
+        self.produto.movimentos.update(
+            data=timezone.now() - timedelta(days=20))
+        hoje = timezone.localdate()
+        for dias, quantidade in ((10, -5), (7, 12), (5, -3), (2, -4)):
+            MovimentoDeEstoque.objects.create(
+                produto=self.produto, tipo=MovimentoDeEstoque.AJUSTE,
+                quantidade=quantidade,
+                data=inicio_do_dia(hoje - timedelta(days=dias)) + timedelta(hours=12))
+        return hoje
+
+    def test_saldo_em_datas_passadas(self):
+        hoje = self._historico()
+        esperados = {30: 0, 15: 50, 9: 45, 6: 57, 3: 54, 1: 50}
+        for dias, saldo in esperados.items():
+            momento = inicio_do_dia(hoje - timedelta(days=dias))
+            self.assertEqual(self.produto.saldo_em(momento), saldo, dias)
+
+        FechamentoDeEstoque.objects.fechar(hoje - timedelta(days=8))
+        FechamentoDeEstoque.objects.fechar(hoje - timedelta(days=4))
+        for dias, saldo in esperados.items():
+            momento = inicio_do_dia(hoje - timedelta(days=dias))
+            with self.assertNumQueries(2):
+                self.assertEqual(self.produto.saldo_em(momento), saldo, dias)
+        self.assertEqual(
+            FechamentoDeEstoque.objects.get(data=hoje - timedelta(days=4)).saldo, 54)
+
+    def test_movimento_retroativo_reabre_fechamentos(self):
+        hoje = self._historico()
+        FechamentoDeEstoque.objects.fechar(hoje - timedelta(days=8))
+        FechamentoDeEstoque.objects.fechar(hoje - timedelta(days=4))
+        MovimentoDeEstoque.objects.lancar(MovimentoDeEstoque(
+            produto=self.produto, tipo=MovimentoDeEstoque.AJUSTE,
+            quantidade=-1, data=timezone.now() - timedelta(days=6)))
+        self.assertEqual(
+            list(FechamentoDeEstoque.objects.values_list('data', flat=True)),
+            [hoje - timedelta(days=8)])
+        self.assertEqual(self.produto.saldo_em(
+            inicio_do_dia(hoje - timedelta(days=3))), 53)
+
+    def test_alterar_venda_retroativa_no_admin(self):
+        self.produto.movimentos.update(data=timezone.now() - timedelta(days=40))
+        hoje = timezone.localdate()
+        venda = Venda.objects.efetivar(Venda(
+            produto=self.produto, quantidade_vendida=5,
+            data_da_venda=timezone.now() - timedelta(days=30)))
+        FechamentoDeEstoque.objects.fechar(hoje - timedelta(days=20))
+        usuario = get_user_model().objects.create_superuser(
+            'admin@teste.com', 'senha-teste')
+        request = RequestFactory().post('/admin/')
+        request.user = usuario
+        venda = Venda.objects.get(pk=venda.pk)
+        venda.quantidade_vendida = 6
+        VendaAdmin(Venda, admin.site).save_model(request, venda, None, True)
+
+        self.assertDiarioConfere()
+        self.assertEqual(self.produto.quantidade_em_estoque, 44)
+        self.assertFalse(FechamentoDeEstoque.objects.exists())
+        for dias, saldo in ((35, 50), (15, 44), (1, 44)):
+            momento = inicio_do_dia(hoje - timedelta(days=dias))
+            self.assertEqual(self.produto.saldo_em(momento), saldo, dias)
+
+    def test_cancelar_e_zerar_no_admin_deixam_o_mesmo_historico(self):
+        self.produto.movimentos.update(data=timezone.now() - timedelta(days=40))
+        hoje = timezone.localdate()
+        request = RequestFactory().post('/admin/')
+        request.user = get_user_model().objects.create_superuser(
+            'admin@teste.com', 'senha-teste')
+
+        def cancelar(venda):
+            Venda.objects.cancelar(venda)
+
+        def zerar_no_admin(venda):
+            venda.quantidade_vendida = 0
+            VendaAdmin(Venda, admin.site).save_model(request, venda, None, True)
+
+        for desfazer in (cancelar, zerar_no_admin):
+            with self.subTest(desfazer.__name__):
+                venda = Venda.objects.efetivar(Venda(
+                    produto=self.produto, quantidade_vendida=5,
+                    data_da_venda=timezone.now() - timedelta(days=30)))
+                FechamentoDeEstoque.objects.fechar(hoje - timedelta(days=20))
+                desfazer(Venda.objects.get(pk=venda.pk))
+
+                self.assertDiarioConfere()
+                self.assertFalse(FechamentoDeEstoque.objects.exists())
+                for dias in (35, 25, 15, 1):
+                    momento = inicio_do_dia(hoje - timedelta(days=dias))
+                    self.assertEqual(self.produto.saldo_em(momento), 50, dias)
+
+    def test_excluir_produto_mantem_o_diario(self):
+        outro = _criar_produto('Lápis', '1.00', '0.50', 10)
+        Venda.objects.efetivar(Venda(produto=self.produto, quantidade_vendida=5))
+        MovimentoDeEstoque.objects.update(data=timezone.now() - timedelta(days=10))
+        hoje = timezone.localdate()
+        FechamentoDeEstoque.objects.fechar(hoje - timedelta(days=5))
+        self.produto.delete()
+
+        self.assertEqual(
+            list(MovimentoDeEstoque.objects.filter(nome_do_produto='Caneta')
+                 .values_list('produto', 'quantidade')),
+            [(None, 50), (None, -5)])
+        fechamento = FechamentoDeEstoque.objects.get(nome_do_produto='Caneta')
+        self.assertIsNone(fechamento.produto)
+        self.assertEqual(fechamento.saldo, 45)
+
+        # Os fechamentos seguintes só tratam dos produtos existentes e não
+        # apagam o do produto excluído.
+        FechamentoDeEstoque.objects.fechar(hoje - timedelta(days=5))
+        FechamentoDeEstoque.objects.fechar(hoje - timedelta(days=2))
+        MovimentoDeEstoque.objects.lancar(MovimentoDeEstoque(
+            produto=outro, tipo=MovimentoDeEstoque.AJUSTE, quantidade=-1,
+            data=timezone.now() - timedelta(days=3)))
+        self.assertCountEqual(
+            FechamentoDeEstoque.objects.values_list('produto', 'saldo'),
+            [(None, 45), (outro.pk, 10)])
+        self.assertEqual(outro.saldo_em(timezone.now()), 9)
+
+    def test_nao_fecha_dia_corrente(self):
+        with self.assertRaises(ValueError):
+            FechamentoDeEstoque.objects.fechar(timezone.localdate())
+        self.produto.movimentos.update(data=timezone.now() - timedelta(days=3))
+        saida = StringIO()
+        call_command('fechar_estoque', stdout=saida)
+        self.assertIn('1 produtos', saida.getvalue())
+        self.assertEqual(FechamentoDeEstoque.objects.get().saldo, 50)
+
+
+class AlertaDeEstoqueTestCase(TestCase):
+
+    def setUp(self):
+        self.caneta = _criar_produto(quantidade=10, estoque_minimo=5)
+        self.caderno = _criar_produto('Caderno', '19.90', '12.35', 10)
+
+    def test_abre_e_fecha_conforme_o_saldo(self):
+        Venda.objects.efetivar(Venda(produto=self.caneta, quantidade_vendida=4))
+        self.assertFalse(AlertaDeEstoque.objects.abertos().exists())
+        Venda.objects.efetivar(Venda(produto=self.caneta, quantidade_vendida=1))
+        alerta = AlertaDeEstoque.objects.abertos().get()
+        self.assertEqual((alerta.produto, alerta.saldo), (self.caneta, 5))
+        # outra venda não abre um segundo alerta
+        Venda.objects.efetivar(Venda(produto=self.caneta, quantidade_vendida=1))
+        self.assertEqual(AlertaDeEstoque.objects.count(), 1)
+        MovimentoDeEstoque.objects.lancar(MovimentoDeEstoque(
+            produto=self.caneta, tipo=MovimentoDeEstoque.REPOSICAO,
+            quantidade=20))
+        alerta.refresh_from_db()
+        self.assertFalse(alerta.aberto)
+        self.assertIsNotNone(alerta.data_de_resolucao)
+
+    def test_avalia_so_os_produtos_do_pedido(self):
+        with CaptureQueriesContext(connection) as consultas:
+            Venda.objects.efetivar_pedido(
+                [Venda(produto=self.caneta, quantidade_vendida=6),
+                 Venda(produto=self.caderno, quantidade_vendida=9)])
+        leitura = [c['sql'] for c in consultas
+                   if 'core_alertadeestoque' in c['sql'] and
+                   c['sql'].startswith('SELECT')]
+        self.assertEqual(len(leitura), 1)
+        # o caderno não tem mínimo e não gera alerta
+        self.assertEqual(
+            list(AlertaDeEstoque.objects.values_list('produto', flat=True)),
+            [self.caneta.pk])
+
+    def test_mudanca_do_minimo_reavalia(self):
+        self.caderno.estoque_minimo = 10
+        self.caderno.save()
+        self.assertTrue(self.caderno.alertas.filter(aberto=True).exists())
+        self.caderno.estoque_minimo = None
+        self.caderno.save()
+        self.assertFalse(self.caderno.alertas.filter(aberto=True).exists())
+
+    def test_pagina_de_notificacoes(self):
+        _entrar(self.client)
+        Venda.objects.efetivar(Venda(produto=self.caneta, quantidade_vendida=7))
+        # sessão, usuário e os alertas abertos com o produto
+        with self.assertNumQueries(3):
+            resposta = self.client.get('/notifications/')
+        self.assertContains(resposta, '<strong>Caneta</strong>: 3 em estoque')
+        self.assertNotContains(resposta, 'Caderno')
+
+
+class PedidoTestCase(TestCase):
+
+    def setUp(self):
+        self.usuario = _entrar(self.client)
+        self.produtos = [
+            _criar_produto(f'Produto {i}')
+            for i in range(30)
+        ]
+
+    def dados(self, itens):
+        dados = {
+            'itens-TOTAL_FORMS': len(itens),
+            'itens-INITIAL_FORMS': 0,
+        }
+        for i, (produto, quantidade) in enumerate(itens):
+            dados[f'itens-{i}-produto'] = produto.pk
+            dados[f'itens-{i}-quantidade_vendida'] = quantidade
+        return dados
+
+    def postar(self, itens):
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.post('/pedido/', self.dados(itens))
+        return resposta, len(consultas)
+
+    def test_pedido_grava_itens_e_baixa_estoque(self):
+        resposta, _ = self.postar([(self.produtos[0], 2), (self.produtos[1], 3),
+                                   (self.produtos[0], 1)])
+        self.assertRedirects(resposta, '/pedido/', fetch_redirect_response=False)
+        pedido = Pedido.objects.get()
+        self.assertEqual(pedido.itens.count(), 3)
+        self.assertEqual(pedido.valor_total, Decimal('15.00'))
+        self.produtos[0].refresh_from_db()
+        self.assertEqual(self.produtos[0].quantidade_em_estoque, 97)
+        diaria = VendaDiaria.objects.get(produto=self.produtos[0])
+        self.assertEqual(diaria.numero_de_vendas, 2)
+        self.assertEqual(diaria.quantidade_vendida, 3)
+
+    def test_numero_de_consultas_nao_depende_dos_itens(self):
+        _, primeiro = self.postar([(produto, 1) for produto in self.produtos])
+        _, tres = self.postar([(produto, 1) for produto in self.produtos[:3]])
+        _, trinta = self.postar([(produto, 1) for produto in self.produtos])
+        self.assertEqual(tres, trinta)
+        # inclui o INSERT do diário de estoque, a leitura dos alertas e o
+        # consolidado por vendedor
+        self.assertLessEqual(primeiro, 18)
+        self.assertEqual(Venda.objects.count(), 63)
+
+    def test_estoque_insuficiente_cancela_pedido(self):
+        resposta, _ = self.postar([(self.produtos[0], 2), (self.produtos[1], 101)])
+        self.assertEqual(resposta.status_code, 200)
+        self.assertFalse(Pedido.objects.exists())
+        self.assertFalse(Venda.objects.exists())
+        self.produtos[0].refresh_from_db()
+        self.assertEqual(self.produtos[0].quantidade_em_estoque, 100)
+
+    def test_baixa_concorrente_desfaz_pedido(self):
+        itens = [Venda(produto=self.produtos[0], quantidade_vendida=2),
+                 Venda(produto=self.produtos[1], quantidade_vendida=3)]
+        Estoque.objects.filter(pk=self.produtos[1].pk).update(
+            quantidade_em_estoque=1)
+        with self.assertRaises(EstoqueInsuficiente):
+            Venda.objects.efetivar_pedido(itens)
+        self.produtos[0].refresh_from_db()
+        self.assertEqual(self.produtos[0].quantidade_em_estoque, 100)
+        self.assertFalse(Venda.objects.exists())
+
+    def test_formulario_vazio(self):
+        resposta = self.client.get('/pedido/')
+        self.assertEqual(resposta.status_code, 200)
+
+
+class BuscaDeProdutoTestCase(TestCase):
+
+    def setUp(self):
+        self.usuario = _entrar(self.client)
+        nomes = ['Caneta Azul', 'caneta preta', 'Canéta Vermelha', 'Caderno',
+                 'Lápis']
+        self.produtos = {nome: _criar_produto(nome, quantidade=10)
+            for nome in nomes}
+
+    def buscar(self, **parametros):
+        resposta = self.client.get('/api/produtos/', parametros)
+        self.assertEqual(resposta.status_code, 200)
+        return resposta.json()
+
+    def test_nome_de_busca_sem_acentos_e_minusculo(self):
+        self.assertEqual(self.produtos['Lápis'].nome_de_busca, 'lapis')
+        produto = self.produtos['Caderno']
+        produto.produto_em_estoque = 'CADERNO É'
+        produto.save()
+        produto.refresh_from_db()
+        self.assertEqual(produto.nome_de_busca, 'caderno e')
+
+    def test_busca_ignora_maiusculas_e_acentos(self):
+        dados = self.buscar(q='cáNE')
+        self.assertEqual([r['nome'] for r in dados['resultados']],
+                         ['Caneta Azul', 'caneta preta', 'Canéta Vermelha'])
+        self.assertIsNone(dados['proximo'])
+        self.assertEqual(dados['resultados'][0]['id'],
+                         self.produtos['Caneta Azul'].pk)
+        self.assertEqual(self.buscar(q='lapis')['resultados'][0]['nome'],
+                         'Lápis')
+        self.assertEqual(self.buscar(q='xyz')['resultados'], [])
+
+    def test_busca_nao_depende_da_ordenacao_de_caracteres(self):
+        # Um limite superior fixo, como termo + U+FFFF, deixaria de fora
+        # nomes com caracteres que a collation ordena depois dele.
+        _criar_produto('Lápis \U0001F58D', '1.00', '0.50', 1)
+        _criar_produto('Lápis\U0001F58D', '1.00', '0.50', 1)
+        self.assertEqual(
+            [p.produto_em_estoque for p in Estoque.objects.buscar('lapis')],
+            ['Lápis', 'Lápis \U0001F58D', 'Lápis\U0001F58D'])
+
+    def test_paginacao_por_cursor(self):
+        for i in range(45):
+            _criar_produto('Borracha', '1.00', '0.50', i)
+        ids = []
+        parametros = {'q': 'borr'}
+        paginas = 0
+        while True:
+            dados = self.buscar(**parametros)
+            ids += [r['id'] for r in dados['resultados']]
+            paginas += 1
+            if not dados['proximo']:
+                break
+            parametros['depois'] = dados['proximo']
+        self.assertEqual(paginas, 3)
+        self.assertEqual(ids, list(Estoque.objects.filter(
+            produto_em_estoque='Borracha').order_by('pk').values_list(
+            'pk', flat=True)))
+
+    def test_busca_exige_login(self):
+        self.client.logout()
+        resposta = self.client.get('/api/produtos/', {'q': 'can'})
+        self.assertEqual(resposta.status_code, 302)
+
+    def test_busca_usa_indice(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('plano de execução verificado só no SQLite')
+        consulta = Estoque.objects.buscar('can').values('pk')[:21]
+        sql, parametros = consulta.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', parametros)
+            plano = ' '.join(str(linha[-1]) for linha in cursor.fetchall())
+        self.assertIn('estoque_busca_idx', plano)
+        self.assertIn('SEARCH', plano)
+
+    def test_formulario_nao_carrega_o_catalogo(self):
+        resposta = self.client.get('/formulariodevenda/')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertNotContains(resposta, '<option')
+        self.assertNotContains(resposta, 'Caneta Azul')
+        self.assertContains(resposta, 'data-busca-produto')
+        self.assertContains(resposta, 'js/busca_de_produto.js')
+
+    def test_venda_pelo_formulario(self):
+        produto = self.produtos['Caderno']
+        resposta = self.client.post('/formulariodevenda/', {
+            'produto': produto.pk, 'quantidade_vendida': 2})
+        self.assertEqual(resposta.status_code, 302)
+        self.assertEqual(Venda.objects.get().produto, produto)
+
+    def test_formulario_invalido_mostra_o_produto_escolhido(self):
+        produto = self.produtos['Caderno']
+        resposta = self.client.post('/formulariodevenda/', {
+            'produto': produto.pk, 'quantidade_vendida': 1000})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertContains(resposta, 'value="Caderno"')
+
+
+class CursorPaginatorTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        produto = _criar_produto(quantidade=1000)
+        agora = timezone.now()
+        # Datas repetidas para exercitar o desempate pelo id.
+        for i in range(25):
+            Venda.objects.create(
+                produto=produto, quantidade_vendida=1,
+                data_da_venda=agora - timedelta(days=i // 2))
+        cls.esperado = list(Venda.objects.order_by(
+            '-data_da_venda', '-pk').values_list('pk', flat=True))
+
+    def ids(self, pagina):
+        return [venda.pk for venda in pagina]
+
+    def test_percorre_todas_as_paginas(self):
+        paginator = CursorPaginator(Venda.objects.all(), 10)
+        pagina = paginator.get_page()
+        self.assertFalse(pagina.has_previous)
+        vistos = self.ids(pagina)
+        while pagina.has_next:
+            pagina = paginator.get_page(depois=pagina.cursor_proximo)
+            self.assertTrue(pagina.has_previous)
+            vistos += self.ids(pagina)
+        self.assertEqual(vistos, self.esperado)
+
+    def test_volta_para_pagina_anterior(self):
+        paginator = CursorPaginator(Venda.objects.all(), 10)
+        primeira = paginator.get_page()
+        segunda = paginator.get_page(depois=primeira.cursor_proximo)
+        voltou = paginator.get_page(antes=segunda.cursor_anterior)
+        self.assertEqual(self.ids(voltou), self.ids(primeira))
+        self.assertFalse(voltou.has_previous)
+        self.assertTrue(voltou.has_next)
+
+    def test_ultima_pagina(self):
+        pagina = CursorPaginator(Venda.objects.all(), 10).get_page(antes='')
+        self.assertEqual(self.ids(pagina), self.esperado[-10:])
+        self.assertFalse(pagina.has_next)
+        self.assertTrue(pagina.has_previous)
+
+    def test_cursor_invalido_volta_ao_inicio(self):
+        pagina = CursorPaginator(Venda.objects.all(), 10).get_page(depois='xyz')
+        self.assertEqual(self.ids(pagina), self.esperado[:10])
+
+    def test_pagina_nao_conta_registros(self):
+        paginator = CursorPaginator(Venda.objects.all(), 10)
+        cursor = paginator.get_page().cursor_proximo
+        with CaptureQueriesContext(connection) as consultas:
+            paginator.get_page(depois=cursor)
+        self.assertEqual(len(consultas), 1)
+        self.assertNotIn('COUNT', consultas[0]['sql'])
+        self.assertNotIn('OFFSET', consultas[0]['sql'])
+
+
+class VendaListViewTestCase(TestCase):
+
+    def setUp(self):
+        self.usuario = _entrar(self.client)
+        produtos = [
+            _criar_produto(f'Produto {i}')
+            for i in range(5)
+        ]
+        for i in range(60):
+            Venda.objects.create(produto=produtos[i % 5], quantidade_vendida=2)
+
+    def test_lista_paginada_sem_consulta_por_venda(self):
+        # sessão, usuário, página de vendas e totais
+        with self.assertNumQueries(4):
+            resposta = self.client.get('/sale_list/')
+        self.assertEqual(len(resposta.context['v']), 50)
+        self.assertTrue(resposta.context['is_paginated'])
+        self.assertEqual(resposta.context['total_vendas'], 300.0)
+
+        cursor = resposta.context['page_obj'].cursor_proximo
+        resposta = self.client.get('/sale_list/', {'depois': cursor})
+        self.assertEqual(len(resposta.context['v']), 10)
+
+    def test_lista_completa_em_streaming(self):
+        resposta = self.client.get('/sale_list/completa/')
+        self.assertTrue(resposta.streaming)
+        conteudo = b''.join(resposta.streaming_content).decode()
+        self.assertEqual(conteudo.count('<tr>'), 61)
+        self.assertIn('Produto 4', conteudo)
+        self.assertIn('R$ 5,00', conteudo)
+        self.assertIn('</html>', conteudo)
+
+
+class IndicesVendaTestCase(TestCase):
+    """Plano de consulta no SQLite: intervalo usa índice, __month varre a tabela."""
+
+    def plano(self, queryset):
+        return queryset.explain()
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN do SQLite')
+        self.produto = Estoque.objects.create(produto_em_estoque='Caneta')
+        hoje = timezone.localdate()
+        self.inicio = inicio_do_dia(hoje.replace(month=1, day=1))
+        self.fim = inicio_do_dia(hoje.replace(year=hoje.year + 1, month=1, day=1))
+
+    def test_intervalo_de_datas_usa_indice(self):
+        por_funcao = self.plano(Venda.objects.filter(
+            data_da_venda__month=timezone.localdate().month).values('id'))
+        por_intervalo = self.plano(Venda.objects.filter(
+            data_da_venda__gte=self.inicio, data_da_venda__lt=self.fim,
+        ).values('id'))
+        self.assertIn('SCAN', por_funcao)
+        self.assertNotIn('SEARCH', por_funcao)
+        self.assertIn('SEARCH', por_intervalo)
+        self.assertIn('venda_data_id_idx', por_intervalo)
+
+    def test_produto_e_data_usam_indice_composto(self):
+        plano = self.plano(Venda.objects.filter(
+            produto=self.produto, data_da_venda__gte=self.inicio,
+            data_da_venda__lt=self.fim).values('id'))
+        self.assertIn('venda_produto_data_idx', plano)
+
+
+class CacheDashboardTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = _entrar(self.client)
+        self.produto = _criar_produto()
+
+    def test_repeticao_nao_recalcula_metricas(self):
+        with self.assertNumQueries(CONSULTAS_DO_DASHBOARD):
+            self.client.get('/dashboard/')
+        # sem as duas consultas de métricas
+        with self.assertNumQueries(CONSULTAS_DO_DASHBOARD - 2):
+            resposta = self.client.get('/dashboard/')
+        self.assertEqual(resposta.context['total_vendas2'], 0)
+
+    def test_nova_venda_invalida_cache(self):
+        self.client.get('/dashboard/')
+        self.client.post('/formulariodevenda/', {
+            'produto': self.produto.pk, 'quantidade_vendida': 4})
+        with self.assertNumQueries(5):
+            resposta = self.client.get('/dashboard/')
+        self.assertEqual(resposta.context['total_vendas2'], 10.0)
+
+    def test_exclusao_e_pedido_invalidam_cache(self):
+        venda = Venda.objects.efetivar(
+            Venda(produto=self.produto, quantidade_vendida=2))
+        self.assertEqual(
+            self.client.get('/dashboard/').context['total_vendas2'], 5.0)
+        self.client.post(f'/venda/excluir/{venda.pk}/')
+        self.assertEqual(
+            self.client.get('/dashboard/').context['total_vendas2'], 0)
+        Venda.objects.efetivar_pedido(
+            [Venda(produto=self.produto, quantidade_vendida=1)])
+        self.assertEqual(
+            self.client.get('/dashboard/').context['total_vendas2'], 2.5)
+
+
+class ApiDashboardTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = _entrar(self.client)
+        self.produto = _criar_produto()
+        Venda.objects.efetivar(Venda(produto=self.produto, quantidade_vendida=2))
+        # Alteração fora do segundo corrente, para as respostas levarem
+        # Last-Modified.
+        cache.set(CHAVE_ALTERACAO, timezone.now() - timedelta(minutes=1), None)
+
+    def test_series_e_indicadores(self):
+        semana = self.client.get('/api/dashboard/semana/').json()
+        self.assertEqual(len(semana['labels']), 7)
+        self.assertEqual(sum(semana['dados']), 5.0)
+        mensais = self.client.get('/api/dashboard/vendas-mensais/').json()
+        self.assertEqual(len(mensais['dados']), 12)
+        self.assertEqual(sum(mensais['dados']), 5.0)
+        lucro = self.client.get('/api/dashboard/lucro-mensal/').json()
+        self.assertEqual(sum(lucro['dados']), 3.0)
+        indicadores = self.client.get('/api/dashboard/indicadores/').json()
+        self.assertEqual(indicadores['total_vendas2'], 5.0)
+        self.assertEqual(indicadores['total_de_lucros2'], 3.0)
+
+    def test_etag_responde_304_sem_recalcular(self):
+        resposta = self.client.get('/api/dashboard/vendas-mensais/')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIn('ETag', resposta)
+        self.assertIn('Last-Modified', resposta)
+        self.assertIn('no-cache', resposta['Cache-Control'])
+        # só sessão e usuário: versão e data da alteração vêm do cache
+        with self.assertNumQueries(2):
+            resposta = self.client.get(
+                '/api/dashboard/vendas-mensais/',
+                HTTP_IF_NONE_MATCH=resposta['ETag'])
+        self.assertEqual(resposta.status_code, 304)
+        self.assertEqual(resposta.content, b'')
+
+    def test_last_modified_muda_com_qualquer_alteracao(self):
+        url = '/api/dashboard/indicadores/'
+
+        def venda_retroativa():
+            Venda.objects.efetivar(Venda(
+                produto=self.produto, quantidade_vendida=1,
+                data_da_venda=timezone.now() - timedelta(days=400)))
+
+        def novo_preco():
+            self.produto.preco_de_venda = Decimal('3.00')
+            self.produto.save()
+
+        def exclusao():
+            self.client.post(f'/venda/excluir/{Venda.objects.first().pk}/')
+
+        for alterar in (venda_retroativa, novo_preco, exclusao):
+            with self.subTest(alterar.__name__):
+                cache.set(CHAVE_ALTERACAO,
+                          timezone.now() - timedelta(minutes=1), None)
+                ultima = self.client.get(url)['Last-Modified']
+                resposta = self.client.get(url, HTTP_IF_MODIFIED_SINCE=ultima)
+                self.assertEqual(resposta.status_code, 304)
+                alterar()
+                resposta = self.client.get(url, HTTP_IF_MODIFIED_SINCE=ultima)
+                self.assertEqual(resposta.status_code, 200)
+                # No mesmo segundo da alteração só o ETag é enviado.
+                self.assertNotIn('Last-Modified', resposta)
+                depois = timezone.now() + timedelta(seconds=2)
+                with mock.patch('django.utils.timezone.now',
+                                return_value=depois):
+                    resposta = self.client.get(url)
+                self.assertGreater(parse_http_date(resposta['Last-Modified']),
+                                   parse_http_date(ultima))
+
+    def test_nova_venda_muda_etag(self):
+        etag = self.client.get('/api/dashboard/indicadores/')['ETag']
+        Venda.objects.efetivar(Venda(produto=self.produto, quantidade_vendida=4))
+        resposta = self.client.get('/api/dashboard/indicadores/',
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertNotEqual(resposta['ETag'], etag)
+        self.assertEqual(resposta.json()['total_vendas2'], 15.0)
+
+    def test_exige_login(self):
+        self.client.logout()
+        resposta = self.client.get('/api/dashboard/semana/')
+        self.assertEqual(resposta.status_code, 302)
+
+
+@override_settings(INSTRUMENTACAO=True)
+class InstrumentacaoTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        registro.limpar()
+        self.usuario = _entrar(self.client, is_staff=True)
+
+    def test_server_timing_conta_consultas(self):
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get('/dashboard/')
+        timing = resposta['Server-Timing']
+        self.assertIn(f'desc="{len(consultas)} consultas"', timing)
+        self.assertIn('tpl;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+    def test_metricas_agrega_por_rota(self):
+        for _ in range(3):
+            self.client.get('/dashboard/')
+        self.client.get('/sale_list/')
+        resposta = self.client.get('/metrics/')
+        self.assertEqual(resposta.status_code, 200)
+        texto = resposta.content.decode()
+        self.assertIn(
+            'django_view_consultas{view="dashboard",quantile="0.99"}', texto)
+        self.assertIn('django_view_consultas_count{view="dashboard"} 3', texto)
+        self.assertIn('django_view_total_ms_count{view="sale_list"} 1', texto)
+        self.assertIn('django_view_tamanho_bytes{view="sale_list",', texto)
+
+    def test_metricas_exige_staff(self):
+        self.usuario.is_staff = False
+        self.usuario.save()
+        self.assertEqual(self.client.get('/metrics/').status_code, 302)
+
+    def test_quantil(self):
+        valores = list(range(1, 101))
+        self.assertEqual(quantil(valores, 0.5), 50)
+        self.assertEqual(quantil(valores, 0.99), 99)
+        self.assertEqual(quantil([7], 0.9), 7)
+
+
+class InstrumentacaoDesligadaTestCase(TestCase):
+
+    def test_sem_cabecalho_nem_endpoint(self):
+        _entrar(self.client, is_staff=True)
+        self.assertNotIn('Server-Timing', self.client.get('/sale_list/'))
+        self.assertEqual(self.client.get('/metrics/').status_code, 404)
+
+
+class DadosSinteticosTestCase(TestCase):
+
+    def test_gera_vendas_e_consolidado_coerentes(self):
+        produtos = gerar_dados(20, 500, anos=1, semente=7, tamanho_do_lote=120)
+        self.assertEqual(len(produtos), 20)
+        self.assertEqual(Venda.objects.count(), 500)
+        hoje = timezone.localdate()
+        datas = Venda.objects.aggregate(
+            primeira=Min('data_da_venda'), ultima=Max('data_da_venda'))
+        self.assertGreaterEqual(timezone.localdate(datas['primeira']),
+                                hoje - timedelta(days=365))
+        self.assertLess(timezone.localdate(datas['ultima']), hoje)
+        self.assertFalse(Venda.objects.filter(valor_total__isnull=True).exists())
+        self.assertEqual(
+            VendaDiaria.objects.aggregate(n=Sum('numero_de_vendas'))['n'], 500)
+        self.assertAlmostEqual(
+            float(VendaDiaria.objects.aggregate(t=Sum('total_vendido'))['t']),
+            float(Venda.objects.aggregate(t=Sum('valor_total'))['t']), places=2)
+        # O diário de estoque tem a saída de cada venda e fecha com o saldo.
+        self.assertEqual(MovimentoDeEstoque.objects.filter(
+            tipo=MovimentoDeEstoque.VENDA, venda__isnull=False).count(), 500)
+        agora = timezone.now()
+        for produto in Estoque.objects.all():
+            self.assertEqual(produto.saldo_em(agora),
+                             produto.quantidade_em_estoque, produto)
+        self.assertFalse(MovimentoDeEstoque.objects.filter(
+            data__gt=datas['primeira'], tipo=MovimentoDeEstoque.AJUSTE).exists())
+
+    def test_mesma_semente_mesmos_dados(self):
+        gerar_dados(5, 50, anos=1, semente=3)
+        primeira = list(Venda.objects.order_by('pk').values_list(
+            'produto__produto_em_estoque', 'quantidade_vendida', 'data_da_venda'))
+        Venda.objects.all().delete()
+        Estoque.objects.all().delete()
+        gerar_dados(5, 50, anos=1, semente=3)
+        segunda = list(Venda.objects.order_by('pk').values_list(
+            'produto__produto_em_estoque', 'quantidade_vendida', 'data_da_venda'))
+        self.assertEqual(primeira, segunda)
+
+    def test_cenario_do_benchmark(self):
+        cenario = executar_cenario(10, 200, anos=1, repeticoes=2)
+        self.assertEqual(set(cenario['operacoes']), {
+            'dashboard_frio', 'dashboard_cache', 'sale_list_primeira',
+            'sale_list_ultima', 'criar_venda', 'excluir_venda'})
+        for medida in cenario['operacoes'].values():
+            self.assertEqual(medida['repeticoes'], 2)
+            self.assertGreater(medida['consultas'], 0)
+        # as vendas criadas pelo benchmark foram excluídas por ele
+        self.assertEqual(Venda.objects.count(), 200)
+
+
+class AmbienteTestCase(TestCase):
+
+    def test_padrao_e_sql_server(self):
+        with mock.patch.dict(os.environ, {}, clear=True):
+            banco = ambiente.banco_de_dados(Path('/projeto'))
+            self.assertEqual(banco['ENGINE'], 'mssql')
+            self.assertEqual(banco['PORT'], '1433')
+            self.assertEqual(banco['CONN_MAX_AGE'], 60)
+            self.assertTrue(banco['CONN_HEALTH_CHECKS'])
+            self.assertTrue(ambiente.pool_odbc())
+            self.assertEqual(ambiente.cache()['BACKEND'],
+                             'django.core.cache.backends.locmem.LocMemCache')
+
+    def test_sqlite_com_conexao_persistente(self):
+        with mock.patch.dict(os.environ, {
+                'DB_ENGINE': 'sqlite', 'DB_CONN_MAX_AGE': '600',
+                'DB_CONN_HEALTH_CHECKS': 'true', 'CACHE_BACKEND': 'redis',
+                'CACHE_LOCATION': 'redis://localhost:6379/1'}):
+            banco = ambiente.banco_de_dados(Path('/projeto'))
+            self.assertEqual(banco['ENGINE'], 'django.db.backends.sqlite3')
+            self.assertEqual(banco['NAME'], str(Path('/projeto/db.sqlite3')))
+            self.assertEqual(banco['CONN_MAX_AGE'], 600)
+            self.assertTrue(banco['CONN_HEALTH_CHECKS'])
+            self.assertEqual(ambiente.cache()['LOCATION'],
+                             'redis://localhost:6379/1')
+
+    def test_conexao_por_requisicao(self):
+        with mock.patch.dict(os.environ, {'DB_CONN_MAX_AGE': '0',
+                                          'DB_POOL_ODBC': 'false'}):
+            self.assertEqual(ambiente.banco_de_dados(Path('/projeto'))
+                             ['CONN_MAX_AGE'], 0)
+            self.assertFalse(ambiente.pool_odbc())
+        with mock.patch.dict(os.environ, {'DB_CONN_MAX_AGE': 'None'}):
+            self.assertIsNone(ambiente.banco_de_dados(Path('/projeto'))
+                              ['CONN_MAX_AGE'])
+
+    def test_pool_odbc_no_sql_server(self):
+        pyodbc = mock.Mock(pooling=True)
+        with mock.patch.dict('sys.modules', {'pyodbc': pyodbc}):
+            configurar_pool_odbc()
+            self.assertTrue(pyodbc.pooling)
+            with override_settings(ODBC_POOLING=False):
+                configurar_pool_odbc()
+            # só mexe no pyodbc se algum banco for SQL Server
+            self.assertTrue(pyodbc.pooling)
+            with mock.patch.dict(connections.settings['default'],
+                                 {'ENGINE': 'mssql'}), \
+                    override_settings(ODBC_POOLING=False):
+                configurar_pool_odbc()
+            self.assertFalse(pyodbc.pooling)
+
+    def test_engine_invalido(self):
+        with mock.patch.dict(os.environ, {'DB_ENGINE': 'oracle'}):
+            with self.assertRaises(ValueError):
+                ambiente.banco_de_dados(Path('/projeto'))
+
+    def test_pragmas_aplicados_na_conexao(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('só para SQLite')
+        with connection.cursor() as cursor:
+            # aplicado pelo perfil padrão quando a conexão foi aberta
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+        with override_settings(SQLITE_PRAGMAS={'busy_timeout': 4321}):
+            aplicar_pragmas(None, connection)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 4321)
+
+
+class ImportarVendasTestCase(TestCase):
+    CSV = (
+        'produto;quantidade;data\n'
+        'Caneta;3;01/03/2026 10:00\n'
+        'caderno ;2;2026-03-01\n'
+        'Borracha;1;01/03/2026\n'
+        'Caneta;x;01/03/2026\n'
+        'Caneta;5;\n'
+        'Caderno;1;31/02/2026\n'
+    )
+
+    def setUp(self):
+        cache.clear()
+        self.caneta = _criar_produto(quantidade=5)
+        self.caderno = _criar_produto('Caderno', '19.90', '12.35', 10)
+
+    def importar(self, conteudo, lote=2):
+        return importar_vendas(
+            linhas_csv(BytesIO(conteudo.encode())), tamanho_do_lote=lote)
+
+    def test_importa_e_rejeita_linhas(self):
+        resultado = self.importar(self.CSV)
+        self.assertEqual(resultado.importadas, 3)
+        self.assertEqual([numero for numero, _ in resultado.rejeitadas], [4, 5, 7])
+        self.assertIn('Borracha', resultado.rejeitadas[0][1])
+
+        # Vendas de caixa já aconteceram: a baixa pode deixar o estoque negativo.
+        self.caneta.refresh_from_db()
+        self.caderno.refresh_from_db()
+        self.assertEqual(self.caneta.quantidade_em_estoque, -3)
+        self.assertEqual(self.caderno.quantidade_em_estoque, 8)
+        self.assertEqual(
+            Venda.objects.get(produto=self.caderno).valor_total, Decimal('39.80'))
+        self.assertEqual(
+            Venda.objects.filter(produto=self.caneta).count(), 2)
+
+        incremental = list(VendaDiaria.objects.values_list(
+            'data', 'produto_id', 'quantidade_vendida', 'total_vendido'))
+        VendaDiaria.objects.reconstruir()
+        self.assertEqual(incremental, list(VendaDiaria.objects.values_list(
+            'data', 'produto_id', 'quantidade_vendida', 'total_vendido')))
+
+    def test_consultas_por_lote_nao_dependem_das_linhas(self):
+        linhas = 'produto,quantidade\n' + 'Caneta,1\nCaderno,1\n' * 50
+        with CaptureQueriesContext(connection) as consultas:
+            self.importar(linhas, lote=100)
+        # o INSERT de 100 vendas passa do limite de parâmetros do SQLite e
+        # vai em duas partes
+        self.assertLessEqual(len(consultas), 12)
+
+    def test_comando(self):
+        with NamedTemporaryFile('w', suffix='.csv', delete=False) as arquivo:
+            arquivo.write(self.CSV)
+        saida, erros = StringIO(), StringIO()
+        try:
+            call_command('importar_vendas', arquivo.name, '--lote', '2',
+                         stdout=saida, stderr=erros)
+        finally:
+            os.unlink(arquivo.name)
+        self.assertIn('3 vendas importadas', saida.getvalue())
+        self.assertIn('linhas/s', saida.getvalue())
+        self.assertIn('Linha 4: produto não encontrado', erros.getvalue())
+
+    def test_envio_pela_pagina(self):
+        usuario = _entrar(self.client)
+        arquivo = SimpleUploadedFile('vendas.csv', self.CSV.encode())
+        resposta = self.client.post(
+            '/vendas/importar/', {'arquivo': arquivo, 'lote': 1000})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.context['resultado'].importadas, 3)
+        self.assertContains(resposta, 'Linha 7')
+        # As vendas importadas contam para quem enviou o arquivo.
+        self.assertEqual(Venda.objects.filter(vendedor=usuario).count(), 3)
+        self.assertEqual(VendaDiariaPorVendedor.objects.filter(
+            vendedor=usuario).aggregate(n=Sum('numero_de_vendas'))['n'], 3)
+        self.assertEqual(ranking_de_vendedores(
+            date(2026, 3, 1), timezone.localdate() + timedelta(days=1))[0]['id'],
+            usuario.pk)
+
+    def test_guarda_so_as_primeiras_rejeitadas(self):
+        linhas = 'produto,quantidade\n' + 'Caneta,x\n' * 150 + 'Caneta,1\n'
+        resultado = self.importar(linhas)
+        self.assertEqual(resultado.importadas, 1)
+        self.assertEqual(resultado.total_de_rejeitadas, 150)
+        self.assertEqual(len(resultado.rejeitadas), 100)
+        self.assertEqual(resultado.rejeitadas[-1][0], 101)
+        self.assertEqual(resultado.rejeitadas_omitidas, 50)
+        self.assertIn('150 linhas rejeitadas', str(resultado))
+
+
+class ExportarCsvTestCase(TestCase):
+
+    def setUp(self):
+        self.usuario = _entrar(self.client)
+        produto = _criar_produto()
+        for dia in (1, 2, 3):
+            Venda.objects.create(
+                produto=produto, quantidade_vendida=dia,
+                data_da_venda=inicio_do_dia(date(2026, 3, dia)) + timedelta(hours=23))
+
+    def test_exporta_vendas_por_periodo(self):
+        resposta = self.client.get(
+            '/vendas/exportar/', {'inicio': '2026-03-02', 'fim': '2026-03-03'})
+        self.assertTrue(resposta.streaming)
+        self.assertEqual(resposta['Content-Type'], 'text/csv; charset=utf-8')
+        linhas = b''.join(resposta.streaming_content).decode().splitlines()
+        self.assertEqual(linhas[0], ';'.join(CABECALHO_VENDAS))
+        self.assertEqual(len(linhas), 3)
+        self.assertTrue(linhas[1].split(';')[1].startswith('2026-03-02T23:00'))
+        self.assertEqual(linhas[2].split(';')[-2:], ['7.50', '4.50'])
+
+    def test_exporta_estoque(self):
+        resposta = self.client.get('/estoque/exportar/')
+        linhas = b''.join(resposta.streaming_content).decode().splitlines()
+        self.assertEqual(linhas[0], ';'.join(CABECALHO_ESTOQUE))
+        self.assertIn(';Caneta;2.50;1.00;100.00', linhas[1])
+
+    def test_comando_le_em_blocos(self):
+        saida = StringIO()
+        with CaptureQueriesContext(connection) as consultas:
+            call_command('exportar_csv', 'vendas', '--bloco', '1', stdout=saida)
+        self.assertEqual(len(saida.getvalue().splitlines()), 4)
+        self.assertEqual(len(consultas), 1)
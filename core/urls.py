@@ -1,15 +1,48 @@
 from django.urls import path
 
-from .views import (DashListView, FormularioDeVendaCreateView, VendaDeleteView,
-                    VendaListView, extrato, notifications, profile, sign_in,
+from .views import (DashListView, FormularioDeVendaCreateView, PedidoCreateView,
+                    VendaDeleteView, VendaListView, analise_de_produtos,
+                    api_comparacao, api_indicadores, api_lucro_mensal,
+                    api_produtos, api_ranking_de_produtos,
+                    api_ranking_de_vendedores, api_serie, api_vendas_mensais,
+                    api_vendas_semana, dashboard_async, exportar_estoque,
+                    exportar_vendas, extrato, importar_vendas,
+                    metricas_de_desempenho, notifications, profile,
+                    ranking_de_vendedores_view, sale_list_completa, sign_in,
                     tables)
 
 urlpatterns = [
     path('formulariodevenda/', FormularioDeVendaCreateView.as_view(),
          name='formulariodevenda'),
+    path('pedido/', PedidoCreateView.as_view(), name='pedido'),
+    path('api/produtos/', api_produtos, name='api_produtos'),
+    path('produtos/analise/', analise_de_produtos, name='analise_de_produtos'),
+    path('api/produtos/ranking/', api_ranking_de_produtos,
+         name='api_ranking_de_produtos'),
+    path('vendedores/ranking/', ranking_de_vendedores_view,
+         name='ranking_de_vendedores'),
+    path('api/vendedores/ranking/', api_ranking_de_vendedores,
+         name='api_ranking_de_vendedores'),
+    path('vendas/importar/', importar_vendas, name='importar_vendas'),
+    path('vendas/exportar/', exportar_vendas, name='exportar_vendas'),
+    path('estoque/exportar/', exportar_estoque, name='exportar_estoque'),
     path('sale_list/', VendaListView.as_view(),
          name='sale_list'),
+    path('sale_list/completa/', sale_list_completa,
+         name='sale_list_completa'),
     path('dashboard/', DashListView.as_view(), name='dashboard'),
+    path('dashboard/async/', dashboard_async, name='dashboard_async'),
+    path('api/dashboard/semana/', api_vendas_semana,
+         name='api_vendas_semana'),
+    path('api/dashboard/vendas-mensais/', api_vendas_mensais,
+         name='api_vendas_mensais'),
+    path('api/dashboard/lucro-mensal/', api_lucro_mensal,
+         name='api_lucro_mensal'),
+    path('api/dashboard/indicadores/', api_indicadores,
+         name='api_indicadores'),
+    path('api/dashboard/comparacao/', api_comparacao, name='api_comparacao'),
+    path('api/dashboard/serie/', api_serie, name='api_serie'),
+    path('metrics/', metricas_de_desempenho, name='metricas_de_desempenho'),
     path('venda/excluir/<int:pk>/', VendaDeleteView.as_view(), name='vendadelete'),
     path('tables/', tables, name='tables'),
     path('extrato/', extrato, name='extrato'),
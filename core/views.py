@@ -1,23 +1,49 @@
-from datetime import datetime
+import asyncio
+from datetime import timedelta
+from functools import partial
+from itertools import chain
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
 
 from django import forms
+from django.conf import settings
 from django.contrib import messages
-from django.contrib.auth.decorators import login_required
+from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.core.paginator import PageNotAnInteger, Paginator
-from django.db.models import F, FloatField, Q, Sum
-from django.db.models.functions import (ExtractMonth, ExtractWeekDay,
-                                        ExtractYear)
+from django.contrib.auth.views import redirect_to_login
+from django.core.paginator import PageNotAnInteger
+from django.db.models import Q
+from django.http import (Http404, HttpResponse, HttpResponseRedirect,
+                         JsonResponse, StreamingHttpResponse)
 from django.shortcuts import get_object_or_404, redirect, render
-from django.urls import reverse_lazy
+from django.template import defaultfilters
+from django.template.loader import render_to_string
+from django.urls import reverse, reverse_lazy
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.utils.decorators import method_decorator
-from django.views.generic import (CreateView, DeleteView, ListView,
-                                  TemplateView, UpdateView)
+from django.utils.html import format_html
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET
+from django.views.generic import (CreateView, DeleteView, FormView,
+                                  ListView, TemplateView, UpdateView)
 from django.views.generic.list import MultipleObjectMixin
 
-from .forms import VendaModelForm
-from .models import Estoque, Venda
+from . import calendario, exportacao, importacao
+from .cache import (dados_alterados_em, em_cache, em_cache_async,
+                    versao_dos_dados)
+from .forms import (AnaliseDeProdutosForm, FiltroDoDashboardForm,
+                    ImportarVendasForm, ItemPedidoFormSet,
+                    RankingDeVendedoresForm, VendaModelForm)
+from .instrumentacao import texto_das_metricas
+from .metricas import (comparar, em_paralelo, metricas_dashboard,
+                       metricas_dashboard_async, ranking_de_produtos,
+                       ranking_de_vendedores, serie, soma_lucro, soma_vendas,
+                       valor_da_linha, valor_lucro, valor_vendido)
+from .models import AlertaDeEstoque, Estoque, EstoqueInsuficiente, Venda
+from .paginacao import (CursorPaginator, PaginacaoPorCursorMixin,
+                        codificar_cursor, decodificar_cursor)
 
 
 @method_decorator(login_required, name='dispatch')
@@ -25,30 +51,131 @@ class FormularioDeVendaCreateView(CreateView):
     model = Venda
     form_class = VendaModelForm
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['estoque'] = Estoque.objects.all()
-        return context
-
     success_url = reverse_lazy('formulariodevenda')
     template_name = 'formulariodevenda.html'
 
     def form_valid(self, form):
-        # Verifica a quantidade em estoque do produto selecionado
-        produto = form.cleaned_data['produto']
-        quantidade_vendida = form.cleaned_data['quantidade_vendida']
-        if produto.quantidade_em_estoque < quantidade_vendida:
+        # Grava a venda e baixa o estoque numa só transação; a baixa é um
+        # UPDATE condicional, então duas vendas simultâneas não passam do saldo.
+        venda = form.save(commit=False)
+        venda.vendedor = self.request.user
+        try:
+            self.object = Venda.objects.efetivar(venda)
+        except EstoqueInsuficiente:
             form.add_error(
                 'quantidade_vendida', 'Quantidade em estoque insuficiente.')
             return self.form_invalid(form)
 
-        # Salva a venda e atualiza a quantidade em estoque
-        venda = form.save(commit=False)
-        venda.save()
-        produto.quantidade_em_estoque -= quantidade_vendida
-        produto.save()
+        return HttpResponseRedirect(self.get_success_url())
+
+
+@method_decorator(login_required, name='dispatch')
+class PedidoCreateView(FormView):
+    form_class = ItemPedidoFormSet
+    success_url = reverse_lazy('pedido')
+    template_name = 'pedido.html'
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['prefix'] = 'itens'
+        return kwargs
+
+    def form_valid(self, form):
+        try:
+            pedido = Venda.objects.efetivar_pedido(
+                form.itens(vendedor=self.request.user))
+        except EstoqueInsuficiente:
+            messages.error(self.request, 'Quantidade em estoque insuficiente.')
+            return self.form_invalid(form)
+
+        messages.success(
+            self.request, f'Pedido {pedido.pk} registrado: R$ {pedido.valor_total}.')
+        return HttpResponseRedirect(self.get_success_url())
+
+
+PRODUTOS_POR_PAGINA = 20
+
+
+@login_required
+@require_GET
+def api_produtos(request):
+    """
+    Busca de produtos por prefixo do nome, sem diferenciar maiúsculas nem
+    acentos, para o autocomplete do formulário de venda. Pagina por cursor
+    sobre (nome normalizado, id): `proximo` vai no parâmetro `depois`.
+    """
+    produtos = Estoque.objects.buscar(request.GET.get('q', ''))
+    posicao = decodificar_cursor(request.GET.get('depois', ''), converter=str)
+    if posicao:
+        nome, pk = posicao
+        produtos = produtos.filter(
+            Q(nome_de_busca__gt=nome) | Q(nome_de_busca=nome, pk__gt=pk))
+    pagina = list(produtos.values(
+        'pk', 'produto_em_estoque', 'nome_de_busca', 'preco_de_venda',
+        'quantidade_em_estoque')[:PRODUTOS_POR_PAGINA + 1])
+    proximo = None
+    if len(pagina) > PRODUTOS_POR_PAGINA:
+        pagina = pagina[:PRODUTOS_POR_PAGINA]
+        proximo = codificar_cursor(pagina[-1]['nome_de_busca'], pagina[-1]['pk'])
+    return JsonResponse({
+        'resultados': [{
+            'id': produto['pk'],
+            'nome': produto['produto_em_estoque'],
+            'preco_de_venda': produto['preco_de_venda'],
+            'quantidade_em_estoque': produto['quantidade_em_estoque'],
+        } for produto in pagina],
+        'proximo': proximo,
+    })
+
+
+@login_required
+def importar_vendas(request):
+    resultado = None
+    if request.method == 'POST':
+        form = ImportarVendasForm(request.POST, request.FILES)
+        if form.is_valid():
+            arquivo = form.cleaned_data['arquivo']
+            try:
+                resultado = importacao.importar_vendas(
+                    importacao.ler_arquivo(arquivo.file, arquivo.name),
+                    tamanho_do_lote=form.cleaned_data['lote'],
+                    vendedor=request.user)
+            except importacao.ErroDeImportacao as erro:
+                form.add_error('arquivo', str(erro))
+    else:
+        form = ImportarVendasForm()
+    return render(request, 'importar_vendas.html', {
+        'form': form, 'resultado': resultado})
+
+
+def _dia(request, parametro):
+    valor = request.GET.get(parametro)
+    if not valor:
+        return None
+    try:
+        return parse_date(valor)
+    except ValueError:
+        return None
+
+
+def _csv_em_streaming(linhas, nome):
+    resposta = StreamingHttpResponse(
+        exportacao.csv_em_streaming(linhas), content_type='text/csv; charset=utf-8')
+    resposta['Content-Disposition'] = f'attachment; filename="{nome}"'
+    return resposta
+
+
+@login_required
+def exportar_vendas(request):
+    """CSV de vendas; aceita ?inicio=AAAA-MM-DD&fim=AAAA-MM-DD."""
+    return _csv_em_streaming(
+        exportacao.vendas(_dia(request, 'inicio'), _dia(request, 'fim')),
+        'vendas.csv')
 
-        return super().form_valid(form)
+
+@login_required
+def exportar_estoque(request):
+    return _csv_em_streaming(exportacao.estoque(), 'estoque.csv')
 
 
 def login(request):
@@ -56,368 +183,324 @@ def login(request):
 
 
 @method_decorator(login_required, name='dispatch')
-class VendaListView(ListView):
+class VendaListView(PaginacaoPorCursorMixin, ListView):
     model = Venda
     template_name = 'sale_list.html'
+    paginate_by = 50
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('produto')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        v = Venda.objects.all()
+        context['v'] = context['page_obj']
+        context.update(totais_vendas())
+        return context
 
-        context['v'] = v
 
-        total_vendas = v.annotate(
-            total_value=Sum(
-                F('produto__preco_de_venda') * F('quantidade_vendida'),
-                output_field=FloatField()
-            )
-        ).aggregate(total=Sum('total_value'))['total'] or 0
+def totais_vendas():
+    totais = Venda.objects.order_by().aggregate(
+        total_vendas=soma_vendas(), total_de_lucros=soma_lucro())
+    return {
+        'total_vendas': totais['total_vendas'] or 0,
+        'total_de_lucros': totais['total_de_lucros'] or 0,
+    }
 
-        context['total_vendas'] = total_vendas
 
-        total_de_lucros = v.annotate(
-            total_lucro=Sum(
-                (F('produto__preco_de_venda') * F('quantidade_vendida')) -
-                (F('produto__preco_de_compra') * F('quantidade_vendida')),
-                output_field=FloatField()
-            )
-        ).aggregate(total=Sum('total_lucro'))['total'] or 0
+LINHA_VENDA = (
+    '            <tr>\n'
+    '                <td>{}</td>\n'
+    '                <td>{}</td>\n'
+    '                <td>{}</td>\n'
+    '                <td>R$ {}</td>\n'
+    '            </tr>\n'
+)
 
-        context['total_de_lucros'] = total_de_lucros
 
-        return context
+def linhas_de_venda(chunk_size=2000):
+    vendas = Venda.objects.order_by('-data_da_venda', '-id').values_list(
+        'data_da_venda', 'quantidade_vendida', 'produto__produto_em_estoque',
+        'valor_total',
+    )
+    for data, quantidade, produto, valor in vendas.iterator(chunk_size=chunk_size):
+        yield format_html(
+            LINHA_VENDA, defaultfilters.date(timezone.localtime(data), 'd/m/Y'),
+            quantidade, produto or '', defaultfilters.floatformat(valor, 2))
+
+
+@login_required
+def sale_list_completa(request):
+    """
+    Lista todas as vendas sem paginação, enviando o HTML aos poucos: as
+    linhas saem de um cursor lido em blocos, então a memória usada não
+    cresce com o número de vendas.
+    """
+    inicio, fim = render_to_string(
+        'sale_list_completa.html', totais_vendas(), request=request,
+    ).split('<!-- linhas -->')
+    return StreamingHttpResponse(chain([inicio], linhas_de_venda(), [fim]))
+
+
+def vendas_do_dashboard():
+    # Produto, receita e lucro de cada linha vêm na mesma consulta da
+    # página, sem uma ida ao banco por venda no template.
+    return Venda.objects.select_related('produto').annotate(
+        receita=valor_da_linha(valor_vendido()),
+        lucro=valor_da_linha(valor_lucro()),
+    )
+
+
+def filtro_do_dashboard(request):
+    """
+    Formulário de intervalo e granularidade dos gráficos de vendas e lucro
+    e a URL de api_serie com os mesmos parâmetros, de onde vêm os dados.
+    Com parâmetros inválidos, os gráficos ficam no padrão (ano corrente).
+    """
+    filtro = FiltroDoDashboardForm(request.GET)
+    parametros = {}
+    granularidade = calendario.MES
+    if filtro.is_valid():
+        inicio, fim, granularidade = filtro.limites()
+        parametros = {'inicio': inicio, 'fim': fim - timedelta(days=1),
+                      'granularidade': granularidade}
+    rotulos = dict(filtro.fields['granularidade'].choices)
+    return {'filtro': filtro, 'granularidade': rotulos[granularidade],
+            'url_da_serie': f"{reverse('api_serie')}?{urlencode(parametros)}"}
 
 
 @method_decorator(login_required, name='dispatch')
-class DashListView(ListView):
+class DashListView(PaginacaoPorCursorMixin, ListView):
     model = Venda
     template_name = 'pages/dashboard.html'
     paginate_by = 10
 
-    def get(self, request, *args, **kwargs):
-        self.object_list = self.get_queryset()
-        return super().get(request, *args, **kwargs)
-
     def get_queryset(self):
-        return super().get_queryset().order_by('-data_da_venda')
+        return vendas_do_dashboard()
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        paginator = Paginator(self.object_list, self.paginate_by)
-        page_number = self.request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
-        context = super().get_context_data(**kwargs)
-        context['page_obj'] = page_obj
-
-        # Total de vendas
-        v2 = Venda.objects.all()
-        context['v2'] = v2
-        total_vendas2 = v2.annotate(
-            total_value=Sum(
-                F('produto__preco_de_venda') * F('quantidade_vendida'),
-                output_field=FloatField()
-            )
-        ).aggregate(total=Sum('total_value'))['total'] or 0
-        context['total_vendas2'] = total_vendas2
-
-        # Total de lucros
-        total_de_lucros2 = v2.annotate(
-            total_lucro=Sum(
-                (F('produto__preco_de_venda') * F('quantidade_vendida')) -
-                (F('produto__preco_de_compra') * F('quantidade_vendida')),
-                output_field=FloatField()
-            )
-        ).aggregate(total=Sum('total_lucro'))['total'] or 0
-        context['total_de_lucros2'] = total_de_lucros2
-
-        # Total de vendas na semana atual
-        semana_atual = timezone.now().isocalendar()[
-            1]  # número da semana atual
-        total_vendas_semana_atual = v2.filter(data_da_venda__week=semana_atual).aggregate(
-            total=Sum(F('produto__preco_de_venda') * F('quantidade_vendida'), output_field=FloatField()))['total'] or 0
-        context['total_vendas_semana_atual'] = total_vendas_semana_atual
-
-        total_lucro_semana_atual = v2.filter(data_da_venda__week=semana_atual).aggregate(
-            total=Sum((F('produto__preco_de_venda') * F('quantidade_vendida')) -
-                      (F('produto__preco_de_compra') * F('quantidade_vendida')), output_field=FloatField()))['total'] or 0
-        context['total_lucro_semana_atual'] = total_lucro_semana_atual
-
-        mes_atual = timezone.now().month
-        total_vendas_mes_atual = v2.filter(data_da_venda__month=mes_atual).aggregate(
-            total=Sum(F('produto__preco_de_venda') * F('quantidade_vendida'), output_field=FloatField()))['total'] or 0
-        context['total_vendas_mes_atual'] = total_vendas_mes_atual
-
-        total_lucro_mes_atual = v2.filter(data_da_venda__month=mes_atual).aggregate(
-            total=Sum((F('produto__preco_de_venda') * F('quantidade_vendida')) -
-                      (F('produto__preco_de_compra') * F('quantidade_vendida')), output_field=FloatField()))['total'] or 0
-        context['total_lucro_mes_atual'] = total_lucro_mes_atual
-
-        # Porcentagem de vendas comparada com o mês anterior
-        last_month_sales = Venda.objects.filter(data_da_venda__month=timezone.now().month-1).aggregate(
-            total=Sum(F('produto__preco_de_venda') * F('quantidade_vendida'), output_field=FloatField()))['total'] or 0
-        current_month_sales = total_vendas_mes_atual
-        if last_month_sales == 0:
-            percentual_vendas = '-'
-        else:
-            percentual_vendas = round(
-                (current_month_sales-last_month_sales)/last_month_sales*100, 2)
-        context['percentual_vendas'] = percentual_vendas
-
-        # Porcentagem de vendas comparada com o mês anterior
-        last_month_sales2 = Venda.objects.filter(data_da_venda__month=timezone.now().month-1).aggregate(
-            total=Sum((F('produto__preco_de_venda') * F('quantidade_vendida')) -
-                      (F('produto__preco_de_compra') * F('quantidade_vendida')), output_field=FloatField()))['total'] or 0
-        current_month_sales2 = total_lucro_mes_atual
-        if last_month_sales2 == 0:
-            percentual_vendas2 = '-'
-        else:
-            percentual_vendas2 = round(
-                (current_month_sales2-last_month_sales2)/last_month_sales2*100, 2)
-        context['percentual_vendas2'] = percentual_vendas2
-
-        # Porcentagem de vendas comparada com a semana anterior
-        last_week_sales = Venda.objects.filter(data_da_venda__week=timezone.now().isocalendar()[1]-1).aggregate(
-            total=Sum(F('produto__preco_de_venda') * F('quantidade_vendida'), output_field=FloatField()))['total'] or 0
-        current_week_sales = total_vendas_semana_atual
-        if last_week_sales == 0:
-            percentual_vendas_semana_anterior = '-'
-        else:
-            percentual_vendas_semana_anterior = round(
-                (current_week_sales-last_week_sales)/last_week_sales*100, 2)
-        context['percentual_vendas_semana_anterior'] = percentual_vendas_semana_anterior
-
-        # Porcentagem de vendas comparada com a semana anterior 2
-        last_week_sales2 = Venda.objects.filter(data_da_venda__week=timezone.now().isocalendar()[1]-1).aggregate(
-            total=Sum((F('produto__preco_de_venda') * F('quantidade_vendida')) -
-                      (F('produto__preco_de_compra') * F('quantidade_vendida')), output_field=FloatField()))['total'] or 0
-        current_week_sales2 = total_lucro_semana_atual
-        if last_week_sales2 == 0:
-            percentual_vendas_semana_anterior2 = '-'
-        else:
-            percentual_vendas_semana_anterior2 = round(
-                (current_week_sales2-last_week_sales2)/last_week_sales2*100, 2)
-        context['percentual_vendas_semana_anterior2'] = percentual_vendas_semana_anterior2
-
-        # Total de Vendas Segunda Feira
-
-        segunda_feira_vendas = Venda.objects.annotate(
-            total_value=Sum(
-                F('produto__preco_de_venda') * F('quantidade_vendida'),
-                output_field=FloatField()
-            )
-        ).filter(data_da_venda__week=timezone.now().isocalendar()[1], data_da_venda__week_day=2).aggregate(total=Sum('total_value'))['total'] or 0
-        context['segunda_feira_vendas'] = segunda_feira_vendas
-
-        # Total de Vendas Terça Feira
-
-        terca_feira_vendas = Venda.objects.annotate(
-            total_value=Sum(
-                F('produto__preco_de_venda') * F('quantidade_vendida'),
-                output_field=FloatField()
-            )
-        ).filter(data_da_venda__week=timezone.now().isocalendar()[1], data_da_venda__week_day=3).aggregate(total=Sum('total_value'))['total'] or 0
-        context['terca_feira_vendas'] = terca_feira_vendas
-
-        # Total de Vendas Quarta Feira
-
-        quarta_feira_vendas = Venda.objects.annotate(
-            total_value=Sum(
-                F('produto__preco_de_venda') * F('quantidade_vendida'),
-                output_field=FloatField()
-            )
-        ).filter(data_da_venda__week=timezone.now().isocalendar()[1], data_da_venda__week_day=4).aggregate(total=Sum('total_value'))['total'] or 0
-        context['quarta_feira_vendas'] = quarta_feira_vendas
-
-        # Total de Vendas Quinta Feira
-
-        quinta_feira_vendas = Venda.objects.annotate(
-            total_value=Sum(
-                F('produto__preco_de_venda') * F('quantidade_vendida'),
-                output_field=FloatField()
-            )
-        ).filter(data_da_venda__week=timezone.now().isocalendar()[1], data_da_venda__week_day=5).aggregate(total=Sum('total_value'))['total'] or 0
-        context['quinta_feira_vendas'] = quinta_feira_vendas
-
-        # Total de Vendas Sexta Feira
-        sexta_feira_vendas = Venda.objects.annotate(
-            total_value=Sum(
-                F('produto__preco_de_venda') * F('quantidade_vendida'),
-                output_field=FloatField()
-            )
-        ).filter(data_da_venda__week=timezone.now().isocalendar()[1], data_da_venda__week_day=6).aggregate(total=Sum('total_value'))['total'] or 0
-        context['sexta_feira_vendas'] = sexta_feira_vendas
-
-        # Total de Vendas Sabado
-        sabado_vendas = Venda.objects.annotate(
-            total_value=Sum(
-                F('produto__preco_de_venda') * F('quantidade_vendida'),
-                output_field=FloatField()
-            )
-        ).filter(data_da_venda__week=timezone.now().isocalendar()[1], data_da_venda__week_day=7).aggregate(total=Sum('total_value'))['total'] or 0
-        context['sabado_vendas'] = sabado_vendas
-
-        # Total de Vendas Domingo
-        domingo_vendas = Venda.objects.annotate(
-            total_value=Sum(
-                F('produto__preco_de_venda') * F('quantidade_vendida'),
-                output_field=FloatField()
-            )
-        ).filter(data_da_venda__week=timezone.now().isocalendar()[1], data_da_venda__week_day=1).aggregate(total=Sum('total_value'))['total'] or 0
-        context['domingo_vendas'] = domingo_vendas
-
-        context['sales_data'] = [
-            segunda_feira_vendas,
-            terca_feira_vendas,
-            quarta_feira_vendas,
-            quinta_feira_vendas,
-            sexta_feira_vendas,
-            sabado_vendas,
-            domingo_vendas,
-        ]
-
-        ano = datetime.now().year
-
-        total_vendas_janeiro = Venda.objects.filter(data_da_venda__month=1, data_da_venda__year=ano).aggregate(
-            total=Sum(F('produto__preco_de_venda') * F('quantidade_vendida'), output_field=FloatField()))['total'] or 0
-        context['total_vendas_janeiro'] = total_vendas_janeiro
-
-        total_vendas_fevereiro = Venda.objects.filter(data_da_venda__month=2, data_da_venda__year=ano).aggregate(
-            total=Sum(F('produto__preco_de_venda') * F('quantidade_vendida'), output_field=FloatField()))['total'] or 0
-        context['total_vendas_fevereiro'] = total_vendas_fevereiro
-
-        total_vendas_marco = Venda.objects.filter(data_da_venda__month=3, data_da_venda__year=ano).aggregate(
-            total=Sum(F('produto__preco_de_venda') * F('quantidade_vendida'), output_field=FloatField()))['total'] or 0
-        context['total_vendas_marco'] = total_vendas_marco
-
-        total_vendas_abril = Venda.objects.filter(data_da_venda__month=4, data_da_venda__year=ano).aggregate(
-            total=Sum(F('produto__preco_de_venda') * F('quantidade_vendida'), output_field=FloatField()))['total'] or 0
-        context['total_vendas_abril'] = total_vendas_abril
-
-        total_vendas_maio = Venda.objects.filter(data_da_venda__month=5, data_da_venda__year=ano).aggregate(
-            total=Sum(F('produto__preco_de_venda') * F('quantidade_vendida'), output_field=FloatField()))['total'] or 0
-        context['total_vendas_maio'] = total_vendas_maio
-
-        total_vendas_junho = Venda.objects.filter(data_da_venda__month=6, data_da_venda__year=ano).aggregate(
-            total=Sum(F('produto__preco_de_venda') * F('quantidade_vendida'), output_field=FloatField()))['total'] or 0
-        context['total_vendas_junho'] = total_vendas_junho
-
-        total_vendas_julho = Venda.objects.filter(data_da_venda__month=7, data_da_venda__year=ano).aggregate(
-            total=Sum(F('produto__preco_de_venda') * F('quantidade_vendida'), output_field=FloatField()))['total'] or 0
-        context['total_vendas_julho'] = total_vendas_julho
-
-        total_vendas_agosto = Venda.objects.filter(data_da_venda__month=8, data_da_venda__year=ano).aggregate(
-            total=Sum(F('produto__preco_de_venda') * F('quantidade_vendida'), output_field=FloatField()))['total'] or 0
-        context['total_vendas_agosto'] = total_vendas_agosto
-
-        total_vendas_setembro = Venda.objects.filter(data_da_venda__month=9, data_da_venda__year=ano).aggregate(
-            total=Sum(F('produto__preco_de_venda') * F('quantidade_vendida'), output_field=FloatField()))['total'] or 0
-        context['total_vendas_setembro'] = total_vendas_setembro
-
-        total_vendas_outubro = Venda.objects.filter(data_da_venda__month=10, data_da_venda__year=ano).aggregate(
-            total=Sum(F('produto__preco_de_venda') * F('quantidade_vendida'), output_field=FloatField()))['total'] or 0
-        context['total_vendas_outubro'] = total_vendas_outubro
-
-        total_vendas_novembro = Venda.objects.filter(data_da_venda__month=11, data_da_venda__year=ano).aggregate(
-            total=Sum(F('produto__preco_de_venda') * F('quantidade_vendida'), output_field=FloatField()))['total'] or 0
-        context['total_vendas_novembro'] = total_vendas_novembro
-
-        total_vendas_dezembro = Venda.objects.filter(data_da_venda__month=12, data_da_venda__year=ano).aggregate(
-            total=Sum(F('produto__preco_de_venda') * F('quantidade_vendida'), output_field=FloatField()))['total'] or 0
-        context['total_vendas_dezembro'] = total_vendas_dezembro
-
-        context['sales_data_months'] = [
-            total_vendas_janeiro,
-            total_vendas_fevereiro,
-            total_vendas_marco,
-            total_vendas_abril,
-            total_vendas_maio,
-            total_vendas_junho,
-            total_vendas_julho,
-            total_vendas_agosto,
-            total_vendas_setembro,
-            total_vendas_outubro,
-            total_vendas_novembro,
-            total_vendas_dezembro,
-        ]
-
-        total_vendas_lucro_janeiro = Venda.objects.filter(data_da_venda__month=1, data_da_venda__year=ano).aggregate(
-            total=Sum((F('produto__preco_de_venda') * F('quantidade_vendida')) -
-                      (F('produto__preco_de_compra') * F('quantidade_vendida')), output_field=FloatField()))['total'] or 0
-        context['total_vendas_lucro_janeiro'] = total_vendas_lucro_janeiro
-
-        total_vendas_lucro_fevereiro = Venda.objects.filter(data_da_venda__month=2, data_da_venda__year=ano).aggregate(
-            total=Sum((F('produto__preco_de_venda') * F('quantidade_vendida')) -
-                      (F('produto__preco_de_compra') * F('quantidade_vendida')), output_field=FloatField()))['total'] or 0
-        context['total_vendas_lucro_fevereiro'] = total_vendas_lucro_fevereiro
-
-        total_vendas_lucro_marco = Venda.objects.filter(data_da_venda__month=3, data_da_venda__year=ano).aggregate(
-            total=Sum((F('produto__preco_de_venda') * F('quantidade_vendida')) -
-                      (F('produto__preco_de_compra') * F('quantidade_vendida')), output_field=FloatField()))['total'] or 0
-        context['total_vendas_lucro_marco'] = total_vendas_lucro_marco
-
-        total_vendas_lucro_abril = Venda.objects.filter(data_da_venda__month=4, data_da_venda__year=ano).aggregate(
-            total=Sum((F('produto__preco_de_venda') * F('quantidade_vendida')) -
-                      (F('produto__preco_de_compra') * F('quantidade_vendida')), output_field=FloatField()))['total'] or 0
-        context['total_vendas_lucro_abril'] = total_vendas_lucro_abril
-
-        total_vendas_lucro_maio = Venda.objects.filter(data_da_venda__month=5, data_da_venda__year=ano).aggregate(
-            total=Sum((F('produto__preco_de_venda') * F('quantidade_vendida')) -
-                      (F('produto__preco_de_compra') * F('quantidade_vendida')), output_field=FloatField()))['total'] or 0
-        context['total_vendas_lucro_maio'] = total_vendas_lucro_maio
-
-        total_vendas_lucro_junho = Venda.objects.filter(data_da_venda__month=6, data_da_venda__year=ano).aggregate(
-            total=Sum((F('produto__preco_de_venda') * F('quantidade_vendida')) -
-                      (F('produto__preco_de_compra') * F('quantidade_vendida')), output_field=FloatField()))['total'] or 0
-        context['total_vendas_lucro_junho'] = total_vendas_lucro_junho
-
-        total_vendas_lucro_julho = Venda.objects.filter(data_da_venda__month=7, data_da_venda__year=ano).aggregate(
-            total=Sum((F('produto__preco_de_venda') * F('quantidade_vendida')) -
-                      (F('produto__preco_de_compra') * F('quantidade_vendida')), output_field=FloatField()))['total'] or 0
-        context['total_vendas_lucro_julho'] = total_vendas_lucro_julho
-
-        total_vendas_lucro_agosto = Venda.objects.filter(data_da_venda__month=8, data_da_venda__year=ano).aggregate(
-            total=Sum((F('produto__preco_de_venda') * F('quantidade_vendida')) -
-                      (F('produto__preco_de_compra') * F('quantidade_vendida')), output_field=FloatField()))['total'] or 0
-        context['total_vendas_lucro_agosto'] = total_vendas_lucro_agosto
-
-        total_vendas_lucro_setembro = Venda.objects.filter(data_da_venda__month=9, data_da_venda__year=ano).aggregate(
-            total=Sum((F('produto__preco_de_venda') * F('quantidade_vendida')) -
-                      (F('produto__preco_de_compra') * F('quantidade_vendida')), output_field=FloatField()))['total'] or 0
-        context['total_vendas_lucro_setembro'] = total_vendas_lucro_setembro
-
-        total_vendas_lucro_outubro = Venda.objects.filter(data_da_venda__month=10, data_da_venda__year=ano).aggregate(
-            total=Sum((F('produto__preco_de_venda') * F('quantidade_vendida')) -
-                      (F('produto__preco_de_compra') * F('quantidade_vendida')), output_field=FloatField()))['total'] or 0
-        context['total_vendas_lucro_outubro'] = total_vendas_lucro_outubro
-
-        total_vendas_lucro_novembro = Venda.objects.filter(data_da_venda__month=11, data_da_venda__year=ano).aggregate(
-            total=Sum((F('produto__preco_de_venda') * F('quantidade_vendida')) -
-                      (F('produto__preco_de_compra') * F('quantidade_vendida')), output_field=FloatField()))['total'] or 0
-        context['total_vendas_lucro_novembro'] = total_vendas_lucro_novembro
-
-        total_vendas_lucro_dezembro = Venda.objects.filter(data_da_venda__month=12, data_da_venda__year=ano).aggregate(
-            total=Sum((F('produto__preco_de_venda') * F('quantidade_vendida')) -
-                      (F('produto__preco_de_compra') * F('quantidade_vendida')), output_field=FloatField()))['total'] or 0
-        context['total_vendas_lucro_dezembro'] = total_vendas_lucro_dezembro
-
-        context['sales_data_months_2'] = [
-            total_vendas_lucro_janeiro,
-            total_vendas_lucro_fevereiro,
-            total_vendas_lucro_marco,
-            total_vendas_lucro_abril,
-            total_vendas_lucro_maio,
-            total_vendas_lucro_junho,
-            total_vendas_lucro_julho,
-            total_vendas_lucro_agosto,
-            total_vendas_lucro_setembro,
-            total_vendas_lucro_outubro,
-            total_vendas_lucro_novembro,
-            total_vendas_lucro_dezembro,
-        ]
+        context.update(em_cache('dashboard', metricas_dashboard))
+        context.update(filtro_do_dashboard(self.request))
 
         return context
 
 
+async def dashboard_async(request):
+    """
+    Dashboard assíncrono, para rodar sob ASGI (projeto_vendas/asgi.py). A
+    página de vendas e cada grupo de métricas saem em consultas
+    independentes disparadas ao mesmo tempo no pool de threads, então a
+    resposta espera só pela consulta mais lenta.
+    """
+    if not await sync_to_async(lambda: request.user.is_authenticated)():
+        return redirect_to_login(request.get_full_path())
+    paginador = CursorPaginator(vendas_do_dashboard(), DashListView.paginate_by)
+    (pagina,), metricas = await asyncio.gather(
+        em_paralelo(partial(paginador.get_page,
+                            depois=request.GET.get('depois'),
+                            antes=request.GET.get('antes'))),
+        em_cache_async('dashboard', metricas_dashboard_async),
+    )
+    pagina.parametros = request.GET
+    context = {
+        'page_obj': pagina,
+        'object_list': pagina.object_list,
+        'is_paginated': pagina.has_previous or pagina.has_next,
+    }
+    context.update(metricas)
+    context.update(filtro_do_dashboard(request))
+    return await sync_to_async(render)(request, 'pages/dashboard.html', context)
+
+
+ROTULOS_SEMANA = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sabado',
+                  'Domingo']
+
+ROTULOS_MESES = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set',
+                 'Out', 'Nov', 'Dez']
+
+INDICADORES = [
+    'total_vendas2', 'total_de_lucros2',
+    'total_vendas_mes_atual', 'total_lucro_mes_atual',
+    'total_vendas_semana_atual', 'total_lucro_semana_atual',
+    'percentual_vendas', 'percentual_vendas2',
+    'percentual_vendas_semana_anterior', 'percentual_vendas_semana_anterior2',
+]
+
+
+def _versao_do_dashboard(request, *args, **kwargs):
+    # Muda a cada venda ou produto gravado, e a cada dia (semana e mês
+    # correntes dependem da data).
+    return f'{versao_dos_dados()}-{timezone.localdate().isoformat()}'
+
+
+def _ultima_alteracao(request, *args, **kwargs):
+    # A última gravação de venda ou produto (exclusões, vendas retroativas e
+    # edições no admin inclusive), ou a meia-noite de hoje, se mais recente.
+    # Datas HTTP têm resolução de segundos: se os dados mudaram no segundo
+    # corrente, outra mudança ainda pode cair no mesmo segundo, então a
+    # resposta sai sem Last-Modified e vale só o ETag.
+    agora = timezone.now()
+    alteracao = max(dados_alterados_em(),
+                    calendario.inicio_do_dia(timezone.localdate(agora)))
+    if int(alteracao.timestamp()) >= int(agora.timestamp()):
+        return None
+    return alteracao
+
+
+def api_do_dashboard(view):
+    """
+    Respostas JSON do dashboard com ETag/Last-Modified: o navegador
+    revalida a cada uso e recebe 304, sem corpo nem consultas de métricas,
+    enquanto não houver mudança.
+    """
+    view = condition(etag_func=_versao_do_dashboard,
+                     last_modified_func=_ultima_alteracao)(view)
+    view = cache_control(private=True, no_cache=True)(view)
+    return login_required(require_GET(view))
+
+
+@api_do_dashboard
+def api_vendas_semana(request):
+    metricas = em_cache('dashboard', metricas_dashboard)
+    return JsonResponse({
+        'labels': ROTULOS_SEMANA, 'dados': metricas['sales_data']})
+
+
+@api_do_dashboard
+def api_vendas_mensais(request):
+    metricas = em_cache('dashboard', metricas_dashboard)
+    return JsonResponse({'labels': ROTULOS_MESES,
+                         'dados': metricas['sales_data_months']})
+
+
+@api_do_dashboard
+def api_lucro_mensal(request):
+    metricas = em_cache('dashboard', metricas_dashboard)
+    return JsonResponse({'labels': ROTULOS_MESES,
+                         'dados': metricas['sales_data_months_2']})
+
+
+@api_do_dashboard
+def api_indicadores(request):
+    metricas = em_cache('dashboard', metricas_dashboard)
+    return JsonResponse({chave: metricas[chave] for chave in INDICADORES})
+
+
+@api_do_dashboard
+def api_comparacao(request):
+    """
+    Vendas e lucro de um período contra o anterior. Parâmetros: `periodo`
+    (dia, semana, mes, trimestre, ano ou personalizado; mes por padrão),
+    `data`, um dia dentro do período (hoje por padrão), e `inicio` e `fim`,
+    inclusive, para o personalizado.
+    """
+    tipo = request.GET.get('periodo', calendario.MES)
+    try:
+        if tipo == calendario.PERSONALIZADO:
+            atual = calendario.periodo(
+                tipo, parse_date(request.GET.get('inicio', '')),
+                parse_date(request.GET.get('fim', '')))
+        else:
+            atual = calendario.periodo(
+                tipo, parse_date(request.GET.get('data', '')))
+    except ValueError as erro:
+        return JsonResponse({'erro': str(erro)}, status=400)
+    anterior = atual.anterior()
+    comparacao = em_cache(
+        f'comparacao:{tipo}:{atual.inicio}:{atual.fim}',
+        partial(comparar, atual))
+    return JsonResponse({
+        'periodo': tipo,
+        'atual': {'inicio': atual.inicio,
+                  'fim': atual.fim - timedelta(days=1)},
+        'anterior': {'inicio': anterior.inicio,
+                     'fim': anterior.fim - timedelta(days=1)},
+        **comparacao,
+    })
+
+
+@api_do_dashboard
+def api_serie(request):
+    """
+    Vendas e lucro por dia, semana ou mês entre `inicio` e `fim`
+    (inclusive); sem parâmetros, o ano corrente mês a mês.
+    """
+    filtro = FiltroDoDashboardForm(request.GET)
+    if not filtro.is_valid():
+        return JsonResponse({'erro': filtro.errors}, status=400)
+    inicio, fim, granularidade = filtro.limites()
+    dados = em_cache(f'serie:{granularidade}:{inicio}:{fim}',
+                     partial(serie, inicio, fim, granularidade))
+    return JsonResponse({'granularidade': granularidade, **dados})
+
+
+def _ranking_de_produtos(filtro):
+    inicio, fim = filtro.intervalo()
+    ordem = filtro.cleaned_data['ordem']
+    limite = filtro.cleaned_data['limite']
+    return em_cache(f'ranking_de_produtos:{ordem}:{limite}:{inicio}:{fim}',
+                    partial(ranking_de_produtos, inicio, fim, ordem, limite))
+
+
+@login_required
+def analise_de_produtos(request):
+    """Produtos com mais receita, lucro ou unidades no período."""
+    filtro = AnaliseDeProdutosForm(request.GET)
+    produtos = _ranking_de_produtos(filtro) if filtro.is_valid() else []
+    return render(request, 'analise_de_produtos.html', {
+        'filtro': filtro, 'produtos': produtos})
+
+
+@api_do_dashboard
+def api_ranking_de_produtos(request):
+    """
+    Os mesmos números de analise_de_produtos. Parâmetros: `inicio` e `fim`
+    (inclusive; ano corrente por padrão), `ordem` (receita, lucro ou
+    unidades) e `limite` (até 100).
+    """
+    filtro = AnaliseDeProdutosForm(request.GET)
+    if not filtro.is_valid():
+        return JsonResponse({'erro': filtro.errors}, status=400)
+    return JsonResponse({'produtos': _ranking_de_produtos(filtro)})
+
+
+def _ranking_de_vendedores(filtro):
+    inicio, fim = filtro.intervalo()
+    limite = filtro.cleaned_data['limite']
+    return em_cache(f'ranking_de_vendedores:{limite}:{inicio}:{fim}',
+                    partial(ranking_de_vendedores, inicio, fim, limite))
+
+
+@login_required
+def ranking_de_vendedores_view(request):
+    """Receita e lucro de cada vendedor no período."""
+    filtro = RankingDeVendedoresForm(request.GET)
+    vendedores = _ranking_de_vendedores(filtro) if filtro.is_valid() else []
+    return render(request, 'ranking_de_vendedores.html', {
+        'filtro': filtro, 'vendedores': vendedores})
+
+
+@api_do_dashboard
+def api_ranking_de_vendedores(request):
+    """
+    Os mesmos números de ranking_de_vendedores_view. Parâmetros: `inicio`
+    e `fim` (inclusive; ano corrente por padrão) e `limite` (até 100).
+    """
+    filtro = RankingDeVendedoresForm(request.GET)
+    if not filtro.is_valid():
+        return JsonResponse({'erro': filtro.errors}, status=400)
+    return JsonResponse({'vendedores': _ranking_de_vendedores(filtro)})
+
+
+@user_passes_test(lambda usuario: usuario.is_staff)
+def metricas_de_desempenho(request):
+    """Consultas, tempos e tamanho por rota, para o Prometheus ou leitura."""
+    if not settings.INSTRUMENTACAO:
+        raise Http404
+    return HttpResponse(texto_das_metricas(),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 class VendaDeleteView(LoginRequiredMixin, DeleteView):
     model = Venda
     template_name = 'pages/venda_confirm_delete.html'
@@ -427,6 +510,11 @@ class VendaDeleteView(LoginRequiredMixin, DeleteView):
         pk = self.kwargs.get('pk')
         return get_object_or_404(Venda, pk=pk)
 
+    def form_valid(self, form):
+        # A exclusão devolve a quantidade ao estoque.
+        Venda.objects.cancelar(self.object)
+        return HttpResponseRedirect(self.get_success_url())
+
 
 @login_required
 def tables(request):
@@ -440,7 +528,9 @@ def extrato(request):
 
 @login_required
 def notifications(request):
-    return render(request, 'pages/notifications.html')
+    # Uma consulta indexada aos alertas abertos, com o produto no JOIN.
+    alertas = AlertaDeEstoque.objects.abertos()
+    return render(request, 'pages/notifications.html', {'alertas': alertas})
 
 
 @login_required
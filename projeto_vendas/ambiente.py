@@ -0,0 +1,126 @@
+"""
+Leitura das configurações que mudam de um ambiente para outro (banco,
+conexões persistentes e cache) a partir de variáveis de ambiente.
+
+Sem nenhuma variável definida o resultado é o mesmo de antes: SQL Server em
+localhost:1433 e cache em memória local.
+"""
+
+import os
+
+VERDADEIRO = {'1', 'true', 'sim', 'yes', 'on'}
+
+ENGINES = {
+    'mssql': 'mssql',
+    'sqlite': 'django.db.backends.sqlite3',
+    'postgresql': 'django.db.backends.postgresql',
+}
+
+CACHES = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+    'banco': 'django.core.cache.backends.db.DatabaseCache',
+    'arquivo': 'django.core.cache.backends.filebased.FileBasedCache',
+    'nenhum': 'django.core.cache.backends.dummy.DummyCache',
+}
+
+# Perfil do SQLite para benchmarks e testes de carga: WAL deixa leituras e
+# escrita acontecerem juntas, synchronous=NORMAL só sincroniza o disco nos
+# checkpoints do WAL e o mmap evita cópias nas leituras.
+PRAGMAS_SQLITE = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,
+}
+
+
+def texto(nome, padrao=None):
+    return os.environ.get(nome, padrao)
+
+
+def booleano(nome, padrao=False):
+    valor = os.environ.get(nome)
+    if valor is None:
+        return padrao
+    return valor.strip().lower() in VERDADEIRO
+
+
+def inteiro(nome, padrao=None):
+    valor = os.environ.get(nome)
+    if valor in (None, ''):
+        return padrao
+    if valor.strip().lower() == 'none':
+        # CONN_MAX_AGE=None mantém a conexão aberta indefinidamente.
+        return None
+    return int(valor)
+
+
+def banco_de_dados(base_dir):
+    """
+    DATABASES['default'] conforme DB_ENGINE (mssql, sqlite ou postgresql),
+    DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_CONN_MAX_AGE e
+    DB_CONN_HEALTH_CHECKS.
+    """
+    engine = texto('DB_ENGINE', 'mssql')
+    if engine not in ENGINES:
+        raise ValueError(f'DB_ENGINE inválido: {engine} '
+                         f'(use {", ".join(ENGINES)})')
+    # Em servidores de banco abrir a conexão custa handshake TCP e login a
+    # cada requisição; por padrão ela é mantida por um minuto e testada
+    # antes de ser reaproveitada. No SQLite abrir o arquivo é barato.
+    servidor = engine != 'sqlite'
+    banco = {
+        'ENGINE': ENGINES[engine],
+        'CONN_MAX_AGE': inteiro('DB_CONN_MAX_AGE', 60 if servidor else 0),
+        'CONN_HEALTH_CHECKS': booleano('DB_CONN_HEALTH_CHECKS', servidor),
+    }
+    if engine == 'sqlite':
+        banco['NAME'] = texto('DB_NAME', str(base_dir / 'db.sqlite3'))
+        banco['OPTIONS'] = {'timeout': inteiro('DB_TIMEOUT', 20)}
+        return banco
+
+    banco.update({
+        'NAME': texto('DB_NAME', 'BANCO_TESTE_10'),
+        'USER': texto('DB_USER', 'sa'),
+        'PASSWORD': texto('DB_PASSWORD', 'Fizz2241'),
+        'HOST': texto('DB_HOST', 'localhost'),
+        'PORT': texto('DB_PORT', '1433' if engine == 'mssql' else '5432'),
+    })
+    if engine == 'mssql':
+        banco['OPTIONS'] = {
+            'driver': texto('DB_DRIVER', 'ODBC Driver 17 for SQL Server'),
+            'extra_params': 'TimeZone=America/Sao_Paulo',
+        }
+    return banco
+
+
+def cache():
+    """CACHES['default'] conforme CACHE_BACKEND e CACHE_LOCATION."""
+    backend = texto('CACHE_BACKEND', 'locmem')
+    if backend not in CACHES:
+        raise ValueError(f'CACHE_BACKEND inválido: {backend} '
+                         f'(use {", ".join(CACHES)})')
+    configuracao = {'BACKEND': CACHES[backend]}
+    local = texto('CACHE_LOCATION')
+    if local:
+        configuracao['LOCATION'] = local
+    return configuracao
+
+
+def pool_odbc():
+    """
+    Pool de conexões do gerenciador ODBC (pyodbc.pooling), usado pelo
+    backend mssql quando a conexão do Django é fechada e reaberta. DB_POOL_ODBC.
+    """
+    return booleano('DB_POOL_ODBC', True)
+
+
+def pragmas_sqlite():
+    """Pragmas aplicados a cada conexão SQLite (SQLITE_PERFIL=benchmark)."""
+    if texto('SQLITE_PERFIL', 'benchmark') == 'benchmark':
+        return dict(PRAGMAS_SQLITE)
+    return {}
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 
 from pathlib import Path
 
+from . import ambiente
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -44,6 +46,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.instrumentacao.InstrumentacaoMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -79,21 +82,40 @@ WSGI_APPLICATION = 'projeto_vendas.wsgi.application'
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
 
+# Banco, conexões persistentes e cache vêm de variáveis de ambiente (veja
+# projeto_vendas/ambiente.py). Sem elas continua o SQL Server local; com
+# DB_ENGINE=sqlite o projeto roda sem SQL Server.
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'mssql',
-        'NAME': 'BANCO_TESTE_10',
-        'USER': 'sa',
-        'PASSWORD': 'Fizz2241',
-        'HOST': 'localhost',
-        'PORT': '1433',
-        'OPTIONS': {
-            'driver': 'ODBC Driver 17 for SQL Server',
-            'extra_params': 'TimeZone=America/Sao_Paulo',
-        },
-    }
+    'default': ambiente.banco_de_dados(BASE_DIR),
+}
+
+# Pool de conexões do ODBC quando o banco é SQL Server (pyodbc.pooling)
+ODBC_POOLING = ambiente.pool_odbc()
+
+# Pragmas aplicados a cada nova conexão quando o banco é SQLite
+SQLITE_PRAGMAS = ambiente.pragmas_sqlite()
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+CACHES = {
+    'default': ambiente.cache(),
 }
 
+# Cache usado pelos números do dashboard e por quanto tempo (segundos)
+DASHBOARD_CACHE = 'default'
+DASHBOARD_CACHE_TIMEOUT = 3600
+
+# Consultas do dashboard assíncrono executadas ao mesmo tempo
+DASHBOARD_CONSULTAS_PARALELAS = 4
+
+
+# Consultas SQL, tempos e tamanho das respostas por rota, no cabeçalho
+# Server-Timing e em /metrics/. Desligado por padrão.
+
+INSTRUMENTACAO = False
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -0,0 +1,46 @@
+// Sugestões de produto enquanto o usuário digita, buscadas na API em vez de
+// carregar o catálogo inteiro na página. Funciona também para as linhas
+// acrescentadas depois (formset de pedido), por delegação de eventos.
+(function () {
+  var esperas = {};
+
+  function sugerir(campo) {
+    var lista = document.getElementById(campo.getAttribute('list'));
+    var url = campo.dataset.url + '?q=' + encodeURIComponent(campo.value);
+    fetch(url, {credentials: 'same-origin'})
+      .then(function (resposta) { return resposta.json(); })
+      .then(function (dados) {
+        lista.innerHTML = '';
+        dados.resultados.forEach(function (produto) {
+          var opcao = document.createElement('option');
+          opcao.value = produto.nome;
+          opcao.dataset.id = produto.id;
+          lista.appendChild(opcao);
+        });
+        escolher(campo);
+      });
+  }
+
+  function escolher(campo) {
+    var alvo = document.getElementById(campo.dataset.buscaProduto);
+    var lista = document.getElementById(campo.getAttribute('list'));
+    alvo.value = '';
+    Array.prototype.forEach.call(lista.options, function (opcao) {
+      if (opcao.value === campo.value) {
+        alvo.value = opcao.dataset.id;
+      }
+    });
+  }
+
+  document.addEventListener('input', function (evento) {
+    var campo = evento.target;
+    if (!campo.dataset || !campo.dataset.buscaProduto) {
+      return;
+    }
+    escolher(campo);
+    clearTimeout(esperas[campo.id]);
+    if (campo.value.trim()) {
+      esperas[campo.id] = setTimeout(function () { sugerir(campo); }, 200);
+    }
+  });
+})();